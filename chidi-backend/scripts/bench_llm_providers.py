@@ -0,0 +1,183 @@
+"""
+Benchmark LLM provider client strategies against the local fake provider.
+
+Starts two fake OpenAI-compatible servers in-process: a primary that stalls
+on a share of requests and a slower but steady fallback. Then sends the
+same requests with three client strategies and reports time to first
+token (TTFT) and time to the full answer:
+
+    naive    a new httpx client per call, non-streaming, failing over to the
+             fallback only after ``--naive-timeout`` seconds
+    pooled   shared pooled clients, streaming, sequential failover
+             (ProviderRouter without hedging)
+    hedged   as pooled, plus the fallback starts when the first token is
+             later than ``--hedge-ms``
+
+For the non-streaming client the first token is only visible with the
+full answer, so its TTFT equals its total time.
+
+Usage (from chidi-backend/):
+    python scripts/bench_llm_providers.py --requests 200 --concurrency 20 \\
+        --stall-rate 0.1 --hedge-ms 400
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import sys
+import time
+from typing import Dict, List, Tuple
+
+import httpx
+import uvicorn
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from shared.llm.providers.base import ProviderError  # noqa: E402
+from shared.llm.providers.fake_server import FakeProviderConfig, create_app  # noqa: E402
+from shared.llm.providers.openai import OpenAIProvider  # noqa: E402
+from shared.llm.providers.router import ProviderRouter  # noqa: E402
+from shared.observability.metrics import MetricsRegistry  # noqa: E402
+
+MESSAGES = [
+    {"role": "system", "content": "You are Chidi, a helpful sales assistant."},
+    {"role": "user", "content": "Do you deliver to Lekki on Saturdays?"},
+]
+
+Sample = Tuple[float, float]  # (ttft, total) in seconds
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _serve(config: FakeProviderConfig) -> Tuple[uvicorn.Server, str]:
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(create_app(config), host="127.0.0.1", port=port, log_level="warning"))
+    asyncio.ensure_future(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    return server, f"http://127.0.0.1:{port}/v1"
+
+
+async def _naive(urls: List[str], timeout: float) -> Sample:
+    started = time.perf_counter()
+    for url in urls:
+        try:
+            async with httpx.AsyncClient(base_url=url, timeout=timeout) as client:
+                response = await client.post(
+                    "/chat/completions",
+                    json={"model": "fake", "messages": MESSAGES, "max_tokens": 256},
+                    headers={"Authorization": "Bearer fake"},
+                )
+                response.raise_for_status()
+                elapsed = time.perf_counter() - started
+                return elapsed, elapsed
+        except httpx.HTTPError:
+            continue
+    raise RuntimeError("all providers failed")
+
+
+async def _routed(router: ProviderRouter) -> Sample:
+    started = time.perf_counter()
+    ttft = None
+    async for chunk in router.stream(MESSAGES, max_tokens=256):
+        if ttft is None and chunk.text:
+            ttft = time.perf_counter() - started
+    return ttft or 0.0, time.perf_counter() - started
+
+
+async def _run(call, requests: int, concurrency: int) -> Tuple[List[Sample], int, float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    samples: List[Sample] = []
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            try:
+                samples.append(await call())
+            except (ProviderError, RuntimeError):
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return samples, errors, time.perf_counter() - started
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+
+def _router(urls: List[str], hedge_after) -> ProviderRouter:
+    providers = [
+        OpenAIProvider("fake", model="fake", base_url=url, name=f"fake{index}", read_timeout=30.0)
+        for index, url in enumerate(urls)
+    ]
+    return ProviderRouter(providers, hedge_after=hedge_after, registry=MetricsRegistry())
+
+
+async def main_async(args) -> Dict[str, Tuple[List[Sample], int, float]]:
+    primary, primary_url = await _serve(FakeProviderConfig(
+        ttft_ms=args.ttft_ms, token_ms=args.token_ms, tokens=args.tokens,
+        stall_rate=args.stall_rate, stall_ms=args.stall_ms, seed=1,
+    ))
+    fallback, fallback_url = await _serve(FakeProviderConfig(
+        ttft_ms=args.fallback_ttft_ms, token_ms=args.token_ms, tokens=args.tokens, seed=2,
+    ))
+    urls = [primary_url, fallback_url]
+    pooled = _router(urls, None)
+    hedged = _router(urls, args.hedge_ms / 1000)
+
+    results = {}
+    try:
+        results["naive"] = await _run(lambda: _naive(urls, args.naive_timeout), args.requests, args.concurrency)
+        results["pooled"] = await _run(lambda: _routed(pooled), args.requests, args.concurrency)
+        results["hedged"] = await _run(lambda: _routed(hedged), args.requests, args.concurrency)
+    finally:
+        await pooled.aclose()
+        await hedged.aclose()
+        primary.should_exit = fallback.should_exit = True
+        await asyncio.sleep(0.2)
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--ttft-ms", type=float, default=150, help="primary first-token latency")
+    parser.add_argument("--fallback-ttft-ms", type=float, default=300)
+    parser.add_argument("--token-ms", type=float, default=5)
+    parser.add_argument("--tokens", type=int, default=40)
+    parser.add_argument("--stall-rate", type=float, default=0.1, help="share of primary requests that stall")
+    parser.add_argument("--stall-ms", type=float, default=4000)
+    parser.add_argument("--naive-timeout", type=float, default=2.0)
+    parser.add_argument("--hedge-ms", type=float, default=400)
+    args = parser.parse_args()
+
+    print(
+        f"{args.requests} requests, concurrency {args.concurrency}; primary TTFT {args.ttft_ms:.0f}ms "
+        f"with {args.stall_rate:.0%} stalls of {args.stall_ms:.0f}ms, fallback TTFT {args.fallback_ttft_ms:.0f}ms\n"
+    )
+    results = asyncio.run(main_async(args))
+    print(f"{'strategy':<8} {'ttft p50':>9} {'ttft p95':>9} {'ttft p99':>9} {'total p50':>10} {'errors':>7} {'wall s':>7}")
+    for name, (samples, errors, wall) in results.items():
+        ttfts = [ttft * 1000 for ttft, _ in samples]
+        totals = [total * 1000 for _, total in samples]
+        print(
+            f"{name:<8} {_percentile(ttfts, 0.5):>9.0f} {_percentile(ttfts, 0.95):>9.0f} "
+            f"{_percentile(ttfts, 0.99):>9.0f} {statistics.median(totals) if totals else float('nan'):>10.0f} "
+            f"{errors:>7} {wall:>7.1f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+Benchmark response serialization for GET /users/context.
+
+Builds a user_contexts row with a large business_data document and times
+the CPU spent turning it into response bytes, per request:
+
+    default   validated model, FastAPI response_model validation and
+              jsonable_encoder, standard-library json (the old path)
+    orjson    the same, encoded by the orjson default response class
+    fast      model_construct from the row, pre-rendered by pydantic-core
+              (FAST_SERIALIZATION=true)
+
+No database or Redis is needed; the real route and models are used.
+
+Usage (from chidi-backend/):
+    PYTHONPATH=.:services/api-gateway python scripts/bench_response_serialization.py \\
+        --products 500 --repeat 200
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List
+
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+
+from app import responses
+from app.routers import users
+
+
+def build_row(products: int) -> Dict[str, Any]:
+    now = datetime.now(timezone.utc)
+    return {
+        "id": "7f0c5d1e-0000-4000-8000-000000000000",
+        "user_id": "11111111-1111-1111-1111-111111111111",
+        "business_data": {
+            "business_name": "Ada's Fabrics",
+            "faq": [{"question": f"Question {i}?", "answer": "An answer " * 10} for i in range(products // 5)],
+            "products": [
+                {
+                    "sku": f"SKU-{i:05d}",
+                    "name": f"Product {i}",
+                    "description": "Hand-dyed ankara cotton, six yards " * 3,
+                    "price": {"amount": 1500 + i, "currency": "NGN"},
+                    "tags": ["fabric", "ankara", f"tag-{i % 7}"],
+                    "in_stock": i % 3 != 0,
+                }
+                for i in range(products)
+            ],
+        },
+        "onboarding_status": "completed",
+        "settings": {"plan": "pro", "language": "en"},
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+def validated_response(row: Dict[str, Any]) -> users.UserContextResponse:
+    """The router's row mapping before the fast path: a validating constructor"""
+    return users.UserContextResponse(
+        user_id=str(row["user_id"]),
+        business_data=row["business_data"] or {},
+        onboarding_status=row["onboarding_status"],
+        settings=row.get("settings", {}) or {},
+        created_at=row["created_at"].isoformat(),
+        updated_at=row["updated_at"].isoformat(),
+    )
+
+
+async def time_path(render: Callable[[], Any], repeat: int) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.process_time()
+        body = await render()
+        timings.append((time.process_time() - start) * 1000)
+    assert body
+    return timings
+
+
+async def run(products: int, repeat: int) -> None:
+    route = next(r for r in users.router.routes if r.path == "/users/context" and "GET" in r.methods)
+    row = build_row(products)
+
+    async def default() -> bytes:
+        content = await serialize_response(field=route.response_field, response_content=validated_response(row))
+        return JSONResponse(content).body
+
+    async def orjson_default() -> bytes:
+        content = await serialize_response(field=route.response_field, response_content=validated_response(row))
+        return responses.DEFAULT_RESPONSE_CLASS(content).body
+
+    async def fast() -> bytes:
+        responses.FAST_SERIALIZATION = True
+        return responses.model_response(users._to_response(row), Response()).body
+
+    size = len(await fast())
+    print(f"business_data with {products} products, {size / 1024:.0f} KiB response, {repeat} runs\n")
+    print(f"{'path':<10} {'median ms':>10} {'p95 ms':>10}")
+    medians = {}
+    for name, render in (("default", default), ("orjson", orjson_default), ("fast", fast)):
+        timings = sorted(await time_path(render, repeat))
+        medians[name] = statistics.median(timings)
+        print(f"{name:<10} {medians[name]:>10.3f} {timings[int(len(timings) * 0.95) - 1]:>10.3f}")
+    print(f"\nfast saves {medians['default'] - medians['fast']:.3f} ms CPU per request "
+          f"({medians['default'] / medians['fast']:.1f}x)")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=500, help="products in business_data")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args.products, args.repeat))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
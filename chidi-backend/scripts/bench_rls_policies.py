@@ -0,0 +1,265 @@
+"""
+Benchmark RLS policy shapes on a large messages table.
+
+Builds a scratch schema (``rls_bench``) with user_contexts, conversations and
+messages shaped like the real tables, then runs the same user-scoped
+queries under two policy sets:
+
+    old  the shape of migration 001: ``messages`` filtered through
+         ``conversation_id IN (SELECT ... JOIN user_contexts ...)``
+    new  the shape of migration 006: ``messages.user_id = (SELECT
+         current_setting('request.jwt.claim.sub', true))``
+
+001 keyed on ``current_user``, which cannot tell users apart behind a
+single database role, so the old shape here reads the same JWT claim
+setting (unwrapped, as 001 used ``current_user``). Only the shape differs.
+
+Queries run as a role without BYPASSRLS, inside a transaction with the
+claim set via ``set_config(..., true)``, exactly like the gateway.
+
+Usage (from chidi-backend/):
+    DATABASE_URL=postgresql://... python scripts/bench_rls_policies.py \\
+        --users 200 --conversations 10 --messages 500 --repeat 20
+
+Needs psycopg2. Drops the scratch schema afterwards unless ``--keep``.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from typing import Dict, List
+
+import psycopg2
+
+SCHEMA = "rls_bench"
+ROLE = "rls_bench_user"
+SUB = "(SELECT current_setting('request.jwt.claim.sub', true))"
+
+SETUP_SQL = f"""
+DROP SCHEMA IF EXISTS {SCHEMA} CASCADE;
+CREATE SCHEMA {SCHEMA};
+SET search_path = {SCHEMA}, public;
+
+CREATE TABLE user_contexts (
+    id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id text NOT NULL UNIQUE
+);
+CREATE TABLE conversations (
+    id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_context_id uuid NOT NULL REFERENCES user_contexts(id) ON DELETE CASCADE,
+    updated_at timestamp NOT NULL DEFAULT now()
+);
+CREATE TABLE messages (
+    id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    conversation_id uuid NOT NULL REFERENCES conversations(id) ON DELETE CASCADE,
+    user_id text NOT NULL,
+    content text NOT NULL,
+    created_at timestamp NOT NULL
+);
+
+INSERT INTO user_contexts (user_id)
+SELECT 'user-' || u FROM generate_series(1, %(users)s) u;
+
+INSERT INTO conversations (user_context_id, updated_at)
+SELECT uc.id, now() - c * interval '1 hour'
+FROM user_contexts uc, generate_series(1, %(conversations)s) c;
+
+INSERT INTO messages (conversation_id, user_id, content, created_at)
+SELECT c.id, uc.user_id, 'message ' || m, timestamp '2025-01-01' + m * interval '1 minute'
+FROM conversations c
+JOIN user_contexts uc ON uc.id = c.user_context_id,
+generate_series(1, %(messages)s) m;
+
+CREATE INDEX ON conversations (user_context_id, updated_at, id);
+CREATE INDEX ON messages (conversation_id, created_at, id);
+CREATE INDEX ON messages (user_id, created_at);
+CREATE STATISTICS messages_conversation_user_deps (dependencies) ON conversation_id, user_id FROM messages;
+ANALYZE user_contexts, conversations, messages;
+
+ALTER TABLE user_contexts ENABLE ROW LEVEL SECURITY;
+ALTER TABLE conversations ENABLE ROW LEVEL SECURITY;
+ALTER TABLE messages ENABLE ROW LEVEL SECURITY;
+
+DO $$ BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_roles WHERE rolname = '{ROLE}') THEN
+        CREATE ROLE {ROLE} NOLOGIN;
+    END IF;
+END $$;
+GRANT USAGE ON SCHEMA {SCHEMA} TO {ROLE};
+GRANT SELECT ON ALL TABLES IN SCHEMA {SCHEMA} TO {ROLE};
+"""
+
+DROP_POLICIES_SQL = f"""
+DROP POLICY IF EXISTS user_contexts_policy ON {SCHEMA}.user_contexts;
+DROP POLICY IF EXISTS conversations_policy ON {SCHEMA}.conversations;
+DROP POLICY IF EXISTS messages_policy ON {SCHEMA}.messages;
+"""
+
+OLD_CLAIM = "current_setting('request.jwt.claim.sub', true)"
+
+POLICIES = {
+    "old": f"""
+        CREATE POLICY user_contexts_policy ON {SCHEMA}.user_contexts
+        USING (user_id = {OLD_CLAIM});
+        CREATE POLICY conversations_policy ON {SCHEMA}.conversations
+        USING (user_context_id IN (SELECT id FROM {SCHEMA}.user_contexts WHERE user_id = {OLD_CLAIM}));
+        CREATE POLICY messages_policy ON {SCHEMA}.messages
+        USING (conversation_id IN (
+            SELECT c.id FROM {SCHEMA}.conversations c
+            JOIN {SCHEMA}.user_contexts uc ON c.user_context_id = uc.id
+            WHERE uc.user_id = {OLD_CLAIM}
+        ));
+    """,
+    "new": f"""
+        CREATE POLICY user_contexts_policy ON {SCHEMA}.user_contexts
+        USING (user_id = {SUB});
+        CREATE POLICY conversations_policy ON {SCHEMA}.conversations
+        USING (user_context_id = (SELECT id FROM {SCHEMA}.user_contexts WHERE user_id = {SUB}));
+        CREATE POLICY messages_policy ON {SCHEMA}.messages
+        USING (user_id = {SUB});
+    """,
+}
+
+# User-scoped queries the gateway issues; %(conversation_id)s is one of the user's threads
+QUERIES = {
+    "conversation_page": f"""
+        SELECT id, content, created_at FROM {SCHEMA}.messages
+        WHERE conversation_id = %(conversation_id)s
+        ORDER BY created_at, id LIMIT 50
+    """,
+    "recent_messages": f"""
+        SELECT id, content, created_at FROM {SCHEMA}.messages
+        ORDER BY created_at DESC LIMIT 50
+    """,
+    "count_messages": f"SELECT count(*) FROM {SCHEMA}.messages",
+    "list_conversations": f"""
+        SELECT id, updated_at FROM {SCHEMA}.conversations
+        ORDER BY updated_at DESC, id DESC LIMIT 20
+    """,
+}
+
+
+def _begin_as_user(cur, user_id: str) -> None:
+    # psycopg2 opens the transaction implicitly; both settings are transaction-local
+    cur.execute(
+        "SELECT set_config('request.jwt.claim.sub', %s, true), set_config('role', %s, true)",
+        (user_id, ROLE),
+    )
+
+
+def _plan_summary(plan_lines: List[str]) -> str:
+    """Condense an EXPLAIN ANALYZE plan into the parts that differ between policies"""
+    plan = "\n".join(plan_lines)
+    scans = sorted({
+        line.strip().split(" on ")[0].lstrip("-> ").split("  ")[0]
+        for line in plan_lines
+        if " on " in line and "Scan" in line
+    })
+    return (
+        f"subplans={plan.count('SubPlan')} initplans={plan.count('InitPlan')} "
+        f"hashed={'hashed SubPlan' in plan} scans={'; '.join(scans)}"
+    )
+
+
+def run(conn, repeat: int, user_id: str, conversation_id: str) -> Dict[str, Dict[str, Dict[str, object]]]:
+    results: Dict[str, Dict[str, Dict[str, object]]] = {}
+    cur = conn.cursor()
+    params = {"conversation_id": conversation_id}
+
+    for policy, create_sql in POLICIES.items():
+        cur.execute(DROP_POLICIES_SQL)
+        cur.execute(create_sql)
+        conn.commit()
+        results[policy] = {}
+
+        for name, sql in QUERIES.items():
+            _begin_as_user(cur, user_id)
+            cur.execute("EXPLAIN (ANALYZE, BUFFERS) " + sql, params)
+            plan = [row[0] for row in cur.fetchall()]
+            cur.execute(sql, params)
+            rows = len(cur.fetchall())
+            conn.rollback()
+
+            timings = []
+            for _ in range(repeat):
+                _begin_as_user(cur, user_id)
+                start = time.perf_counter()
+                cur.execute(sql, params)
+                cur.fetchall()
+                timings.append((time.perf_counter() - start) * 1000)
+                conn.rollback()
+
+            timings.sort()
+            results[policy][name] = {
+                "rows": rows,
+                "median_ms": statistics.median(timings),
+                "p95_ms": timings[max(int(len(timings) * 0.95) - 1, 0)],
+                "plan": _plan_summary(plan),
+                "plan_text": plan,
+            }
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--conversations", type=int, default=10, help="per user")
+    parser.add_argument("--messages", type=int, default=500, help="per conversation")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--keep", action="store_true", help="keep the rls_bench schema")
+    parser.add_argument("--plans", action="store_true", help="print full EXPLAIN output")
+    args = parser.parse_args()
+
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        print("DATABASE_URL is not set", file=sys.stderr)
+        return 1
+
+    conn = psycopg2.connect(database_url.replace("postgres://", "postgresql://", 1))
+    try:
+        total = args.users * args.conversations * args.messages
+        print(f"Building {SCHEMA}: {args.users} users, {total} messages ...")
+        start = time.perf_counter()
+        cur = conn.cursor()
+        cur.execute(SETUP_SQL, vars(args))
+        conn.commit()
+        print(f"  built in {time.perf_counter() - start:.1f}s")
+
+        cur.execute(
+            f"""
+            SELECT uc.user_id, c.id FROM {SCHEMA}.user_contexts uc
+            JOIN {SCHEMA}.conversations c ON c.user_context_id = uc.id
+            ORDER BY uc.user_id DESC, c.updated_at LIMIT 1
+            """
+        )
+        user_id, conversation_id = cur.fetchone()
+        conn.commit()
+
+        results = run(conn, args.repeat, user_id, str(conversation_id))
+
+        print(f"\nUser {user_id}, {args.repeat} runs per query\n")
+        print(f"{'query':<20} {'policy':<6} {'rows':>6} {'median ms':>10} {'p95 ms':>10}  plan")
+        for name in QUERIES:
+            for policy in POLICIES:
+                r = results[policy][name]
+                print(
+                    f"{name:<20} {policy:<6} {r['rows']:>6} {r['median_ms']:>10.2f} "
+                    f"{r['p95_ms']:>10.2f}  {r['plan']}"
+                )
+        if args.plans:
+            for policy in POLICIES:
+                for name in QUERIES:
+                    print(f"\n--- {policy} / {name} ---")
+                    print("\n".join(results[policy][name]["plan_text"]))
+    finally:
+        conn.rollback()
+        if not args.keep:
+            conn.cursor().execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            conn.commit()
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""
+Measure API gateway cold start: import cost, time to ready and boot memory.
+
+Each run starts a fresh interpreter, so nothing is cached between runs:
+
+    import   ``import app.main`` alone: wall time and resident memory
+             (what a pre-forking server pays once in the master)
+    serve    uvicorn from process start until ``--path`` answers 200,
+             and the worker's resident memory at that point
+
+Usage (from chidi-backend/, with the gateway's environment set):
+    python scripts/measure_cold_start.py --runs 5
+    python scripts/measure_cold_start.py --path /health   # trees without /ready
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+BACKEND_ROOT = Path(__file__).resolve().parent.parent
+GATEWAY_DIR = BACKEND_ROOT / "services" / "api-gateway"
+
+IMPORT_PROBE = """
+import json, time
+start = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - start
+rss = next(int(line.split()[1]) for line in open("/proc/self/status") if line.startswith("VmRSS:"))
+print(json.dumps({"seconds": elapsed, "rss_kib": rss}))
+"""
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [str(BACKEND_ROOT), str(GATEWAY_DIR), env.get("PYTHONPATH")])
+    )
+    return env
+
+
+def _rss_kib(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as status:
+        return next(int(line.split()[1]) for line in status if line.startswith("VmRSS:"))
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_import() -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE], cwd=GATEWAY_DIR, env=_env(),
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure_serve(path: str, timeout: float) -> dict:
+    port = _free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=GATEWAY_DIR, env=_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=1) as response:
+                    if response.status == 200:
+                        return {"seconds": time.perf_counter() - start, "rss_kib": _rss_kib(process.pid)}
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                pass
+            if process.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with {process.returncode}")
+            time.sleep(0.01)
+        raise RuntimeError(f"{path} not ready after {timeout}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/ready", help="endpoint that answers 200 once ready")
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    imports = [measure_import() for _ in range(args.runs)]
+    serves = [measure_serve(args.path, args.timeout) for _ in range(args.runs)]
+
+    print(f"{args.runs} runs, medians\n")
+    print(f"{'phase':<8} {'seconds':>8} {'RSS MiB':>8}")
+    for name, runs in (("import", imports), ("serve", serves)):
+        seconds = statistics.median(run["seconds"] for run in runs)
+        rss = statistics.median(run["rss_kib"] for run in runs) / 1024
+        print(f"{name:<8} {seconds:>8.3f} {rss:>8.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,63 @@
+"""
+Gunicorn settings for production serving.
+
+    gunicorn -c python:app.gunicorn_conf app.main:app
+
+The app is imported once in the master (``preload_app``) and forked, so
+imported modules and read-only state are shared copy-on-write. Engines,
+HTTP clients and log writers are created per worker in the lifespan.
+Workers log to the console only (LOG_TO_FILE=false); LOG_DIR is for
+single-process runs.
+Development keeps ``uvicorn --reload`` (docker-compose, ``python -m app.main``).
+
+Configuration (environment variables):
+    API_HOST, API_PORT                  bind address (default 0.0.0.0:8000)
+    WEB_CONCURRENCY                     worker processes (default: one per CPU the container may use)
+    GUNICORN_MAX_REQUESTS               restart a worker after this many requests (default 10000, 0 = never)
+    GUNICORN_MAX_REQUESTS_JITTER        random extra requests, so workers don't restart together (default 1000)
+    GUNICORN_MAX_WORKER_MEMORY_MB       restart a worker above this resident memory (default 0 = never)
+    GUNICORN_GRACEFUL_TIMEOUT           seconds a stopping worker gets to drain (default 30)
+    GUNICORN_TIMEOUT                    seconds before a silent worker is killed (default 60)
+    GUNICORN_KEEPALIVE                  idle keep-alive seconds; above the load balancer's (default 75)
+    FORWARDED_ALLOW_IPS                 comma-separated load balancer addresses whose X-Forwarded-For
+                                        is trusted (default 127.0.0.1)
+"""
+import math
+import os
+
+
+def cpu_limit() -> int:
+    """CPUs this process may use: the cgroup v2 quota, else its CPU affinity"""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as cpu_max:
+            quota, period = cpu_max.read().split()
+        if quota != "max":
+            return max(1, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+bind = f"{os.getenv('API_HOST', '0.0.0.0')}:{os.getenv('API_PORT', '8000')}"
+# Async workers: one per core is enough, each serves many connections
+workers = int(os.getenv("WEB_CONCURRENCY", "0")) or cpu_limit()
+worker_class = "app.serving.GatewayWorker"
+preload_app = True
+
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "1000"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "75"))
+
+# Request logs come from RequestInstrumentationMiddleware
+accesslog = None
+errorlog = "-"
+# Workers would race each other rotating one log file: console only
+raw_env = ["LOG_TO_FILE=false"]
+# X-Forwarded-* sets the client address (and so per-IP rate limits): only
+# trust it from the load balancer, never from any peer
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
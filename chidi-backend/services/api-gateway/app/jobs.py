@@ -0,0 +1,69 @@
+"""
+Background jobs run by the queue worker (``python -m app.worker``).
+
+Jobs are keyed by user id, so one user's jobs run in order. Handlers raise
+on failure so the queue retries them, and they must be safe to run twice.
+"""
+import logging
+from typing import Any, Dict, List, Sequence, Tuple
+from uuid import UUID
+
+from sqlalchemy import select
+
+from shared.database.models import UserContext
+from shared.database.rls import user_session
+from shared.llm.response_cache import get_response_cache
+from shared.llm.retrieval import sync_business_embeddings
+from shared.queue.streams import Job, get_queue
+from shared.queue.worker import Handler
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+user_contexts = UserContext.__table__
+
+
+async def embeddings_sync(job: Job) -> None:
+    """Re-embed the user's changed business_data"""
+    async with user_session(job.key) as db:
+        user_context_id = await db.scalar(select(user_contexts.c.id).where(user_contexts.c.user_id == job.key))
+        if user_context_id is not None:
+            await sync_business_embeddings(db, user_context_id)
+
+
+async def response_cache_purge(job: Job) -> None:
+    """Drop cached LLM answers based on an earlier business_data"""
+    async with user_session(job.key) as db:
+        purged = await get_response_cache().purge_stale(db, UUID(job.payload["user_context_id"]))
+        logger.info(f" Purged {purged} cached LLM responses for user: {job.key}")
+
+
+HANDLERS: Dict[str, Handler] = {
+    "embeddings.sync": embeddings_sync,
+    "response_cache.purge": response_cache_purge,
+    # webhook.whatsapp, webhook.instagram and webhook.messenger (POST /webhooks/meta)
+    # have no handler until business accounts are mapped to users: the worker
+    # moves them to the dead-letter stream, which is never trimmed, payload
+    # intact, rather than acking them unprocessed, so they can be re-enqueued
+    # once one exists.
+}
+
+
+async def enqueue_jobs(jobs: Sequence[Tuple[str, Dict[str, Any], str]]) -> bool:
+    """
+    Queue ``(job_type, payload, user_id)`` jobs for the worker.
+
+    Returns:
+        False when Redis is not configured or unreachable, so the caller can
+        run the work in-process instead
+    """
+    queue = get_queue()
+    if not queue.available:
+        return False
+    try:
+        ids: List[str] = await queue.enqueue_many(jobs)
+    except Exception as e:
+        logger.error(f" Could not enqueue {len(jobs)} jobs: {str(e)}")
+        return False
+    logger.info(f" Enqueued {len(ids)} jobs: {', '.join(job_type for job_type, _, _ in jobs)}")
+    return True
@@ -1,64 +1,140 @@
 """
 FastAPI main application
+
+Importing this module only wires routes and middleware: logging, the
+database engine, the JWT handler and warm-up are set up in ``lifespan``,
+once per worker process.
 """
 import os
 import logging
-import time
+from contextlib import asynccontextmanager
 from pathlib import Path
-from datetime import datetime
+from typing import Any, List, Optional
 from dotenv import load_dotenv
 from fastapi import FastAPI, Depends, HTTPException, status, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-# Load environment variables from backend root .env file
+# Load environment variables from backend root .env file. Modules read their
+# configuration when imported, so this comes first; it only reads one file.
 backend_root = Path(__file__).parent.parent.parent.parent
 env_path = backend_root / ".env"
 load_dotenv(env_path)
 
-# Create logs directory if it doesn't exist
-logs_dir = backend_root / "logs"
-logs_dir.mkdir(exist_ok=True)
-
-# Configure logging to file and console
-log_filename = f"chidi_api_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-log_filepath = logs_dir / log_filename
-
-# Configure handlers
-file_handler = logging.FileHandler(log_filepath)
-console_handler = logging.StreamHandler()
-
-# Configure formatter
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-file_handler.setFormatter(formatter)
-console_handler.setFormatter(formatter)
-
-# Configure root logger
-root_logger = logging.getLogger()
-root_logger.setLevel(logging.INFO)
-root_logger.addHandler(file_handler)
-root_logger.addHandler(console_handler)
-
 # Get application logger
 logger = logging.getLogger(__name__)
 
-from .routers import users
+from shared.auth.jwt_handler import close_jwt_handler, get_jwt_handler
+from shared.cache.redis import close_redis, get_redis
+from shared.database.connection import dispose_engines, get_async_engine, prefill_pool
+from shared.database.partitions import PartitionMaintenance
+from shared.database.schema import refresh_schema_capabilities
+from shared.llm.embeddings import close_embedder
+from shared.llm.providers.router import close_llm_router
+from shared.notifications.hub import get_notification_hub
+from shared.observability.logs import DroppingQueueHandler, configure_logging, shutdown_logging
+from shared.observability.metrics import REGISTRY
+from shared.observability.middleware import RequestInstrumentationMiddleware
+from shared.ratelimit.dependencies import IPRateLimit, UserRateLimit
+
+from .responses import DEFAULT_RESPONSE_CLASS
+from .routers import conversations, diagnostics, embeddings, exports, imports, notifications, users, webhooks
+from .startup import STARTUP_DB_POOL_WARM_SIZE, STARTUP_WARM_JWKS, Warmup
+
+
+def _log_environment(logs_dir: Optional[Path]) -> None:
+    """Log environment variables status (without exposing secrets)"""
+    logger.info("=== CHIDI API GATEWAY STARTUP ===")
+    logger.info(f"Logs will be saved to: {logs_dir or 'console only'}")
+    logger.info(f"Environment variables status:")
+    logger.info(f"  SUPABASE_URL: {'✓ Set' if os.getenv('SUPABASE_URL') else '✗ Missing'}")
+    logger.info(f"  SUPABASE_ANON_KEY: {'✓ Set' if os.getenv('SUPABASE_ANON_KEY') else '✗ Missing'}")
+    logger.info(f"  SUPABASE_JWT_SECRET: {'✓ Set' if os.getenv('SUPABASE_JWT_SECRET') else '✗ Missing'}")
+    logger.info(f"  DATABASE_URL: {'✓ Set' if os.getenv('DATABASE_URL') else '✗ Missing'}")
+
+
+async def _prefetch_jwks() -> List[str]:
+    key_store = get_jwt_handler().key_store
+    await key_store.refresh()
+    return key_store.kids
+
+
+def _warmup_steps() -> List[Any]:
+    """Work done before /ready passes: connect the pool, fetch signing keys, connect Redis"""
+    steps = []
+    if get_async_engine() is not None:
+        steps.append(("database_pool", lambda: prefill_pool(STARTUP_DB_POOL_WARM_SIZE)))
+    if STARTUP_WARM_JWKS:
+        steps.append(("jwks", _prefetch_jwks))
+    redis = get_redis()
+    if redis is not None:
+        # Tiered caches, rate limits and the job queue share this connection pool
+        steps.append(("redis", redis.ping))
+    return steps
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application startup and shutdown hooks"""
+    # Route logging through a queue to a background writer (rotated, gzipped files).
+    # Started here rather than at import so every worker process owns its writer thread.
+    logs_dir = configure_logging(log_dir=backend_root / "logs")
+    _log_environment(logs_dir)
+
+    engine = get_async_engine()
+    # Inspect the live schema once so requests never probe for missing columns
+    if engine is not None:
+        await refresh_schema_capabilities(engine)
+    # Keep JWKS keys fresh in the background for asymmetric tokens
+    get_jwt_handler().key_store.start()
+    # Drop L1 user context entries when other workers invalidate them
+    users.user_context_cache.start()
+    # Monthly messages partitions: create ahead, archive and purge past retention
+    partition_maintenance = PartitionMaintenance(engine) if engine is not None else None
+    if partition_maintenance is not None:
+        partition_maintenance.start()
+    app.state.draining = False
+    app.state.warmup = Warmup(_warmup_steps())
+    app.state.warmup.start()
+    logger.info("🚀 Chidi API started successfully")
+    yield
+    await app.state.warmup.stop()
+    if partition_maintenance is not None:
+        await partition_maintenance.stop()
+    await users.user_context_cache.stop()
+    # Ends open SSE streams; clients reconnect to another worker with Last-Event-ID
+    await get_notification_hub().stop()
+    await close_redis()
+    await close_jwt_handler()
+    await close_llm_router()
+    await close_embedder()
+    # Release pooled database connections on shutdown
+    await dispose_engines()
+    logger.info("🛑 Database connection pools closed")
+    # Flush queued log records last
+    shutdown_logging()
+
+
+async def drain() -> None:
+    """
+    Called by the production server (app.serving) on SIGTERM or a worker
+    restart, before it waits for open connections: fail readiness and end
+    SSE streams so their clients reconnect elsewhere.
+    """
+    app.state.draining = True
+    await get_notification_hub().stop()
+    logger.info("🚰 Draining: readiness failed, SSE streams closed")
+
 
 # Create FastAPI app
 app = FastAPI(
     title="Chidi API",
     description="Backend API for Chidi project",
     version="0.1.0",
+    lifespan=lifespan,
+    default_response_class=DEFAULT_RESPONSE_CLASS,
 )
-
-# Log environment variables status (without exposing secrets)
-logger.info("=== CHIDI API GATEWAY STARTUP ===")
-logger.info(f"Logs will be saved to: {log_filepath}")
-logger.info(f"Environment variables status:")
-logger.info(f"  SUPABASE_URL: {'✓ Set' if os.getenv('SUPABASE_URL') else '✗ Missing'}")
-logger.info(f"  SUPABASE_ANON_KEY: {'✓ Set' if os.getenv('SUPABASE_ANON_KEY') else '✗ Missing'}")
-logger.info(f"  SUPABASE_JWT_SECRET: {'✓ Set' if os.getenv('SUPABASE_JWT_SECRET') else '✗ Missing'}")
-logger.info(f"  DATABASE_URL: {'✓ Set' if os.getenv('DATABASE_URL') else '✗ Missing'}")
-
+app.state.drain = drain
 
 # Configure CORS
 app.add_middleware(
@@ -69,27 +145,42 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Request logging middleware
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    start_time = time.time()
-    
-    # Log incoming request
-    logger.info(f"🔄 Incoming request: {request.method} {request.url}")
-    logger.info(f"   Headers: {dict(request.headers)}")
-    logger.info(f"   Body: {await request.body()}")
-    
-    # Process request
-    response = await call_next(request)
-    
-    # Log response
-    process_time = time.time() - start_time
-    logger.info(f"✅ Response: {response.status_code} | Time: {process_time:.3f}s")
-    
-    return response
+# Request instrumentation (timing, metrics, opt-in capped body capture).
+# Added last so it wraps every other middleware.
+app.add_middleware(
+    RequestInstrumentationMiddleware,
+    capture_body_routes=[
+        route for route in os.getenv("REQUEST_BODY_CAPTURE_ROUTES", "").split(",") if route
+    ],
+    body_sample_rate=float(os.getenv("REQUEST_BODY_SAMPLE_RATE", "1.0")),
+    max_body_bytes=int(os.getenv("REQUEST_BODY_MAX_BYTES", "2048")),
+)
+
+# Export state owned by other modules on scrape
+REGISTRY.register_callback(
+    "auth_claims_cache_hits_total", "Verified JWT claims cache hits",
+    lambda: get_jwt_handler().claims_cache.hits, kind="counter",
+)
+REGISTRY.register_callback(
+    "auth_claims_cache_misses_total", "Verified JWT claims cache misses",
+    lambda: get_jwt_handler().claims_cache.misses, kind="counter",
+)
+REGISTRY.register_callback(
+    "log_records_dropped_total", "Log records dropped because the log queue was full",
+    lambda: DroppingQueueHandler.dropped, kind="counter",
+)
 
-# Mount routers
-app.include_router(users.router)
+# Mount routers; authenticated routers share the per-user "api" limit
+api_rate_limit = [Depends(UserRateLimit("api"))]
+app.include_router(users.router, dependencies=api_rate_limit)
+app.include_router(conversations.router, dependencies=api_rate_limit)
+app.include_router(exports.router, dependencies=api_rate_limit)
+app.include_router(imports.router, dependencies=api_rate_limit)
+app.include_router(embeddings.router, dependencies=api_rate_limit)
+app.include_router(webhooks.router, dependencies=[Depends(IPRateLimit("webhooks"))])
+app.include_router(notifications.router, dependencies=api_rate_limit)
+# Public, so limited per IP like webhooks
+app.include_router(diagnostics.router, dependencies=[Depends(IPRateLimit("diagnostics"))])
 
 # Health check endpoint
 @app.get("/health", tags=["Health"])
@@ -98,6 +189,26 @@ async def health_check():
     logger.info("🏥 Health check endpoint accessed")
     return {"status": "healthy", "message": "API is running"}
 
+# Readiness endpoint
+@app.get("/ready", tags=["Health"])
+async def readiness_check(request: Request):
+    """Readiness check: 503 until startup warm-up has finished, and while draining"""
+    warmup = getattr(request.app.state, "warmup", None)
+    if getattr(request.app.state, "draining", False):
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"status": "draining"})
+    if warmup is None or not warmup.ready:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"status": "starting", "warmup": warmup.results if warmup else {}},
+        )
+    return {"status": "ready", "warmup": warmup.results}
+
+# Metrics endpoint
+@app.get("/metrics", tags=["Health"], response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics for this process"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 # Root endpoint
 @app.get("/", tags=["Root"])
 async def root():
@@ -109,13 +220,12 @@ async def root():
         "version": "0.1.0",
     }
 
-logger.info("🚀 Chidi API started successfully")
-
-# Run the application
+# Run the application for development (python -m app.main); production
+# serving uses gunicorn with app.gunicorn_conf
 if __name__ == "__main__":
     import uvicorn
     
     host = os.getenv("API_HOST", "0.0.0.0")
     port = int(os.getenv("API_PORT", 8000))
     
-    uvicorn.run("main:app", host=host, port=port, reload=True)
+    uvicorn.run("app.main:app", host=host, port=port, reload=True)
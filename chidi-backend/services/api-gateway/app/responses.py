@@ -0,0 +1,59 @@
+"""
+Response classes and the fast serialization path.
+
+``DEFAULT_RESPONSE_CLASS`` encodes with orjson when it is installed, for
+every endpoint that returns plain data or a model.
+
+With ``FAST_SERIALIZATION`` on, endpoints that build their response model
+from database rows return it through ``model_response``. That skips
+FastAPI's second pass (``response_model`` validation and
+``jsonable_encoder`` walking the whole document) and lets pydantic-core
+write the JSON in one step. ``response_model`` stays on the route, so the
+OpenAPI schema is unchanged.
+
+Configuration (environment variables):
+    FAST_SERIALIZATION  pre-render trusted response models (default false)
+"""
+import os
+from typing import Union
+
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse
+except ImportError:  # optional: fall back to the standard-library encoder
+    orjson = None
+
+FAST_SERIALIZATION = os.getenv("FAST_SERIALIZATION", "false").lower() in ("1", "true", "yes")
+
+DEFAULT_RESPONSE_CLASS = ORJSONResponse if orjson is not None else JSONResponse
+
+
+def model_response(
+    model: BaseModel, response: Response, status_code: int = 200
+) -> Union[BaseModel, Response]:
+    """
+    Return ``model`` from an endpoint, pre-rendered when FAST_SERIALIZATION is on.
+
+    Only for models built from trusted data: nothing re-validates them.
+
+    Args:
+        model: The endpoint's response model instance
+        response: The request's injected Response; headers set on it by
+            dependencies (e.g. RateLimit-*) are carried over
+        status_code: Status of the pre-rendered response
+
+    Returns:
+        ``model`` itself, or a JSON Response with its serialized bytes
+    """
+    if not FAST_SERIALIZATION:
+        return model
+    return Response(
+        content=model.__pydantic_serializer__.to_json(model),
+        status_code=status_code,
+        headers=dict(response.headers),
+        media_type="application/json",
+    )
@@ -0,0 +1,258 @@
+"""
+Conversations router for reading chat history with keyset pagination
+"""
+import logging
+from typing import Any, Dict, List, Mapping, Optional
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from pydantic import BaseModel
+from sqlalchemy import select, tuple_
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shared.auth.dependencies import require_user_id
+from shared.database.rls import get_user_db
+from shared.database.models import Conversation, Message, UserContext
+from shared.database.pagination import (
+    MAX_PAGE_SIZE,
+    InvalidCursorError,
+    decode_cursor,
+    encode_cursor,
+)
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/conversations", tags=["Conversations"])
+
+user_contexts = UserContext.__table__
+conversations = Conversation.__table__
+messages = Message.__table__
+
+CONVERSATION_COLUMNS = (
+    conversations.c.id,
+    conversations.c.title,
+    conversations.c.source,
+    conversations.c.source_metadata,
+    conversations.c.is_archived,
+    conversations.c.created_at,
+    conversations.c.updated_at,
+)
+
+MESSAGE_COLUMNS = (
+    messages.c.id,
+    messages.c.conversation_id,
+    messages.c.role,
+    messages.c.content,
+    messages.c.message_metadata,
+    messages.c.created_at,
+)
+
+
+class ConversationResponse(BaseModel):
+    """Response model for a conversation"""
+    id: str
+    title: str
+    source: str
+    source_metadata: Optional[Dict[str, Any]] = None
+    is_archived: bool
+    created_at: str
+    updated_at: str
+
+
+class ConversationPage(BaseModel):
+    """A page of conversations, newest activity first"""
+    items: List[ConversationResponse]
+    next_cursor: Optional[str] = None
+
+
+class MessageResponse(BaseModel):
+    """Response model for a message"""
+    id: str
+    conversation_id: str
+    role: str
+    content: str
+    message_metadata: Optional[Dict[str, Any]] = None
+    created_at: str
+
+
+class MessagePage(BaseModel):
+    """A page of messages in chronological order"""
+    items: List[MessageResponse]
+    next_cursor: Optional[str] = None
+
+
+def _user_context_id(user_id: str):
+    """Scalar subquery resolving the caller's user_contexts.id"""
+    return (
+        select(user_contexts.c.id)
+        .where(user_contexts.c.user_id == user_id)
+        .scalar_subquery()
+    )
+
+
+def _decode(cursor: Optional[str]):
+    """Decode a ``(timestamp, id)`` cursor or fail the request with 400"""
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor, 2)
+    except InvalidCursorError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def _conversation_response(row: Mapping[str, Any]) -> ConversationResponse:
+    return ConversationResponse(
+        id=str(row["id"]),
+        title=row["title"],
+        source=row["source"],
+        source_metadata=row["source_metadata"],
+        is_archived=row["is_archived"],
+        created_at=row["created_at"].isoformat(),
+        updated_at=row["updated_at"].isoformat(),
+    )
+
+
+def _message_response(row: Mapping[str, Any]) -> MessageResponse:
+    return MessageResponse(
+        id=str(row["id"]),
+        conversation_id=str(row["conversation_id"]),
+        role=row["role"],
+        content=row["content"],
+        message_metadata=row["message_metadata"],
+        created_at=row["created_at"].isoformat(),
+    )
+
+
+@router.get("", response_model=ConversationPage)
+async def list_conversations(
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    include_archived: bool = False,
+    user_id: str = Depends(require_user_id),
+    db: AsyncSession = Depends(get_user_db),
+) -> ConversationPage:
+    """
+    List the current user's conversations, most recently active first.
+
+    Pages are read with a keyset seek on
+    ``idx_conversations_user_context_updated``, so every page costs the same
+    regardless of how deep the client has scrolled.
+
+    Args:
+        limit: Page size
+        cursor: Opaque cursor returned as ``next_cursor`` by the previous page
+        include_archived: Also return archived conversations
+        user_id: User ID extracted from JWT token via FastAPI dependency
+        db: Pooled async database session
+
+    Returns:
+        ConversationPage with the items and the cursor for the next page
+    """
+    after = _decode(cursor)
+    statement = (
+        select(*CONVERSATION_COLUMNS)
+        .where(conversations.c.user_context_id == _user_context_id(user_id))
+        .order_by(conversations.c.updated_at.desc(), conversations.c.id.desc())
+        .limit(limit + 1)
+    )
+    if after is not None:
+        statement = statement.where(
+            tuple_(conversations.c.updated_at, conversations.c.id) < tuple_(*after)
+        )
+    if not include_archived:
+        statement = statement.where(conversations.c.is_archived.is_(False))
+
+    try:
+        rows = (await db.execute(statement)).mappings().all()
+    except SQLAlchemyError as e:
+        logger.error(f" Database error in list_conversations: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Database operation failed: {str(e)}"
+        )
+
+    # One extra row was fetched to learn whether another page exists
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor((rows[-1]["updated_at"], rows[-1]["id"]))
+
+    return ConversationPage(
+        items=[_conversation_response(row) for row in rows],
+        next_cursor=next_cursor,
+    )
+
+
+@router.get("/{conversation_id}/messages", response_model=MessagePage)
+async def list_messages(
+    conversation_id: UUID,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    user_id: str = Depends(require_user_id),
+    db: AsyncSession = Depends(get_user_db),
+) -> MessagePage:
+    """
+    List a conversation's messages in chronological order.
+
+    Pages are read with a keyset seek on
+    ``idx_messages_conversation_created_id``, so fetch time stays flat for
+    conversations with hundreds of thousands of messages.
+
+    Args:
+        conversation_id: Conversation owned by the current user
+        limit: Page size
+        cursor: Opaque cursor returned as ``next_cursor`` by the previous page
+        user_id: User ID extracted from JWT token via FastAPI dependency
+        db: Pooled async database session
+
+    Returns:
+        MessagePage with the items and the cursor for the next page
+    """
+    after = _decode(cursor)
+    statement = (
+        select(*MESSAGE_COLUMNS)
+        .where(messages.c.conversation_id == conversation_id)
+        .order_by(messages.c.created_at, messages.c.id)
+        .limit(limit + 1)
+    )
+    if after is not None:
+        # The plain created_at bound lets Postgres prune older monthly partitions;
+        # the row comparison alone does not
+        statement = statement.where(
+            messages.c.created_at >= after[0],
+            tuple_(messages.c.created_at, messages.c.id) > tuple_(*after),
+        )
+
+    try:
+        owned = await db.scalar(
+            select(conversations.c.id)
+            .where(conversations.c.id == conversation_id)
+            .where(conversations.c.user_context_id == _user_context_id(user_id))
+        )
+        if owned is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Conversation not found"
+            )
+        rows = (await db.execute(statement)).mappings().all()
+    except SQLAlchemyError as e:
+        logger.error(f" Database error in list_messages: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Database operation failed: {str(e)}"
+        )
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor((rows[-1]["created_at"], rows[-1]["id"]))
+
+    return MessagePage(
+        items=[_message_response(row) for row in rows],
+        next_cursor=next_cursor,
+    )
@@ -0,0 +1,33 @@
+"""
+Diagnostics router exposing runtime decisions made by the gateway
+"""
+import logging
+from typing import Any, Dict
+
+from fastapi import APIRouter
+
+from shared.auth.jwt_handler import get_jwt_handler
+from shared.database.schema import get_schema_capabilities
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/diagnostics", tags=["Diagnostics"])
+
+
+@router.get("/schema")
+async def get_schema_diagnostics() -> Dict[str, Any]:
+    """
+    Report the schema capabilities detected at startup.
+
+    Shows the Alembic revision and which optional columns the gateway's SQL
+    is built with, e.g. whether ``user_contexts.settings`` is read.
+    """
+    return get_schema_capabilities().to_dict()
+
+
+@router.get("/auth-cache")
+async def get_auth_cache_diagnostics() -> Dict[str, Any]:
+    """Report the verified JWT claims cache counters and JWKS key store state"""
+    jwt_handler = get_jwt_handler()
+    return {**jwt_handler.cache_stats(), "jwks": jwt_handler.key_store.stats()}
@@ -0,0 +1,159 @@
+"""
+Embeddings router for retrieving relevant business context
+"""
+import logging
+import os
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shared.auth.dependencies import require_user_id
+from shared.ratelimit.dependencies import UserRateLimit
+from shared.database.models import UserContext
+from shared.database.rls import get_user_db, user_session
+from shared.llm.retrieval import search_business_embeddings, sync_business_embeddings
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/embeddings", tags=["Embeddings"])
+
+# Re-embed business_data in the background after PATCH /users/context
+EMBEDDING_SYNC_ON_UPDATE = os.getenv("EMBEDDING_SYNC_ON_UPDATE", "true").lower() in ("1", "true", "yes")
+
+user_contexts = UserContext.__table__
+
+
+class EmbeddingSyncResponse(BaseModel):
+    """Response model for an embeddings sync"""
+    chunks: int
+    embedded: int
+    unchanged: int
+    deleted: int
+    batches: int
+
+
+class BusinessContextMatch(BaseModel):
+    """One retrieved business_data chunk"""
+    chunk_key: str
+    content: str
+    score: float
+
+
+class BusinessContextSearchResponse(BaseModel):
+    """Response model for business context retrieval"""
+    results: List[BusinessContextMatch]
+
+
+async def _require_user_context_id(db: AsyncSession, user_id: str):
+    user_context_id = await db.scalar(select(user_contexts.c.id).where(user_contexts.c.user_id == user_id))
+    if user_context_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User context not found"
+        )
+    return user_context_id
+
+
+async def sync_user_embeddings(user_id: str) -> None:
+    """Background task: re-embed a user's changed business_data in its own session"""
+    async with user_session(user_id) as db:
+        try:
+            user_context_id = await db.scalar(select(user_contexts.c.id).where(user_contexts.c.user_id == user_id))
+            if user_context_id is not None:
+                await sync_business_embeddings(db, user_context_id)
+        except Exception as e:
+            logger.error(f" Background embeddings sync failed for user {user_id}: {str(e)}")
+            await db.rollback()
+
+
+@router.post("/sync", response_model=EmbeddingSyncResponse, dependencies=[Depends(UserRateLimit("embeddings_sync"))])
+async def sync_embeddings(
+    user_id: str = Depends(require_user_id),
+    db: AsyncSession = Depends(get_user_db),
+) -> EmbeddingSyncResponse:
+    """
+    Embed the current user's business_data; unchanged chunks are skipped.
+
+    Args:
+        user_id: User ID extracted from JWT token via FastAPI dependency
+        db: Pooled async database session
+
+    Returns:
+        EmbeddingSyncResponse with embedded/unchanged/deleted counts
+    """
+    logger.info(f" POST /embeddings/sync - Syncing business embeddings for user: {user_id}")
+    try:
+        user_context_id = await _require_user_context_id(db, user_id)
+        report = await sync_business_embeddings(db, user_context_id)
+    except HTTPException:
+        raise
+    except SQLAlchemyError as e:
+        logger.error(f" Database error in sync_embeddings: {str(e)}")
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Database operation failed: {str(e)}"
+        )
+    except Exception as e:
+        logger.error(f" Error syncing embeddings: {str(e)}")
+        logger.error(f"   Error type: {type(e).__name__}")
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"Embedding failed: {str(e)}"
+        )
+
+    return EmbeddingSyncResponse(
+        chunks=report.chunks,
+        embedded=report.embedded,
+        unchanged=report.unchanged,
+        deleted=report.deleted,
+        batches=report.batches,
+    )
+
+
+@router.get("/search", response_model=BusinessContextSearchResponse)
+async def search_embeddings(
+    q: str = Query(..., min_length=1, max_length=2000),
+    k: int = Query(5, ge=1, le=50),
+    user_id: str = Depends(require_user_id),
+    db: AsyncSession = Depends(get_user_db),
+) -> BusinessContextSearchResponse:
+    """
+    Retrieve the business_data chunks most relevant to a query.
+
+    Args:
+        q: Query text, e.g. the latest chat message
+        k: Number of chunks to return
+        user_id: User ID extracted from JWT token via FastAPI dependency
+        db: Pooled async database session
+
+    Returns:
+        BusinessContextSearchResponse with chunks ordered by similarity
+    """
+    logger.info(f" GET /embeddings/search - Top {k} business context chunks for user: {user_id}")
+    try:
+        user_context_id = await _require_user_context_id(db, user_id)
+        results = await search_business_embeddings(db, user_context_id, q, k=k)
+    except HTTPException:
+        raise
+    except SQLAlchemyError as e:
+        logger.error(f" Database error in search_embeddings: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Database operation failed: {str(e)}"
+        )
+    except Exception as e:
+        logger.error(f" Error searching embeddings: {str(e)}")
+        logger.error(f"   Error type: {type(e).__name__}")
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"Embedding failed: {str(e)}"
+        )
+
+    return BusinessContextSearchResponse(results=[BusinessContextMatch(**result) for result in results])
@@ -0,0 +1,206 @@
+"""
+Exports router streaming a user's full chat history as NDJSON
+"""
+import asyncio
+import json
+import logging
+import os
+import zlib
+from typing import Any, AsyncIterator, Dict, Mapping
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+
+from shared.auth.dependencies import require_admin, require_user_id
+from shared.ratelimit.dependencies import UserRateLimit
+from shared.database.connection import get_async_engine
+from shared.database.models import Conversation, Message, UserContext
+from shared.database.rls import DB_RLS_ENABLED, set_rls_claims
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/exports", tags=["Exports"])
+
+# Rows fetched per round trip from the server-side cursor
+EXPORT_FETCH_SIZE = int(os.getenv("EXPORT_FETCH_SIZE", "500"))
+# Bytes buffered before a chunk is handed to the client
+EXPORT_CHUNK_BYTES = int(os.getenv("EXPORT_CHUNK_BYTES", str(64 * 1024)))
+
+user_contexts = UserContext.__table__
+conversations = Conversation.__table__
+messages = Message.__table__
+
+
+def _export_statement(user_id: str):
+    """
+    Every conversation of the user with its messages, in one ordered scan.
+
+    Conversations without messages still appear once (LEFT JOIN), and each
+    conversation's messages are contiguous, so the stream needs no lookups.
+    """
+    return (
+        select(
+            conversations.c.id.label("conversation_id"),
+            conversations.c.title,
+            conversations.c.source,
+            conversations.c.source_metadata,
+            conversations.c.is_archived,
+            conversations.c.created_at.label("conversation_created_at"),
+            conversations.c.updated_at.label("conversation_updated_at"),
+            messages.c.id.label("message_id"),
+            messages.c.role,
+            messages.c.content,
+            messages.c.message_metadata,
+            messages.c.created_at.label("message_created_at"),
+        )
+        .select_from(
+            conversations.join(user_contexts, conversations.c.user_context_id == user_contexts.c.id)
+            .outerjoin(messages, messages.c.conversation_id == conversations.c.id)
+        )
+        .where(user_contexts.c.user_id == user_id)
+        .order_by(
+            conversations.c.created_at,
+            conversations.c.id,
+            messages.c.created_at,
+            messages.c.id,
+        )
+    )
+
+
+def _conversation_record(row: Mapping[str, Any]) -> Dict[str, Any]:
+    return {
+        "type": "conversation",
+        "id": str(row["conversation_id"]),
+        "title": row["title"],
+        "source": row["source"],
+        "source_metadata": row["source_metadata"],
+        "is_archived": row["is_archived"],
+        "created_at": row["conversation_created_at"].isoformat(),
+        "updated_at": row["conversation_updated_at"].isoformat(),
+    }
+
+
+def _message_record(row: Mapping[str, Any]) -> Dict[str, Any]:
+    return {
+        "type": "message",
+        "id": str(row["message_id"]),
+        "conversation_id": str(row["conversation_id"]),
+        "role": row["role"],
+        "content": row["content"],
+        "message_metadata": row["message_metadata"],
+        "created_at": row["message_created_at"].isoformat(),
+    }
+
+
+async def stream_user_export(user_id: str, compress: bool = False) -> AsyncIterator[bytes]:
+    """
+    Yield a user's conversations and messages as NDJSON chunks.
+
+    Rows are read through a server-side cursor, ``EXPORT_FETCH_SIZE`` at a
+    time, on a dedicated connection in a read-only REPEATABLE READ
+    transaction, so the export is a consistent snapshot. The cursor only
+    advances when the client has taken the previous chunk, which bounds
+    memory and applies backpressure. If the client disconnects the
+    generator is cancelled and the connection is returned to the pool.
+    """
+    compressor = zlib.compressobj(wbits=31) if compress else None  # 31 = gzip container
+    buffer = bytearray()
+    conversations_count = messages_count = 0
+    current_conversation = None
+
+    def take(force: bool = False) -> bytes:
+        if not force and len(buffer) < EXPORT_CHUNK_BYTES:
+            return b""
+        data = bytes(buffer)
+        buffer.clear()
+        if compressor is not None:
+            data = compressor.compress(data) + (compressor.flush() if force else b"")
+        return data
+
+    try:
+        async with get_async_engine().connect() as conn:
+            conn = await conn.execution_options(
+                isolation_level="REPEATABLE READ", postgresql_readonly=True
+            )
+            if DB_RLS_ENABLED:
+                await set_rls_claims(conn, user_id)
+            result = await conn.stream(
+                _export_statement(user_id).execution_options(yield_per=EXPORT_FETCH_SIZE)
+            )
+            async for partition in result.mappings().partitions():
+                for row in partition:
+                    if row["conversation_id"] != current_conversation:
+                        current_conversation = row["conversation_id"]
+                        conversations_count += 1
+                        buffer += json.dumps(_conversation_record(row), ensure_ascii=False).encode("utf-8") + b"\n"
+                    if row["message_id"] is not None:
+                        messages_count += 1
+                        buffer += json.dumps(_message_record(row), ensure_ascii=False).encode("utf-8") + b"\n"
+                chunk = take()
+                if chunk:
+                    yield chunk
+        chunk = take(force=True)
+        if chunk:
+            yield chunk
+    except (asyncio.CancelledError, GeneratorExit):
+        logger.warning(
+            f" Export for user {user_id} cancelled after {conversations_count} conversations "
+            f"and {messages_count} messages"
+        )
+        raise
+
+    logger.info(f" Exported {conversations_count} conversations and {messages_count} messages for user: {user_id}")
+
+
+def _export_response(user_id: str, compress: bool) -> StreamingResponse:
+    if get_async_engine() is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database is not configured"
+        )
+    filename = "chidi-export.ndjson.gz" if compress else "chidi-export.ndjson"
+    return StreamingResponse(
+        stream_user_export(user_id, compress=compress),
+        media_type="application/gzip" if compress else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/me", dependencies=[Depends(UserRateLimit("exports"))])
+async def export_my_data(
+    gzip: bool = False,
+    user_id: str = Depends(require_user_id),
+) -> StreamingResponse:
+    """
+    Stream the current user's conversations and messages as NDJSON.
+
+    Each line is a JSON object with ``type`` ``conversation`` or
+    ``message``; a conversation line precedes its messages.
+
+    Args:
+        gzip: Compress the stream (``.ndjson.gz``)
+        user_id: User ID extracted from JWT token via FastAPI dependency
+    """
+    logger.info(f" GET /exports/me - Exporting data for user: {user_id}")
+    return _export_response(user_id, gzip)
+
+
+@router.get("/users/{user_id}", dependencies=[Depends(UserRateLimit("exports"))])
+async def export_user_data(
+    user_id: str,
+    gzip: bool = False,
+    admin: Dict[str, Any] = Depends(require_admin),
+) -> StreamingResponse:
+    """
+    Stream any user's conversations and messages as NDJSON (support and
+    compliance requests). Same format as ``GET /exports/me``.
+
+    Args:
+        user_id: User whose data is exported
+        gzip: Compress the stream (``.ndjson.gz``)
+        admin: Authenticated admin user
+    """
+    logger.info(f" GET /exports/users/{user_id} - Export requested by admin: {admin['user_id']}")
+    return _export_response(user_id, gzip)
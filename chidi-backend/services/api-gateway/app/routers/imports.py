@@ -0,0 +1,158 @@
+"""
+Imports router for bulk-loading chat history from social channels
+"""
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from pydantic import BaseModel, Field
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+
+from shared.auth.dependencies import require_admin
+from shared.ratelimit.dependencies import UserRateLimit
+from shared.database.connection import get_async_engine
+from shared.database.ingest import (
+    INGEST_BATCH_SIZE,
+    IngestConversation,
+    IngestMessage,
+    IngestProgress,
+    ingest_messages,
+)
+from shared.database.models import UserContext
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/imports", tags=["Imports"])
+
+IMPORT_MAX_MESSAGES = int(os.getenv("IMPORT_MAX_MESSAGES", "100000"))
+
+user_contexts = UserContext.__table__
+
+
+class ImportConversation(BaseModel):
+    """A conversation thread on the source channel"""
+    external_id: str = Field(..., min_length=1)
+    title: Optional[str] = None
+    source_metadata: Optional[Dict[str, Any]] = None
+    updated_at: Optional[datetime] = None
+
+
+class ImportMessage(BaseModel):
+    """A message on the source channel"""
+    conversation_external_id: str = Field(..., min_length=1)
+    external_id: str = Field(..., min_length=1)
+    role: str  # user, assistant, system
+    content: str
+    created_at: datetime
+    message_metadata: Optional[Dict[str, Any]] = None
+
+
+class ImportRequest(BaseModel):
+    """Request model for a bulk message import"""
+    source: str = Field(..., min_length=1)  # instagram, whatsapp, etc.
+    conversations: List[ImportConversation] = []
+    messages: List[ImportMessage] = Field(default_factory=list, max_length=IMPORT_MAX_MESSAGES)
+    batch_size: int = Field(INGEST_BATCH_SIZE, ge=1, le=50000)
+
+
+class ImportResponse(BaseModel):
+    """Response model for a bulk message import"""
+    conversations_total: int
+    conversations_created: int
+    messages_total: int
+    messages_inserted: int
+    messages_skipped: int
+    batches_done: int
+
+
+@router.post("/users/{user_id}/messages", response_model=ImportResponse, dependencies=[Depends(UserRateLimit("bulk"))])
+async def import_messages(
+    user_id: str,
+    request: ImportRequest,
+    admin: Dict[str, Any] = Depends(require_admin),
+) -> ImportResponse:
+    """
+    Bulk-import a user's conversations and messages from a social channel.
+
+    Messages are keyed on ``(conversation, external_id, created_at)``, so
+    rerunning a failed or partial import only inserts what is missing. Each
+    batch is committed separately.
+
+    Args:
+        user_id: Owner of the imported history (must have a user context)
+        request: Channel, conversations and messages to import
+        admin: Authenticated admin user
+
+    Returns:
+        ImportResponse with created/inserted/skipped counts
+    """
+    logger.info(
+        f" POST /imports/users/{user_id}/messages - Importing {len(request.messages)} "
+        f"{request.source} messages (admin: {admin['user_id']})"
+    )
+    engine = get_async_engine()
+    if engine is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database is not configured"
+        )
+
+    def log_progress(progress: IngestProgress) -> None:
+        logger.info(
+            f"   Import progress for {user_id}: {progress.messages_processed}/{progress.messages_total} "
+            f"messages, {progress.messages_inserted} inserted"
+        )
+
+    try:
+        async with engine.connect() as conn:
+            user_context_id = await conn.scalar(
+                select(user_contexts.c.id).where(user_contexts.c.user_id == user_id)
+            )
+        if user_context_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User context not found"
+            )
+
+        result = await ingest_messages(
+            engine,
+            user_context_id,
+            request.source,
+            [IngestConversation(**conversation.model_dump()) for conversation in request.conversations],
+            [IngestMessage(**message.model_dump()) for message in request.messages],
+            batch_size=request.batch_size,
+            progress=log_progress,
+        )
+    except HTTPException:
+        raise
+    except (SQLAlchemyError, OSError) as e:
+        logger.error(f" Database error in import_messages: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Database operation failed: {str(e)}"
+        )
+    except Exception as e:
+        # asyncpg errors raised through the driver connection are not wrapped
+        logger.error(f" Error importing messages: {str(e)}")
+        logger.error(f"   Error type: {type(e).__name__}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Internal server error: {str(e)}"
+        )
+
+    logger.info(
+        f" Imported {result.messages_inserted} new messages into "
+        f"{result.conversations_total} conversations for user: {user_id}"
+    )
+    return ImportResponse(
+        conversations_total=result.conversations_total,
+        conversations_created=result.conversations_created,
+        messages_total=result.messages_total,
+        messages_inserted=result.messages_inserted,
+        messages_skipped=result.messages_skipped,
+        batches_done=result.batches_done,
+    )
@@ -0,0 +1,75 @@
+"""
+Notifications router: per-user server-sent events
+"""
+import logging
+import os
+from typing import AsyncIterator, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+
+from shared.auth.dependencies import require_user_id
+from shared.notifications.hub import NotificationHub, get_notification_hub
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/notifications", tags=["Notifications"])
+
+# Seconds between keep-alive comments, below typical proxy idle timeouts
+NOTIFY_HEARTBEAT_SECONDS = float(os.getenv("NOTIFY_HEARTBEAT_SECONDS", "15"))
+# Client reconnect delay sent with the stream
+NOTIFY_RETRY_MS = int(os.getenv("NOTIFY_RETRY_MS", "2000"))
+
+
+async def _events(
+    request: Request, hub: NotificationHub, user_id: str, last_event_id: Optional[str]
+) -> AsyncIterator[str]:
+    # Subscribed inside the generator so a connection dropped before streaming leaks nothing
+    subscription = await hub.subscribe(user_id, last_event_id)
+    try:
+        yield f"retry: {NOTIFY_RETRY_MS}\n\n"
+        while True:
+            event = await subscription.get(timeout=NOTIFY_HEARTBEAT_SECONDS)
+            if event is not None:
+                yield event.to_sse()
+            elif subscription.closed:
+                # Overflowed or shutting down: the client reconnects with Last-Event-ID
+                break
+            elif await request.is_disconnected():
+                break
+            else:
+                yield ": keep-alive\n\n"
+    finally:
+        hub.unsubscribe(subscription)
+
+
+@router.get("/stream")
+async def stream_notifications(
+    request: Request,
+    user_id: str = Depends(require_user_id),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+) -> StreamingResponse:
+    """
+    Stream the current user's notifications as server-sent events.
+
+    Args:
+        request: Used to notice client disconnects
+        user_id: User ID extracted from JWT token via FastAPI dependency
+        last_event_id: Sent by reconnecting clients; missed events are replayed first
+
+    Returns:
+        A text/event-stream response that stays open
+    """
+    hub = get_notification_hub()
+    if not hub.available:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Notifications need Redis"
+        )
+    logger.info(f" GET /notifications/stream - Opening stream for user: {user_id} (Last-Event-ID: {last_event_id})")
+    return StreamingResponse(
+        _events(request, hub, user_id, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -2,25 +2,50 @@
 Users router for user context management
 """
 import logging
-from typing import Dict, Any
 import os
-import json
+from typing import Dict, Any, List, Mapping, Optional
 
-import psycopg2
-from psycopg2.extras import Json
-from fastapi import APIRouter, Depends, HTTPException, status
-from pydantic import BaseModel
-import psycopg2.extras
-import os
-import sys
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Response, status
+from pydantic import BaseModel, Field
+from sqlalchemy import bindparam, exists, false, func, select, text, true, union_all, update
+from sqlalchemy.dialects.postgresql import JSONB, insert as pg_insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shared.auth.dependencies import get_current_user, require_admin, require_user_id
+from shared.ratelimit.dependencies import UserRateLimit
+from shared.cache.tiered import TieredCache
+from shared.database.connection import get_db
+from shared.database.rls import get_user_db, user_session
+from shared.database.models import UserContext
+from shared.database.schema import get_schema_capabilities
+from shared.llm.response_cache import get_response_cache
 
-from shared.auth.dependencies import get_current_user, require_user_id
+from ..jobs import enqueue_jobs
+from ..responses import model_response
+from .embeddings import EMBEDDING_SYNC_ON_UPDATE, sync_user_embeddings
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
+user_contexts = UserContext.__table__
+
+# Columns returned by every user context query
+CONTEXT_COLUMNS = (
+    user_contexts.c.id,
+    user_contexts.c.user_id,
+    user_contexts.c.business_data,
+    user_contexts.c.onboarding_status,
+    user_contexts.c.settings,
+    user_contexts.c.created_at,
+    user_contexts.c.updated_at,
+)
+CONTEXT_COLUMNS_WITHOUT_SETTINGS = tuple(
+    column for column in CONTEXT_COLUMNS if column.name != "settings"
+)
+
 
 class UserContextResponse(BaseModel):
     """Response model for user context"""
@@ -39,196 +64,187 @@ class UserContextCreateResponse(BaseModel):
     created: bool
 
 
-def get_db_connection():
-    """Get database connection with enhanced logging"""
-    logger.info(" Attempting database connection...")
-    
-    database_url = os.getenv("DATABASE_URL")
-    if not database_url:
-        logger.error(" DATABASE_URL environment variable not set")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Database configuration missing"
-        )
-    
-    # Log connection attempt (without exposing full URL)
-    logger.info(f" Connecting to database: {database_url[:20]}...")
-    
-    try:
-        conn = psycopg2.connect(database_url)
-        # Set autocommit to True to avoid transaction issues
-        conn.autocommit = False
-        logger.info(" Database connection established successfully")
-        return conn
-    except Exception as e:
-        logger.error(f" Database connection failed: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Database connection failed"
-        )
+class UserContextPatch(BaseModel):
+    """
+    Request model for a partial user context update.
+
+    ``business_data`` and ``settings`` are JSON merge patches (RFC 7396):
+    objects merge key by key, ``null`` removes a key, other values replace.
+    """
+    business_data: Optional[Dict[str, Any]] = None
+    settings: Optional[Dict[str, Any]] = None
+    onboarding_status: Optional[str] = None
+
+
+BULK_PROVISION_MAX = int(os.getenv("USER_CONTEXT_BULK_MAX", "10000"))
+
+
+class BulkProvisionRequest(BaseModel):
+    """Request model for bulk user context provisioning"""
+    user_ids: List[str] = Field(..., min_length=1, max_length=BULK_PROVISION_MAX)
+
+
+class BulkProvisionResponse(BaseModel):
+    """Response model for bulk user context provisioning"""
+    requested: int
+    created: int
+    existing: int
+    created_user_ids: List[str]
+
+
+# Set-based provisioning: one INSERT for the whole batch
+BULK_PROVISION_SQL = text(
+    """
+    INSERT INTO user_contexts (user_id, business_data, onboarding_status)
+    SELECT requested.user_id, '{}', 'pending'
+    FROM unnest(CAST(:user_ids AS text[])) AS requested(user_id)
+    ON CONFLICT (user_id) DO NOTHING
+    RETURNING user_id
+    """
+)
+
+
+# Read-through cache for GET /users/context (per-process LRU + Redis).
+# Every write to a user_contexts row must call user_context_cache.invalidate.
+user_context_cache = TieredCache(
+    "user_context",
+    dumps=lambda context: context.model_dump_json(),
+    loads=UserContextResponse.model_validate_json,
+    l1_maxsize=int(os.getenv("USER_CONTEXT_CACHE_L1_SIZE", "2048")),
+    l1_ttl=float(os.getenv("USER_CONTEXT_CACHE_L1_TTL", "30")),
+    l2_ttl=float(os.getenv("USER_CONTEXT_CACHE_L2_TTL", "300")),
+)
+
+
+async def _purge_response_cache(user_id: str, user_context_id) -> None:
+    """Background task: drop cached LLM answers based on the previous business_data"""
+    async with user_session(user_id) as db:
+        try:
+            purged = await get_response_cache().purge_stale(db, user_context_id)
+            logger.info(f" Purged {purged} cached LLM responses for user: {user_id}")
+        except Exception as e:
+            logger.error(f" Response cache purge failed for user {user_id}: {str(e)}")
+            await db.rollback()
+
+
+def _context_columns():
+    """Columns to read, based on the schema detected at startup"""
+    if get_schema_capabilities().has_settings_column:
+        return CONTEXT_COLUMNS
+    return CONTEXT_COLUMNS_WITHOUT_SETTINGS
+
+
+def _to_response(row: Mapping[str, Any]) -> UserContextResponse:
+    """
+    Convert a user_contexts row into the API response model.
+
+    Rows come from our own schema, so the model is built without
+    validation; walking a large business_data document is the costly part.
+    """
+    return UserContextResponse.model_construct(
+        user_id=str(row["user_id"]),
+        business_data=row["business_data"] or {},
+        onboarding_status=row["onboarding_status"],
+        settings=row.get("settings", {}) or {},  # Handle missing settings column
+        created_at=row["created_at"].isoformat(),
+        updated_at=row["updated_at"].isoformat(),
+    )
+
+
+async def _select_context(db: AsyncSession, user_id: str):
+    """Fetch the user context row"""
+    result = await db.execute(
+        select(*_context_columns()).where(user_contexts.c.user_id == user_id)
+    )
+    return result.mappings().first()
+
+
+def _merge_patch(column, patch: Dict[str, Any]):
+    """SQL expression applying a JSON merge patch to a JSONB column"""
+    return func.jsonb_merge_patch(column, bindparam(None, patch, type_=JSONB), type_=JSONB)
+
+
+def _provision_statement(user_id: str):
+    """
+    Insert-if-missing and return the row in one atomic statement.
+
+    The INSERT ... ON CONFLICT DO NOTHING runs in a CTE; if it inserted
+    nothing, the second branch returns the existing row. ``created`` tells
+    the two cases apart.
+    """
+    columns = _context_columns()
+    # settings is filled by its server default, so only RETURNING differs
+    inserted = (
+        pg_insert(user_contexts)
+        .values(user_id=user_id, business_data={}, onboarding_status="pending")
+        .on_conflict_do_nothing(index_elements=[user_contexts.c.user_id])
+        .returning(*columns)
+        .cte("inserted")
+    )
+    return union_all(
+        select(*(inserted.c[column.name] for column in columns), true().label("created")),
+        select(*columns, false().label("created"))
+        .where(user_contexts.c.user_id == user_id)
+        .where(~exists(select(inserted.c.id))),
+    )
+
+
+async def _provision_context(db: AsyncSession, user_id: str):
+    """Create the user context if needed and return ``(row, created)``"""
+    statement = _provision_statement(user_id)
+    row = (await db.execute(statement)).mappings().first()
+    if row is None:
+        # A concurrent transaction inserted the row after this statement's
+        # snapshot was taken; a new statement sees it.
+        row = (await db.execute(statement)).mappings().one()
+    await db.commit()
+    return row, row["created"]
 
 
 @router.post("/context", response_model=UserContextCreateResponse)
-def create_user_context(
-    user_id: str = Depends(require_user_id)
+async def create_user_context(
+    response: Response,
+    user_id: str = Depends(require_user_id),
+    db: AsyncSession = Depends(get_user_db),
 ) -> UserContextCreateResponse:
     """
     Create or retrieve user context (idempotent operation).
-    
+
     This endpoint creates a user_contexts record for the authenticated user
     if it doesn't already exist. If it exists, it returns the existing record.
-    
+
     Args:
+        response: Carries dependency headers onto a pre-rendered response
         user_id: User ID extracted from JWT token via FastAPI dependency
-        
+        db: Pooled async database session
+
     Returns:
         UserContextCreateResponse with context data and creation status
     """
     logger.info(f" POST /users/context - Creating/retrieving user context for user: {user_id}")
-    conn = None
     try:
-        # Get database connection
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        
-        logger.info(f" Checking if user context exists for user: {user_id}")
-        
-        # Check if user context already exists
-        try:
-            # Try with settings column
-            cursor.execute(
-                """
-                SELECT id, user_id, business_data, onboarding_status, settings, 
-                       created_at, updated_at
-                FROM user_contexts 
-                WHERE user_id = %s
-                """,
-                (user_id,)
-            )
-        except psycopg2.Error as e:
-            if 'column "settings" does not exist' in str(e):
-                logger.warning("⚠️ Settings column not found in user_contexts table. Using query without settings.")
-                # Rollback any failed transaction before trying again
-                conn.rollback()
-                
-                # Fallback query without settings column
-                cursor.execute(
-                    """
-                    SELECT id, user_id, business_data, onboarding_status, 
-                           created_at, updated_at
-                    FROM user_contexts 
-                    WHERE user_id = %s
-                    """,
-                    (user_id,)
-                )
-            else:
-                # Rollback and re-raise if it's a different error
-                conn.rollback()
-                raise
-                
-        existing_context = cursor.fetchone()
-        
-        if existing_context:
+        context, created = await _provision_context(db, user_id)
+
+        if not created:
             logger.info(f" User context already exists for user: {user_id}")
-            logger.info(f"   Context ID: {existing_context['id']}")
-            logger.info(f"   Onboarding Status: {existing_context['onboarding_status']}")
-            logger.info(f"   Created At: {existing_context['created_at']}")
-            
-            # Convert record to response format
-            user_context = UserContextResponse(
-                user_id=str(existing_context['user_id']),
-                business_data=existing_context['business_data'] or {},
-                onboarding_status=existing_context['onboarding_status'],
-                settings=existing_context.get('settings', {}) or {},  # Handle missing settings column
-                created_at=existing_context['created_at'].isoformat(),
-                updated_at=existing_context['updated_at'].isoformat()
-            )
-            
-            logger.info(f" Returning existing user context for user: {user_id}")
-            return UserContextCreateResponse(
+            return model_response(UserContextCreateResponse.model_construct(
                 message="User context retrieved successfully",
-                user_context=user_context,
+                user_context=_to_response(context),
                 created=False
-            )
-        
-        # Create new user context
-        logger.info(f" Creating new user context for user: {user_id}")
-        logger.info(f"   Default business_data: {{}}")
-        logger.info(f"   Default onboarding_status: 'pending'")
-        
-        # Check if settings column exists
-        try:
-            logger.info(f"   Default settings: {{}}")
-            cursor.execute(
-                """
-                INSERT INTO user_contexts (user_id, business_data, onboarding_status, settings)
-                VALUES (%s, %s, %s, %s)
-                RETURNING id, user_id, business_data, onboarding_status, settings, 
-                          created_at, updated_at
-                """,
-                (user_id, Json({}), 'pending', Json({}))
-            )
-        except psycopg2.Error as e:
-            # Always rollback on error
-            conn.rollback()
-            
-            if 'column "settings" does not exist' in str(e):
-                logger.warning("⚠️ Settings column not found in user_contexts table. Using insert without settings.")
-                # Fallback query without settings column
-                try:
-                    cursor.execute(
-                        """
-                        INSERT INTO user_contexts (user_id, business_data, onboarding_status)
-                        VALUES (%s, %s, %s)
-                        RETURNING id, user_id, business_data, onboarding_status, 
-                                  created_at, updated_at
-                        """,
-                        (user_id, Json({}), 'pending')
-                    )
-                except psycopg2.Error as inner_e:
-                    # Rollback again if the fallback fails
-                    conn.rollback()
-                    logger.error(f" Second database error: {str(inner_e)}")
-                    raise HTTPException(
-                        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                        detail=f"Database operation failed: {str(inner_e)}"
-                    )
-            else:
-                # Re-raise if it's a different error
-                logger.error(f" Database error: {str(e)}")
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail=f"Database operation failed: {str(e)}"
-                )
-        new_context = cursor.fetchone()
-        conn.commit()
-        
+            ), response)
+
+        await user_context_cache.invalidate(user_id)
         logger.info(f" Successfully created user context for user: {user_id}")
-        logger.info(f"   New Context ID: {new_context['id']}")
-        logger.info(f"   Created At: {new_context['created_at']}")
-        
-        # Convert record to response format
-        user_context = UserContextResponse(
-            user_id=str(new_context['user_id']),
-            business_data=new_context['business_data'] or {},
-            onboarding_status=new_context['onboarding_status'],
-            settings=new_context.get('settings', {}) or {},  # Handle missing settings column
-            created_at=new_context['created_at'].isoformat(),
-            updated_at=new_context['updated_at'].isoformat()
-        )
-        
-        logger.info(f" Returning newly created user context for user: {user_id}")
-        return UserContextCreateResponse(
+        logger.info(f"   New Context ID: {context['id']}")
+        return model_response(UserContextCreateResponse.model_construct(
             message="User context created successfully",
-            user_context=user_context,
+            user_context=_to_response(context),
             created=True
-        )
-        
-    except psycopg2.Error as e:
+        ), response)
+
+    except SQLAlchemyError as e:
         logger.error(f" Database error in create_user_context: {str(e)}")
-        logger.error(f"   Error code: {e.pgcode if hasattr(e, 'pgcode') else 'Unknown'}")
-        if conn:
-            conn.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Database operation failed: {str(e)}"
@@ -236,121 +252,189 @@ def create_user_context(
     except Exception as e:
         logger.error(f" Unexpected error in create_user_context: {str(e)}")
         logger.error(f"   Error type: {type(e).__name__}")
-        if conn:
-            conn.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Internal server error: {str(e)}"
         )
-    finally:
-        if conn:
-            conn.close()
-            logger.info(" Database connection closed")
 
 
 @router.get("/context", response_model=UserContextResponse)
-def get_user_context(
-    user_id: str = Depends(require_user_id)
+async def get_user_context(
+    response: Response,
+    user_id: str = Depends(require_user_id),
+    db: AsyncSession = Depends(get_user_db),
 ) -> UserContextResponse:
     """
     Get the current user's context.
-    
+
     Args:
+        response: Carries dependency headers onto a pre-rendered response
         user_id: User ID extracted from JWT token via FastAPI dependency
-        
+        db: Pooled async database session
+
     Returns:
         UserContextResponse with context data
     """
     logger.info(f" GET /users/context - Retrieving user context for user: {user_id}")
-    conn = None
+
+    async def load() -> Optional[UserContextResponse]:
+        row = await _select_context(db, user_id)
+        return _to_response(row) if row else None
+
     try:
-        # Get database connection
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        
-        logger.info(f" Querying user context for user: {user_id}")
-        
-        # Get user context
-        try:
-            # Try with settings column
-            cursor.execute(
-                """
-                SELECT id, user_id, business_data, onboarding_status, settings, 
-                       created_at, updated_at
-                FROM user_contexts 
-                WHERE user_id = %s
-                """,
-                (user_id,)
-            )
-        except psycopg2.Error as e:
-            # Always rollback on error
-            conn.rollback()
-            
-            if 'column "settings" does not exist' in str(e):
-                logger.warning("⚠️ Settings column not found in user_contexts table. Using query without settings.")
-                # Fallback query without settings column
-                try:
-                    cursor.execute(
-                        """
-                        SELECT id, user_id, business_data, onboarding_status, 
-                               created_at, updated_at
-                        FROM user_contexts 
-                        WHERE user_id = %s
-                        """,
-                        (user_id,)
-                    )
-                except psycopg2.Error as inner_e:
-                    # Rollback again if the fallback fails
-                    conn.rollback()
-                    logger.error(f" Second database error in GET: {str(inner_e)}")
-                    raise HTTPException(
-                        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                        detail=f"Database operation failed: {str(inner_e)}"
-                    )
-            else:
-                # Re-raise if it's a different error
-                logger.error(f" Database error in GET: {str(e)}")
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail=f"Database operation failed: {str(e)}"
-                )
-                
-        context = cursor.fetchone()
-        
+        context = await user_context_cache.get_or_load(user_id, load)
+
         if not context:
             logger.warning(f" User context not found for user: {user_id}")
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="User context not found"
             )
-        
+
         logger.info(f" User context found for user: {user_id}")
-        logger.info(f"   Context ID: {context['id']}")
-        logger.info(f"   Onboarding Status: {context['onboarding_status']}")
-        
-        # Convert record to response format
-        user_context = UserContextResponse(
-            user_id=str(context['user_id']),
-            business_data=context['business_data'] or {},
-            onboarding_status=context['onboarding_status'],
-            settings=context.get('settings', {}) or {},  # Handle missing settings column
-            created_at=context['created_at'].isoformat(),
-            updated_at=context['updated_at'].isoformat()
-        )
-        
-        logger.info(f" Returning user context for user: {user_id}")
-        return user_context
-        
+        return model_response(context, response)
+
     except HTTPException:
         # Re-raise HTTP exceptions as-is
         raise
+    except SQLAlchemyError as e:
+        logger.error(f" Database error in GET: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Database operation failed: {str(e)}"
+        )
     except Exception as e:
         logger.error(f" Error getting user context: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Internal server error: {str(e)}"
         )
-    finally:
-        if conn:
-            conn.close()
-            logger.info(" Database connection closed")
+
+
+@router.patch("/context", response_model=UserContextResponse)
+async def patch_user_context(
+    patch: UserContextPatch,
+    background_tasks: BackgroundTasks,
+    response: Response,
+    user_id: str = Depends(require_user_id),
+    db: AsyncSession = Depends(get_user_db),
+) -> UserContextResponse:
+    """
+    Partially update the current user's context.
+
+    The merge runs inside Postgres in a single UPDATE, so clients send only
+    the changed keys (e.g. one onboarding answer) and the document is never
+    read into the gateway.
+
+    Args:
+        patch: Merge patches for business_data/settings and an optional new onboarding_status
+        background_tasks: Runs the re-embed and cache purge in-process when no job queue is configured
+        response: Carries dependency headers onto a pre-rendered response
+        user_id: User ID extracted from JWT token via FastAPI dependency
+        db: Pooled async database session
+
+    Returns:
+        UserContextResponse with the updated context
+    """
+    logger.info(f" PATCH /users/context - Updating fields {sorted(patch.model_fields_set)} for user: {user_id}")
+
+    values: Dict[str, Any] = {}
+    if patch.business_data is not None:
+        values["business_data"] = _merge_patch(user_contexts.c.business_data, patch.business_data)
+    if patch.settings is not None:
+        values["settings"] = _merge_patch(user_contexts.c.settings, patch.settings)
+    if patch.onboarding_status is not None:
+        values["onboarding_status"] = patch.onboarding_status
+    if not values:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No fields to update"
+        )
+    if not get_schema_capabilities().has_merge_patch:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Partial updates require database migration 005"
+        )
+
+    try:
+        result = await db.execute(
+            update(user_contexts)
+            .where(user_contexts.c.user_id == user_id)
+            .values(**values, updated_at=func.now())
+            .returning(*_context_columns())
+        )
+        row = result.mappings().first()
+        if row is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User context not found"
+            )
+        await db.commit()
+    except HTTPException:
+        raise
+    except SQLAlchemyError as e:
+        logger.error(f" Database error in patch_user_context: {str(e)}")
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Database operation failed: {str(e)}"
+        )
+
+    await user_context_cache.invalidate(user_id)
+    if patch.business_data is not None:
+        # Cache keys carry the business_data version, so stale answers are
+        # already unreachable; this only frees their rows
+        jobs = [("response_cache.purge", {"user_context_id": str(row["id"])}, user_id)]
+        if EMBEDDING_SYNC_ON_UPDATE:
+            jobs.append(("embeddings.sync", {}, user_id))
+        if not await enqueue_jobs(jobs):
+            # No queue (Redis not configured): run in this process after the response
+            background_tasks.add_task(_purge_response_cache, user_id, row["id"])
+            if EMBEDDING_SYNC_ON_UPDATE:
+                background_tasks.add_task(sync_user_embeddings, user_id)
+    logger.info(f" User context updated for user: {user_id}")
+    return model_response(_to_response(row), response)
+
+
+@router.post("/context/bulk", response_model=BulkProvisionResponse, dependencies=[Depends(UserRateLimit("bulk"))])
+async def bulk_provision_user_contexts(
+    request: BulkProvisionRequest,
+    admin: Dict[str, Any] = Depends(require_admin),
+    db: AsyncSession = Depends(get_db),
+) -> BulkProvisionResponse:
+    """
+    Provision user contexts for many users in a single set-based statement.
+
+    Used for user migrations and bulk imports. Existing contexts are left
+    untouched, so the call is idempotent and safe to retry.
+
+    Args:
+        request: User IDs to provision (duplicates are ignored)
+        admin: Authenticated admin user
+        db: Pooled async database session
+
+    Returns:
+        BulkProvisionResponse with created/existing counts
+    """
+    user_ids = list(dict.fromkeys(user_id for user_id in request.user_ids if user_id))
+    logger.info(f" POST /users/context/bulk - Provisioning {len(user_ids)} user contexts (admin: {admin['user_id']})")
+    try:
+        result = await db.execute(BULK_PROVISION_SQL, {"user_ids": user_ids})
+        created_user_ids = list(result.scalars().all())
+        await db.commit()
+    except SQLAlchemyError as e:
+        logger.error(f" Database error in bulk_provision_user_contexts: {str(e)}")
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Database operation failed: {str(e)}"
+        )
+
+    logger.info(f" Bulk provisioning created {len(created_user_ids)} of {len(user_ids)} user contexts")
+    return BulkProvisionResponse(
+        requested=len(user_ids),
+        created=len(created_user_ids),
+        existing=len(user_ids) - len(created_user_ids),
+        created_user_ids=created_user_ids,
+    )
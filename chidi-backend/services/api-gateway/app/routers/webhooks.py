@@ -0,0 +1,229 @@
+"""
+Webhooks router for Instagram, Messenger and WhatsApp (Meta) deliveries
+"""
+import hashlib
+import hmac
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request, status
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+
+from shared.observability.metrics import REGISTRY
+from shared.queue.streams import get_queue
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/webhooks", tags=["Webhooks"])
+
+# App secrets that sign deliveries; comma-separated to allow rotation
+META_APP_SECRETS = [secret.encode("utf-8") for secret in os.getenv("META_APP_SECRET", "").split(",") if secret]
+META_WEBHOOK_VERIFY_TOKEN = os.getenv("META_WEBHOOK_VERIFY_TOKEN", "")
+# Meta retries a delivery for up to a day; events seen within this window are dropped
+WEBHOOK_DEDUPE_TTL = int(os.getenv("WEBHOOK_DEDUPE_TTL", "86400"))
+WEBHOOK_MAX_BODY_BYTES = int(os.getenv("WEBHOOK_MAX_BODY_BYTES", "1048576"))
+
+# Webhook ``object`` to job source
+SOURCES = {"whatsapp_business_account": "whatsapp", "instagram": "instagram", "page": "messenger"}
+
+webhook_events = REGISTRY.counter(
+    "webhook_events_total", "Webhook events received, by source and result", ("source", "result")
+)
+webhook_rejected = REGISTRY.counter("webhook_rejected_total", "Webhook deliveries rejected", ("reason",))
+
+
+class WebhookAck(BaseModel):
+    """Response model for an accepted delivery"""
+    received: int
+    queued: int
+    duplicates: int
+
+
+@dataclass
+class WebhookEvent:
+    """One message, status or change from a delivery; ``key`` orders one conversation's events"""
+    source: str
+    event_id: str
+    key: str
+    payload: Dict[str, Any]
+
+
+def _content_id(value: Any) -> str:
+    """Stable id for events Meta sends without one"""
+    return hashlib.sha256(json.dumps(value, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()[:32]
+
+
+def split_webhook(payload: Dict[str, Any]) -> List[WebhookEvent]:
+    """
+    Split a delivery into one event per message, status or change, in
+    delivery order. Meta batches several entries (and several messages
+    per entry) into one POST.
+    """
+    source = SOURCES.get(payload.get("object"), payload.get("object") or "unknown")
+    events: List[WebhookEvent] = []
+    for entry in payload.get("entry") or []:
+        entry_id = str(entry.get("id", ""))
+
+        # Instagram and Messenger messaging events
+        for event in entry.get("messaging") or []:
+            sender = str((event.get("sender") or {}).get("id", ""))
+            message_id = (event.get("message") or {}).get("mid")
+            events.append(WebhookEvent(
+                source, message_id or _content_id(event), f"{source}:{entry_id}:{sender}",
+                {"entry_id": entry_id, "messaging": event},
+            ))
+
+        for change in entry.get("changes") or []:
+            value = change.get("value") or {}
+            field = change.get("field")
+            if source == "whatsapp" and (value.get("messages") or value.get("statuses")):
+                phone_number_id = str((value.get("metadata") or {}).get("phone_number_id", entry_id))
+                context = {"entry_id": entry_id, "field": field, "metadata": value.get("metadata")}
+                for message in value.get("messages") or []:
+                    events.append(WebhookEvent(
+                        source, message.get("id") or _content_id(message),
+                        f"{source}:{phone_number_id}:{message.get('from', '')}",
+                        {**context, "contacts": value.get("contacts"), "message": message},
+                    ))
+                for message_status in value.get("statuses") or []:
+                    # One message moves through sent, delivered and read
+                    event_id = f"{message_status.get('id')}:{message_status.get('status')}"
+                    events.append(WebhookEvent(
+                        source, event_id if message_status.get("id") else _content_id(message_status),
+                        f"{source}:{phone_number_id}:{message_status.get('recipient_id', '')}",
+                        {**context, "status": message_status},
+                    ))
+            else:
+                # Comments, mentions, account and template updates
+                sender = str((value.get("from") or {}).get("id", ""))
+                events.append(WebhookEvent(
+                    source, _content_id(change), f"{source}:{entry_id}:{sender}",
+                    {"entry_id": entry_id, "field": field, "value": value},
+                ))
+    return events
+
+
+async def read_body(request: Request, limit: int) -> Optional[bytes]:
+    """The raw body, or None as soon as it exceeds ``limit`` bytes (chunked uploads carry no Content-Length)"""
+    chunks: List[bytes] = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > limit:
+            return None
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def verify_signature(body: bytes, signature: Optional[str]) -> bool:
+    """Check ``X-Hub-Signature-256`` (``sha256=<hex>``) against the raw body in constant time"""
+    if not signature or not signature.startswith("sha256="):
+        return False
+    expected = signature[7:].encode("latin-1")
+    return any(
+        hmac.compare_digest(hmac.new(secret, body, hashlib.sha256).hexdigest().encode("latin-1"), expected)
+        for secret in META_APP_SECRETS
+    )
+
+
+@router.get("/meta", response_class=PlainTextResponse)
+async def verify_subscription(
+    mode: str = Query("", alias="hub.mode"),
+    verify_token: str = Query("", alias="hub.verify_token"),
+    challenge: str = Query("", alias="hub.challenge"),
+) -> PlainTextResponse:
+    """
+    Subscription handshake: echo ``hub.challenge`` when the verify token matches.
+
+    Args:
+        mode: Always ``subscribe``
+        verify_token: Must equal META_WEBHOOK_VERIFY_TOKEN
+        challenge: Value to echo back
+
+    Returns:
+        The challenge as plain text
+    """
+    if (
+        mode != "subscribe"
+        or not META_WEBHOOK_VERIFY_TOKEN
+        or not hmac.compare_digest(verify_token.encode("utf-8"), META_WEBHOOK_VERIFY_TOKEN.encode("utf-8"))
+    ):
+        logger.warning(" GET /webhooks/meta - Subscription verification failed")
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Verification failed")
+    logger.info(" GET /webhooks/meta - Subscription verified")
+    return PlainTextResponse(challenge)
+
+
+@router.post("/meta", response_model=WebhookAck)
+async def receive_meta_webhook(request: Request) -> WebhookAck:
+    """
+    Accept an Instagram, Messenger or WhatsApp delivery and queue its events.
+
+    The signature is checked against the raw body before it is parsed.
+    Events already seen within WEBHOOK_DEDUPE_TTL (Meta retries) are
+    dropped; the rest are queued for the worker, ordered per conversation.
+
+    Args:
+        request: Raw request; the body is read once and never re-serialized
+
+    Returns:
+        WebhookAck with received/queued/duplicate event counts
+    """
+    if not META_APP_SECRETS:
+        webhook_rejected.inc(reason="not_configured")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Webhook secret not configured")
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > WEBHOOK_MAX_BODY_BYTES:
+        body = None
+    else:
+        body = await read_body(request, WEBHOOK_MAX_BODY_BYTES)
+    if body is None:
+        webhook_rejected.inc(reason="too_large")
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Payload too large")
+
+    if not verify_signature(body, request.headers.get("x-hub-signature-256")):
+        webhook_rejected.inc(reason="signature")
+        logger.warning(" POST /webhooks/meta - Invalid signature")
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid signature")
+    try:
+        events = split_webhook(json.loads(body))
+    except (ValueError, AttributeError, TypeError):
+        webhook_rejected.inc(reason="malformed")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Malformed payload")
+    if not events:
+        return WebhookAck(received=0, queued=0, duplicates=0)
+
+    queue = get_queue()
+    if not queue.available:
+        webhook_rejected.inc(reason="no_queue")
+        # Meta retries non-2xx deliveries, so nothing is lost
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Queue unavailable")
+
+    redis = queue.redis
+    dedupe_keys = [f"webhook:seen:{event.source}:{event.event_id}" for event in events]
+    try:
+        pipe = redis.pipeline(transaction=False)
+        for key in dedupe_keys:
+            pipe.set(key, 1, nx=True, ex=WEBHOOK_DEDUPE_TTL)
+        claimed = await pipe.execute()
+        new = [(event, key) for event, key, first in zip(events, dedupe_keys, claimed) if first]
+        if new:
+            try:
+                await queue.enqueue_many([(f"webhook.{event.source}", event.payload, event.key) for event, _ in new])
+            except Exception:
+                # Forget the events so Meta's retry is not dropped as a duplicate
+                await redis.delete(*[key for _, key in new])
+                raise
+    except Exception as e:
+        logger.error(f" Error queueing webhook events: {str(e)}")
+        webhook_rejected.inc(reason="queue_error")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Queue unavailable")
+
+    for event, first in zip(events, claimed):
+        webhook_events.inc(source=event.source, result="queued" if first else "duplicate")
+    return WebhookAck(received=len(events), queued=len(new), duplicates=len(events) - len(new))
@@ -0,0 +1,101 @@
+"""
+Gunicorn worker class for production serving (see ``app.gunicorn_conf``).
+
+A uvicorn worker that also:
+
+- restarts itself once its resident memory passes GUNICORN_MAX_WORKER_MEMORY_MB,
+  the same graceful way as after ``max_requests``;
+- on SIGTERM (or a restart), calls ``app.state.drain`` before waiting for
+  open connections, so SSE streams end at once and clients reconnect to
+  another worker instead of holding the shutdown until the timeout;
+- gives in-flight requests until shortly before gunicorn's
+  ``graceful_timeout`` and still runs the lifespan shutdown (log flush,
+  pool disposal) before the master would kill it.
+"""
+import logging
+import os
+import sys
+from typing import Any, List, Optional
+
+from gunicorn.arbiter import Arbiter
+from uvicorn.server import Server
+
+try:
+    from uvicorn_worker import UvicornWorker
+except ImportError:  # the copy bundled with uvicorn (deprecated upstream)
+    from uvicorn.workers import UvicornWorker
+
+logger = logging.getLogger(__name__)
+
+GUNICORN_MAX_WORKER_MEMORY_MB = int(os.getenv("GUNICORN_MAX_WORKER_MEMORY_MB", "0"))
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def resident_memory_bytes() -> Optional[int]:
+    """Current resident set size of this process (Linux), or None"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class GatewayServer(Server):
+    """uvicorn server with a memory ceiling and a drain hook"""
+
+    def __init__(self, config, max_memory_bytes: int = 0):
+        super().__init__(config)
+        self.max_memory_bytes = max_memory_bytes
+
+    async def startup(self, sockets: Optional[List[Any]] = None) -> None:
+        await super().startup(sockets=sockets)
+        rss = resident_memory_bytes()
+        if self.max_memory_bytes and rss is not None and rss >= self.max_memory_bytes:
+            # Restarting would not help: every new worker boots above the limit
+            logger.error(
+                f"Worker booted at {rss // 2**20} MiB, above GUNICORN_MAX_WORKER_MEMORY_MB "
+                f"({self.max_memory_bytes // 2**20} MiB); memory restarts disabled"
+            )
+            self.max_memory_bytes = 0
+
+    async def on_tick(self, counter: int) -> bool:
+        if await super().on_tick(counter):
+            return True
+        # Once every 5 seconds (a tick is 0.1s)
+        if self.max_memory_bytes and counter % 50 == 0:
+            rss = resident_memory_bytes()
+            if rss is not None and rss > self.max_memory_bytes:
+                logger.warning(
+                    f"Worker {os.getpid()} using {rss // 2**20} MiB "
+                    f"(limit {self.max_memory_bytes // 2**20} MiB); restarting"
+                )
+                return True
+        return False
+
+    async def shutdown(self, sockets: Optional[List[Any]] = None) -> None:
+        drain = getattr(getattr(self.config.app, "state", None), "drain", None)
+        if drain is not None:
+            try:
+                await drain()
+            except Exception as e:
+                logger.error(f"Drain hook failed: {str(e)}")
+        await super().shutdown(sockets=sockets)
+
+
+class GatewayWorker(UvicornWorker):
+    """Gunicorn worker running ``GatewayServer``"""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        # Leave a few seconds of gunicorn's graceful_timeout for the lifespan shutdown
+        self.config.timeout_graceful_shutdown = max(1, int(self.cfg.graceful_timeout) - 5)
+
+    async def _serve(self) -> None:
+        self.config.app = self.wsgi
+        server = GatewayServer(self.config, max_memory_bytes=GUNICORN_MAX_WORKER_MEMORY_MB * 2**20)
+        self._install_sigquit_handler()
+        await server.serve(sockets=self.sockets)
+        if not server.started:
+            # Tells the master not to keep respawning a worker that cannot boot
+            sys.exit(Arbiter.WORKER_BOOT_ERROR)
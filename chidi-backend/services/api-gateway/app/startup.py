@@ -0,0 +1,94 @@
+"""
+Warm-up run by the application lifespan before ``/ready`` reports ready.
+
+The steps run in the background once the server is listening, so
+``/health`` answers straight away while ``/ready`` returns 503 until every
+step has finished. Each step is best effort: a failure or timeout is
+logged and reported by ``/ready``, but still counts as finished, so an
+unreachable dependency does not hold every replica out of rotation.
+
+Metrics:
+    startup_warmup_seconds{step}   duration of each warm-up step
+    startup_ready                  1 once warm-up has finished
+
+Configuration (environment variables):
+    STARTUP_DB_POOL_WARM_SIZE   database connections opened ahead of traffic (default 2)
+    STARTUP_WARM_JWKS           prefetch the JWKS signing keys (default true)
+    STARTUP_WARMUP_TIMEOUT      seconds allowed per step (default 10)
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from shared.observability.metrics import REGISTRY, MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+STARTUP_DB_POOL_WARM_SIZE = int(os.getenv("STARTUP_DB_POOL_WARM_SIZE", "2"))
+STARTUP_WARM_JWKS = os.getenv("STARTUP_WARM_JWKS", "true").lower() in ("1", "true", "yes")
+STARTUP_WARMUP_TIMEOUT = float(os.getenv("STARTUP_WARMUP_TIMEOUT", "10"))
+
+Step = Tuple[str, Callable[[], Awaitable[Any]]]
+
+
+class Warmup:
+    """
+    Args:
+        steps: ``(name, coroutine function)`` pairs, run concurrently
+        timeout: Seconds allowed per step
+        registry: Metrics registry
+    """
+
+    def __init__(
+        self,
+        steps: List[Step],
+        timeout: float = STARTUP_WARMUP_TIMEOUT,
+        registry: MetricsRegistry = REGISTRY,
+    ):
+        self.steps = steps
+        self.timeout = timeout
+        self.ready = False
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+        self._durations = registry.gauge("startup_warmup_seconds", "Duration of each warm-up step", ("step",))
+        registry.register_callback("startup_ready", "1 once warm-up has finished", lambda: float(self.ready))
+
+    async def _run_step(self, name: str, step: Callable[[], Awaitable[Any]]) -> None:
+        start = time.perf_counter()
+        try:
+            detail = await asyncio.wait_for(step(), self.timeout)
+            result = {"ok": True, "detail": detail}
+        except asyncio.TimeoutError:
+            result = {"ok": False, "detail": f"timed out after {self.timeout}s"}
+        except Exception as e:
+            result = {"ok": False, "detail": str(e)}
+        result["seconds"] = round(time.perf_counter() - start, 3)
+        self._durations.set(result["seconds"], step=name)
+        self.results[name] = result
+        if result["ok"]:
+            logger.info(f" Warm-up step {name} done in {result['seconds']}s")
+        else:
+            logger.warning(f" Warm-up step {name} failed after {result['seconds']}s: {result['detail']}")
+
+    async def run(self) -> None:
+        start = time.perf_counter()
+        await asyncio.gather(*(self._run_step(name, step) for name, step in self.steps))
+        self.ready = True
+        logger.info(f" Warm-up finished in {time.perf_counter() - start:.3f}s; ready for traffic")
+
+    def start(self) -> None:
+        """Run the steps in the background (call from the application lifespan)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,95 @@
+"""
+Queue worker process: runs the jobs in ``app.jobs`` from the Redis Streams queue.
+
+    python -m app.worker
+
+Run as many processes as the backlog needs; shards rebalance between them.
+SIGTERM lets running jobs finish and hands the shards to the remaining
+workers. Prometheus metrics are served on ``QUEUE_WORKER_METRICS_PORT``
+(default 9101, 0 disables).
+"""
+import asyncio
+import contextlib
+import logging
+import os
+import signal
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# Load environment variables from backend root .env file
+backend_root = Path(__file__).parent.parent.parent.parent
+load_dotenv(backend_root / ".env")
+
+from shared.observability.logs import configure_logging, shutdown_logging
+
+configure_logging(log_dir=backend_root / "logs")
+
+# Get worker logger
+logger = logging.getLogger(__name__)
+
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+
+from shared.cache.redis import close_redis, get_redis
+from shared.database.connection import dispose_engines
+from shared.llm.embeddings import close_embedder
+from shared.observability.metrics import REGISTRY
+from shared.queue.streams import get_queue
+from shared.queue.worker import Worker
+
+from .jobs import HANDLERS
+
+QUEUE_WORKER_METRICS_PORT = int(os.getenv("QUEUE_WORKER_METRICS_PORT", "9101"))
+
+metrics_app = FastAPI(title="Chidi queue worker", docs_url=None, redoc_url=None, openapi_url=None)
+
+
+@metrics_app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics for this worker"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+class _MetricsServer(uvicorn.Server):
+    """Leaves SIGTERM/SIGINT to the worker"""
+
+    def install_signal_handlers(self) -> None:
+        pass
+
+    @contextlib.contextmanager
+    def capture_signals(self):
+        yield
+
+
+async def main() -> None:
+    if get_redis() is None:
+        raise SystemExit("REDIS_URL is not set (or the redis package is missing); the queue worker needs Redis")
+
+    worker = Worker(get_queue(), HANDLERS)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, worker.stop)
+
+    metrics_server = None
+    if QUEUE_WORKER_METRICS_PORT:
+        metrics_server = _MetricsServer(uvicorn.Config(
+            metrics_app, host="0.0.0.0", port=QUEUE_WORKER_METRICS_PORT, log_level="warning"
+        ))
+        metrics_task = asyncio.create_task(metrics_server.serve())
+
+    try:
+        await worker.run()
+    finally:
+        if metrics_server is not None:
+            metrics_server.should_exit = True
+            await metrics_task
+        await close_redis()
+        await close_embedder()
+        await dispose_engines()
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
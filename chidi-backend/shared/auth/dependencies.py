@@ -6,14 +6,13 @@ from typing import Optional, Dict, Any
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
-from .jwt_handler import JWTHandler
+from .jwt_handler import get_jwt_handler
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-# Initialize security scheme and JWT handler
+# Initialize security scheme
 security = HTTPBearer()
-jwt_handler = JWTHandler()
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security)
@@ -40,12 +39,12 @@ async def get_current_user(
         
         # Verify the JWT token
         logger.info(" Verifying JWT token...")
-        payload = await jwt_handler.verify_token(token)
+        payload = await get_jwt_handler().verify_token(token)
         logger.info(" JWT token verified successfully")
         
         # Extract user information
         logger.info(" Extracting user information from token payload...")
-        user_info = jwt_handler.extract_user_info(payload)
+        user_info = get_jwt_handler().extract_user_info(payload)
         
         # Ensure we have a valid user ID
         if not user_info.get("user_id"):
@@ -100,10 +99,10 @@ async def get_optional_user(
         logger.info(f"   Token provided, length: {len(token)}")
         
         # Verify the JWT token
-        payload = await jwt_handler.verify_token(token)
+        payload = await get_jwt_handler().verify_token(token)
         
         # Extract user information
-        user_info = jwt_handler.extract_user_info(payload)
+        user_info = get_jwt_handler().extract_user_info(payload)
         
         # Ensure we have a valid user ID
         if not user_info.get("user_id"):
@@ -131,3 +130,29 @@ def require_user_id(user: Dict[str, Any] = Depends(get_current_user)) -> str:
     user_id = user["user_id"]
     logger.info(f" User ID extracted for request: {user_id}")
     return user_id
+
+
+def require_admin(user: Dict[str, Any] = Depends(get_current_user)) -> Dict[str, Any]:
+    """
+    FastAPI dependency for admin/batch endpoints.
+
+    Requires ``app_metadata.role == "admin"`` on the token. app_metadata can
+    only be set server-side through the Supabase admin API, so users cannot
+    grant it to themselves.
+
+    Args:
+        user: User information from get_current_user
+
+    Returns:
+        User information dictionary
+
+    Raises:
+        HTTPException: 403 if the user is not an admin
+    """
+    if (user.get("app_metadata") or {}).get("role") != "admin":
+        logger.warning(f" Admin access denied for user: {user['user_id']}")
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin privileges required",
+        )
+    return user
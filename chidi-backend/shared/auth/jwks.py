@@ -0,0 +1,166 @@
+"""
+JWKS key store for asymmetric (RS256/ES256) Supabase JWT verification
+"""
+import asyncio
+import logging
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+import jwt
+
+logger = logging.getLogger(__name__)
+
+_MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+
+
+class JWKSKeyStore:
+    """
+    Parsed public keys from a JWKS endpoint, indexed by ``kid``.
+
+    - One pooled ``httpx.AsyncClient`` is reused for every fetch.
+    - Concurrent fetches (e.g. a burst of tokens with an unknown ``kid``)
+      are collapsed into a single request.
+    - Keys are refreshed in the background according to the response's
+      ``Cache-Control: max-age``; if the auth server is unreachable the last
+      known keys keep being served.
+    - Unknown ``kid`` lookups trigger at most one fetch per
+      ``min_refresh_interval`` so garbage tokens cannot hammer the endpoint.
+    """
+
+    def __init__(
+        self,
+        jwks_url: str,
+        api_key: Optional[str] = None,
+        default_max_age: float = 600,
+        min_refresh_interval: float = 30,
+        timeout: float = 5.0,
+        client: Optional[httpx.AsyncClient] = None,
+    ):
+        self.jwks_url = jwks_url
+        self.api_key = api_key
+        self.default_max_age = default_max_age
+        self.min_refresh_interval = min_refresh_interval
+        self._client = client or httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=4, max_keepalive_connections=2),
+        )
+
+        self._keys: Dict[str, jwt.PyJWK] = {}
+        self._expires_at = 0.0
+        self._last_attempt = float("-inf")
+        self._inflight: Optional[asyncio.Future] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._primed = asyncio.Event()
+
+    @property
+    def kids(self) -> List[str]:
+        return list(self._keys)
+
+    def is_stale(self) -> bool:
+        return time.monotonic() >= self._expires_at
+
+    async def get_key(self, kid: str) -> jwt.PyJWK:
+        """Return the public key for ``kid``, fetching the JWKS if needed"""
+        key = self._keys.get(kid)
+        if key is not None:
+            if self.is_stale() and self._inflight is None and self._refresh_task is None:
+                # No background refresher running: refresh without blocking this request
+                asyncio.ensure_future(self._refresh_quietly())
+            return key
+
+        if time.monotonic() - self._last_attempt >= self.min_refresh_interval or self._inflight:
+            await self.refresh()
+            key = self._keys.get(kid)
+
+        if key is None:
+            raise jwt.InvalidTokenError(f"Unable to find signing key with kid: {kid}")
+        return key
+
+    async def refresh(self) -> None:
+        """Fetch the JWKS, sharing one in-flight request between all callers"""
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._fetch())
+            self._inflight.add_done_callback(self._clear_inflight)
+        await asyncio.shield(self._inflight)
+
+    async def _refresh_quietly(self) -> None:
+        try:
+            await self.refresh()
+        except Exception:
+            # Already logged by _fetch; cached keys keep being served
+            pass
+
+    def _clear_inflight(self, future: asyncio.Future) -> None:
+        self._inflight = None
+        if not future.cancelled():
+            # Errors are logged in _fetch; retrieve them so asyncio doesn't warn
+            future.exception()
+
+    async def _fetch(self) -> None:
+        self._last_attempt = time.monotonic()
+        self._primed.set()
+        try:
+            logger.info(f"Fetching JWKS from: {self.jwks_url}")
+            headers = {"apikey": self.api_key} if self.api_key else {}
+            response = await self._client.get(self.jwks_url, headers=headers)
+            if response.status_code == 401 and self.api_key:
+                logger.warning("JWKS request with API key failed with 401, retrying without API key")
+                response = await self._client.get(self.jwks_url)
+            response.raise_for_status()
+
+            keys: Dict[str, jwt.PyJWK] = {}
+            for key_data in response.json().get("keys", []):
+                kid = key_data.get("kid")
+                if not kid:
+                    continue
+                try:
+                    keys[kid] = jwt.PyJWK(key_data)
+                except jwt.PyJWTError as e:
+                    logger.warning(f"Skipping unusable JWKS key {kid}: {str(e)}")
+
+            self._keys = keys
+            self._expires_at = time.monotonic() + self._max_age(response)
+            logger.info(f"Successfully fetched JWKS ({len(keys)} keys)")
+        except Exception as e:
+            # Keep serving the previous keys; retry after the minimum interval
+            self._expires_at = time.monotonic() + self.min_refresh_interval
+            logger.error(f"Failed to fetch JWKS, serving {len(self._keys)} cached keys: {str(e)}")
+            raise
+
+    def _max_age(self, response: httpx.Response) -> float:
+        match = _MAX_AGE_RE.search(response.headers.get("cache-control", ""))
+        max_age = float(match.group(1)) if match else self.default_max_age
+        return max(max_age, self.min_refresh_interval)
+
+    async def _refresh_loop(self) -> None:
+        # Only start polling once a token actually needed the JWKS, so
+        # HS256-only projects never call the endpoint.
+        await self._primed.wait()
+        while True:
+            await asyncio.sleep(max(self._expires_at - time.monotonic(), 1.0))
+            await self._refresh_quietly()
+
+    def start(self) -> None:
+        """Start the background refresher (call from the application lifespan)"""
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def aclose(self) -> None:
+        """Stop the background refresher and close the HTTP client"""
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+        await self._client.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "kids": self.kids,
+            "stale": self.is_stale(),
+            "expires_in": max(self._expires_at - time.monotonic(), 0.0),
+        }
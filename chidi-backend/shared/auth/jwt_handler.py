@@ -2,21 +2,32 @@
 JWT Handler for Supabase JWT verification
 """
 import os
+import time
+import hashlib
 import jwt
-import httpx
 import logging
 from typing import Optional, Dict, Any
-from datetime import datetime, timezone
-from functools import lru_cache
-from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.primitives.asymmetric import rsa
-from cryptography.hazmat.primitives.asymmetric import padding
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.serialization import load_pem_private_key
-from cryptography.hazmat.backends import default_backend
+
+from shared.cache.lru import TTLCache
+
+from .jwks import JWKSKeyStore
 
 logger = logging.getLogger(__name__)
 
+# Verified-claims cache configuration
+JWT_CACHE_MAX_SIZE = int(os.getenv("JWT_CACHE_MAX_SIZE", "10000"))
+# Upper bound on how long a verified token is trusted without re-verification
+JWT_CACHE_MAX_TTL = float(os.getenv("JWT_CACHE_MAX_TTL", "3600"))
+# Entries expire this many seconds before the token's exp
+JWT_CACHE_CLOCK_SKEW = float(os.getenv("JWT_CACHE_CLOCK_SKEW", "30"))
+
+# JWKS refresh configuration
+JWKS_DEFAULT_MAX_AGE = float(os.getenv("JWKS_DEFAULT_MAX_AGE", "600"))
+JWKS_MIN_REFRESH_INTERVAL = float(os.getenv("JWKS_MIN_REFRESH_INTERVAL", "30"))
+
+SYMMETRIC_ALGORITHMS = {"HS256"}
+ASYMMETRIC_ALGORITHMS = {"RS256", "ES256"}
+
 
 class JWTHandler:
     """Handle Supabase JWT verification"""
@@ -34,108 +45,83 @@ class JWTHandler:
             raise ValueError("SUPABASE_JWT_SECRET environment variable is required")
             
         self.jwks_url = f"{self.supabase_url}/auth/v1/jwks"
+        self.key_store = JWKSKeyStore(
+            self.jwks_url,
+            api_key=self.supabase_anon_key,
+            default_max_age=JWKS_DEFAULT_MAX_AGE,
+            min_refresh_interval=JWKS_MIN_REFRESH_INTERVAL,
+        )
+
+        # Verified payloads keyed by SHA-256 digest of the token. Only
+        # successful verifications are stored.
+        self.claims_cache: TTLCache[bytes, Dict[str, Any]] = TTLCache(maxsize=JWT_CACHE_MAX_SIZE)
+        self.cache_max_ttl = JWT_CACHE_MAX_TTL
+        self.cache_clock_skew = JWT_CACHE_CLOCK_SKEW
+
         logger.info(f"JWT Handler initialized with URL: {self.supabase_url}")
 
-    async def get_jwks(self) -> Dict[str, Any]:
-        """
-        Fetch JWKS from Supabase auth endpoint.
-        This method is kept for RS256 compatibility but not used for HS256.
+    async def verify_token(self, token: str) -> Dict[str, Any]:
         """
-        try:
-            logger.info(f"Fetching JWKS from: {self.jwks_url}")
-            
-            headers = {}
-            if self.supabase_anon_key:
-                headers["apikey"] = self.supabase_anon_key
-                logger.debug("Using API key for JWKS request")
-            
-            async with httpx.AsyncClient() as client:
-                response = await client.get(self.jwks_url, headers=headers)
-                
-                if response.status_code == 401 and self.supabase_anon_key:
-                    logger.warning("JWKS request with API key failed with 401, retrying without API key")
-                    response = await client.get(self.jwks_url)
-                
-                response.raise_for_status()
-                jwks_data = response.json()
-                logger.info("Successfully fetched JWKS")
-                return jwks_data
-                
-        except Exception as e:
-            logger.error(f"Failed to fetch JWKS: {str(e)}")
-            raise Exception(f"Failed to fetch JWKS: {str(e)}")
+        Verify a JWT token, serving repeat verifications from the claims cache.
 
-    def get_signing_key(self, jwks: Dict[str, Any], kid: str) -> str:
+        A cached payload is trusted until ``exp`` minus the clock-skew
+        allowance (or the max TTL, whichever is sooner). Tokens without
+        ``exp`` and failed verifications are never cached.
         """
-        Extract signing key from JWKS for the given key ID.
-        This method is kept for RS256 compatibility but not used for HS256.
-        """
-        try:
-            keys = jwks.get("keys", [])
-            for key in keys:
-                if key.get("kid") == kid:
-                    # Convert JWK to PEM format for RS256
-                    jwk = JsonWebKey.import_key(key)
-                    return jwk.get_public_key()
-            
-            raise Exception(f"Unable to find signing key with kid: {kid}")
-            
-        except Exception as e:
-            logger.error(f"Failed to get signing key: {str(e)}")
-            raise Exception(f"Failed to get signing key: {str(e)}")
+        cache_key = hashlib.sha256(token.encode("utf-8")).digest()
+        payload = self.claims_cache.get(cache_key)
+        if payload is not None:
+            logger.debug("JWT claims cache hit")
+            return payload
 
-    async def verify_token(self, token: str) -> Dict[str, Any]:
+        payload = await self._verify_token_uncached(token)
+
+        exp = payload.get("exp")
+        if isinstance(exp, (int, float)):
+            ttl = min(self.cache_max_ttl, exp - self.cache_clock_skew - time.time())
+            self.claims_cache.set(cache_key, payload, ttl=ttl)
+        return payload
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for the verified-claims cache"""
+        return self.claims_cache.stats()
+
+    async def _verify_token_uncached(self, token: str) -> Dict[str, Any]:
         """
-        Verify JWT token using HS256 algorithm with JWT secret.
-        Falls back to RS256 with JWKS if HS256 fails.
+        Verify a JWT token with the key type named by its header ``alg``.
+
+        HS256 tokens are checked against the JWT secret; asymmetric tokens
+        (RS256/ES256) against the JWKS key matching their ``kid``.
         """
         try:
-            logger.info("Attempting to verify JWT token")
-            logger.debug(f"Token length: {len(token)}")
-            
-            # First, try HS256 verification with JWT secret
-            try:
-                logger.debug("Attempting HS256 verification with JWT secret")
-                payload = jwt.decode(
-                    token,
-                    self.jwt_secret,
-                    algorithms=["HS256"],
-                    audience="authenticated",
-                    options={"verify_exp": True}
-                )
-                logger.info(f"Successfully verified HS256 token for user: {payload.get('sub')}")
-                return payload
-                
-            except Exception as hs256_error:
-                logger.warning(f"HS256 verification failed: {str(hs256_error)}")
-                logger.info("Falling back to RS256 verification with JWKS")
-                
-                # Fallback to RS256 verification with JWKS
-                unverified_header = jwt.get_unverified_header(token)
-                logger.debug(f"Token header: {unverified_header}")
-                
-                kid = unverified_header.get("kid")
+            header = jwt.get_unverified_header(token)
+            alg = header.get("alg")
+            logger.debug(f"Verifying {alg} token")
+
+            if alg in SYMMETRIC_ALGORITHMS:
+                key = self.jwt_secret
+            elif alg in ASYMMETRIC_ALGORITHMS:
+                kid = header.get("kid")
                 if not kid:
-                    raise Exception("Token header missing 'kid' field")
-                
-                logger.debug(f"Token kid: {kid}")
-                
-                # Get JWKS and find the signing key
-                jwks = await self.get_jwks()
-                signing_key = self.get_signing_key(jwks, kid)
-                
-                # Verify and decode the token with RS256
-                payload = jwt.decode(
-                    token,
-                    signing_key,
-                    algorithms=["RS256"],
-                    audience="authenticated",
-                    options={"verify_exp": True}
-                )
-                
-                logger.info(f"Successfully verified RS256 token for user: {payload.get('sub')}")
-                return payload
-            
+                    raise jwt.InvalidTokenError("Token header missing 'kid' field")
+                jwk = await self.key_store.get_key(kid)
+                # Refuse tokens whose alg disagrees with the key's declared alg
+                if jwk.algorithm_name and jwk.algorithm_name != alg:
+                    raise jwt.InvalidAlgorithmError(f"Key {kid} does not support {alg}")
+                key = jwk.key
+            else:
+                raise jwt.InvalidAlgorithmError(f"Unsupported token algorithm: {alg}")
+
+            payload = jwt.decode(
+                token,
+                key,
+                algorithms=[alg],
+                audience="authenticated",
+                options={"verify_exp": True}
+            )
+            logger.info(f"Successfully verified {alg} token for user: {payload.get('sub')}")
+            return payload
+
         except jwt.ExpiredSignatureError:
             logger.warning("Token has expired")
             raise Exception("Token has expired")
@@ -146,6 +132,10 @@ class JWTHandler:
             logger.error(f"Token verification failed: {str(e)}")
             raise Exception(f"Token verification failed: {str(e)}")
 
+    async def aclose(self) -> None:
+        """Release the JWKS HTTP client and background refresher"""
+        await self.key_store.aclose()
+
     def extract_user_info(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         """Extract user information from JWT payload"""
         return {
@@ -156,8 +146,29 @@ class JWTHandler:
             "exp": payload.get("exp"),
             "iat": payload.get("iat"),
             "iss": payload.get("iss"),
+            "app_metadata": payload.get("app_metadata") or {},
         }
 
 
-# Global JWT handler instance
-jwt_handler = JWTHandler()
+_handler: Optional[JWTHandler] = None
+
+
+def get_jwt_handler() -> JWTHandler:
+    """
+    The process-wide JWT handler, created on first use.
+
+    Raises:
+        ValueError: If the Supabase environment variables are missing
+    """
+    global _handler
+    if _handler is None:
+        _handler = JWTHandler()
+    return _handler
+
+
+async def close_jwt_handler() -> None:
+    """Release the handler's JWKS client. Call on application shutdown."""
+    global _handler
+    if _handler is not None:
+        await _handler.aclose()
+        _handler = None
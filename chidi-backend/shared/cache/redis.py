@@ -0,0 +1,64 @@
+"""
+Shared Redis client, created lazily from REDIS_URL
+"""
+import logging
+import os
+from typing import Any, AsyncIterator, Dict, Optional
+
+try:
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+_client: Optional["aioredis.Redis"] = None
+
+PUBSUB_POLL_SECONDS = 1.0
+
+
+def get_redis() -> Optional["aioredis.Redis"]:
+    """
+    Return the process-wide Redis client, or None when REDIS_URL is unset or
+    the redis package is missing (callers then skip their Redis tier).
+    """
+    global _client
+
+    if _client is None:
+        redis_url = os.getenv("REDIS_URL")
+        if not redis_url or not REDIS_AVAILABLE:
+            return None
+        _client = aioredis.from_url(
+            redis_url,
+            max_connections=int(os.getenv("REDIS_MAX_CONNECTIONS", "50")),
+            socket_timeout=float(os.getenv("REDIS_SOCKET_TIMEOUT", "2")),
+            socket_connect_timeout=float(os.getenv("REDIS_CONNECT_TIMEOUT", "2")),
+            health_check_interval=30,
+        )
+        logger.info("Redis client created")
+    return _client
+
+
+async def close_redis() -> None:
+    """Close the shared client's connection pool. Call on application shutdown."""
+    global _client
+
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def pubsub_messages(pubsub: Any, poll_timeout: float = PUBSUB_POLL_SECONDS) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yield the messages of a subscribed ``PubSub``, skipping subscribe replies.
+
+    Use instead of ``pubsub.listen()``: that blocks with the client's
+    ``socket_timeout`` and raises ``TimeoutError`` whenever the channel is
+    quiet for that long. Reads here wait at most ``poll_timeout`` and an idle
+    channel just polls again; connection errors still propagate.
+    """
+    while True:
+        message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=poll_timeout)
+        if message is not None:
+            yield message
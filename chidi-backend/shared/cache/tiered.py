@@ -0,0 +1,249 @@
+"""
+Two-tier read-through cache: per-process LRU (L1) in front of Redis (L2).
+
+Writes invalidate both tiers and publish the key on a Redis channel so every
+other worker drops its L1 copy. When Redis is unavailable the cache degrades
+to L1 only and never fails the request.
+
+An invalidation also bumps the key's generation (``<namespace>:gen:<key>``
+in Redis, mirrored in each process for keys being loaded). ``get_or_load``
+reads the generation before calling its loader and only caches the result
+if it has not changed, so a load that read the row before a concurrent
+write committed cannot put the old value back after the write's
+invalidation.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from redis.exceptions import WatchError
+
+from shared.observability.metrics import REGISTRY, MetricsRegistry
+
+from .lru import TTLCache
+from .redis import get_redis, pubsub_messages
+
+logger = logging.getLogger(__name__)
+
+
+class TieredCache:
+    """
+    Args:
+        namespace: Prefix for Redis keys, the invalidation channel and metrics.
+        dumps: Serialize a value to ``str``/``bytes`` for Redis.
+        loads: Deserialize a Redis value.
+        l1_maxsize: Entries kept per process.
+        l1_ttl: Seconds an entry lives in L1. Keep short: it bounds staleness
+            if an invalidation message is missed.
+        l2_ttl: Seconds an entry lives in Redis.
+        redis_factory: Returns the Redis client, or None to run L1-only.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        dumps: Callable[[Any], Any],
+        loads: Callable[[Any], Any],
+        l1_maxsize: int = 1024,
+        l1_ttl: float = 30,
+        l2_ttl: float = 300,
+        redis_factory: Callable[[], Any] = get_redis,
+        registry: MetricsRegistry = REGISTRY,
+    ):
+        self.namespace = namespace
+        self.dumps = dumps
+        self.loads = loads
+        self.l2_ttl = l2_ttl
+        self.channel = f"cache-invalidate:{namespace}"
+        self._redis_factory = redis_factory
+        self._l1: TTLCache[str, Any] = TTLCache(maxsize=l1_maxsize, ttl=l1_ttl)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Keys invalidated (here or by another worker) while their loader ran
+        self._invalidated_while_loading: Set[str] = set()
+        self._subscriber: Optional[asyncio.Task] = None
+        self.l2_hits = 0
+        self.l2_misses = 0
+
+        self._lookups = registry.counter(
+            "cache_lookups_total", "Cache lookups by tier and result", ("cache", "tier", "result")
+        )
+        registry.register_callback(
+            f"{namespace}_cache_l1_hit_ratio", f"L1 hit ratio of the {namespace} cache",
+            lambda: self._l1.stats()["hit_ratio"],
+        )
+        registry.register_callback(
+            f"{namespace}_cache_l2_hit_ratio", f"Redis hit ratio of the {namespace} cache",
+            lambda: self.l2_hits / max(self.l2_hits + self.l2_misses, 1),
+        )
+
+    def _redis_key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def _generation_key(self, key: str) -> str:
+        return f"{self.namespace}:gen:{key}"
+
+    def _drop_local(self, key: str) -> None:
+        self._l1.pop(key)
+        if key in self._inflight:
+            self._invalidated_while_loading.add(key)
+
+    async def _generation(self, redis: Any, key: str) -> Optional[bytes]:
+        try:
+            generation: Optional[bytes] = await redis.get(self._generation_key(key))
+            return generation
+        except Exception as e:
+            logger.warning(f"Redis read failed for {self.namespace} cache: {str(e)}")
+            return None
+
+    async def _set_if_current(self, redis: Any, key: str, value: Any, generation: Optional[bytes]) -> bool:
+        """Write L2 unless the key was invalidated since ``generation`` was read; False if it was"""
+        generation_key = self._generation_key(key)
+        try:
+            async with redis.pipeline(transaction=True) as pipe:
+                await pipe.watch(generation_key)
+                if await pipe.get(generation_key) != generation:
+                    return False
+                pipe.multi()
+                pipe.set(self._redis_key(key), self.dumps(value), ex=int(self.l2_ttl))
+                await pipe.execute()
+        except WatchError:
+            return False
+        except Exception as e:
+            # Redis is down: nothing in L2 to go stale, keep the L1 copy
+            logger.warning(f"Redis write failed for {self.namespace} cache: {str(e)}")
+        return True
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Look up L1, then Redis (populating L1). Returns None on a miss."""
+        value = self._l1.get(key)
+        if value is not None:
+            self._lookups.inc(cache=self.namespace, tier="l1", result="hit")
+            return value
+        self._lookups.inc(cache=self.namespace, tier="l1", result="miss")
+
+        redis = self._redis_factory()
+        if redis is None:
+            return None
+        try:
+            raw = await redis.get(self._redis_key(key))
+        except Exception as e:
+            logger.warning(f"Redis read failed for {self.namespace} cache: {str(e)}")
+            return None
+
+        if raw is None:
+            self.l2_misses += 1
+            self._lookups.inc(cache=self.namespace, tier="l2", result="miss")
+            return None
+
+        self.l2_hits += 1
+        self._lookups.inc(cache=self.namespace, tier="l2", result="hit")
+        value = self.loads(raw)
+        self._l1.set(key, value)
+        return value
+
+    async def set(self, key: str, value: Any) -> None:
+        """Store a value in both tiers"""
+        self._l1.set(key, value)
+        redis = self._redis_factory()
+        if redis is None:
+            return
+        try:
+            await redis.set(self._redis_key(key), self.dumps(value), ex=int(self.l2_ttl))
+        except Exception as e:
+            logger.warning(f"Redis write failed for {self.namespace} cache: {str(e)}")
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Optional[Any]]]) -> Optional[Any]:
+        """
+        Read-through lookup. Concurrent misses for the same key in this
+        process share one ``loader`` call. ``None`` results are not cached.
+        """
+        value = await self.get(key)
+        if value is not None:
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            redis = self._redis_factory()
+            # Read before the loader: an invalidation from here on means it may have read stale data
+            generation = await self._generation(redis, key) if redis is not None else None
+            value = await loader()
+            if value is not None and key not in self._invalidated_while_loading:
+                if redis is None or await self._set_if_current(redis, key, value, generation):
+                    self._l1.set(key, value)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so an unobserved failure doesn't log a warning
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+            self._invalidated_while_loading.discard(key)
+
+    async def invalidate(self, key: str) -> None:
+        """
+        Drop a key from both tiers, bump its generation and tell other
+        workers to drop their L1 copy. Call after the write has committed.
+        """
+        self._drop_local(key)
+        redis = self._redis_factory()
+        if redis is None:
+            return
+        try:
+            pipe = redis.pipeline(transaction=True)
+            pipe.delete(self._redis_key(key))
+            pipe.incr(self._generation_key(key))
+            # Loads take far less than this; an expired generation reads as changed
+            pipe.expire(self._generation_key(key), max(int(self.l2_ttl), 60))
+            await pipe.execute()
+            await redis.publish(self.channel, key)
+        except Exception as e:
+            logger.warning(f"Redis invalidation failed for {self.namespace} cache: {str(e)}")
+
+    async def _listen(self) -> None:
+        reconnecting = False
+        while True:
+            redis = self._redis_factory()
+            if redis is None:
+                return
+            pubsub = redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                if reconnecting:
+                    # Invalidations sent while disconnected were missed
+                    self._l1.clear()
+                    reconnecting = False
+                async for message in pubsub_messages(pubsub):
+                    data = message.get("data")
+                    if isinstance(data, bytes):
+                        data = data.decode("utf-8")
+                    if isinstance(data, str):
+                        self._drop_local(data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Invalidation subscriber for {self.namespace} cache failed: {str(e)}")
+                reconnecting = True
+                await asyncio.sleep(1.0)
+            finally:
+                await pubsub.aclose()
+
+    def start(self) -> None:
+        """Start listening for invalidations from other workers"""
+        if self._subscriber is None and self._redis_factory() is not None:
+            self._subscriber = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._subscriber is not None:
+            self._subscriber.cancel()
+            try:
+                await self._subscriber
+            except asyncio.CancelledError:
+                pass
+            self._subscriber = None
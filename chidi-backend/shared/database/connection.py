@@ -1,55 +1,153 @@
+"""
+Database engines and sessions, created lazily from DATABASE_URL.
+
+Importing this module builds nothing and never connects. The engines are
+created on first use by ``get_async_engine`` / ``get_sync_engine``, so a
+pre-forking server can import the app once and each worker still builds
+its own pool, and tools that never touch the database don't need
+DATABASE_URL at all.
+"""
+import asyncio
+import logging
 import os
-from typing import Generator, Optional
+from typing import AsyncGenerator, Any, Dict, Optional, Tuple
+from uuid import uuid4
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.orm import sessionmaker, Session
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
 
 # Import async dependencies only if available
 try:
-    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
     ASYNC_AVAILABLE = True
 except ImportError:
     ASYNC_AVAILABLE = False
 
 from .models import Base
 
-# For Alembic migrations and synchronous operations
-DATABASE_URL = os.getenv("DATABASE_URL")
+logger = logging.getLogger(__name__)
 
-# Remove the postgres:// prefix if present (SQLAlchemy requires postgresql://)
-if DATABASE_URL.startswith("postgres://"):
-    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
+# Pool configuration (shared by every service that uses the async engine)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Recycle before Supabase/pgbouncer idle timeouts close the server side
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
 
-# Create sync engine for Alembic migrations and synchronous operations
-sync_engine = create_engine(DATABASE_URL, echo=False)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=sync_engine)
+# Supabase's transaction-mode pooler (Supavisor/pgbouncer, port 6543) hands each
+# transaction to a different server connection, so named prepared statements
+# cannot be reused across transactions. Auto-detected from the port unless
+# explicitly configured.
+_pgbouncer_setting = os.getenv("DB_PGBOUNCER_TRANSACTION_MODE")
 
-# Create async engine for application use only if asyncpg is available
-async_engine = None
-AsyncSessionLocal = None
+_sync_engine: Optional[Engine] = None
+_sync_sessionmaker: Optional[sessionmaker] = None
+_async_engine: Optional["AsyncEngine"] = None
+_async_sessionmaker: Optional["async_sessionmaker"] = None
 
-if ASYNC_AVAILABLE:
-    try:
-        # Get async database URL from environment variables (for Supabase connection)
-        ASYNC_DATABASE_URL = os.environ.get(
-            "DATABASE_URL", 
-            DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://")
-        )
-        
-        # Create async engine for application use
-        async_engine = create_async_engine(ASYNC_DATABASE_URL, echo=False)
-        AsyncSessionLocal = sessionmaker(
-            async_engine, class_=AsyncSession, expire_on_commit=False
+
+def get_database_url() -> Optional[str]:
+    """DATABASE_URL for SQLAlchemy (``postgres://`` becomes ``postgresql://``), or None when unset"""
+    database_url = os.getenv("DATABASE_URL")
+    if database_url and database_url.startswith("postgres://"):
+        database_url = database_url.replace("postgres://", "postgresql://", 1)
+    return database_url or None
+
+
+def is_pgbouncer_transaction_mode(database_url: str) -> bool:
+    """Whether DATABASE_URL goes through a transaction-mode pooler"""
+    if _pgbouncer_setting is None:
+        return make_url(database_url).port == 6543
+    return _pgbouncer_setting.lower() in ("1", "true", "yes")
+
+
+def get_sync_engine() -> Engine:
+    """The synchronous engine (migrations, scripts), created on first use"""
+    global _sync_engine
+    if _sync_engine is None:
+        database_url = get_database_url()
+        if database_url is None:
+            raise RuntimeError("DATABASE_URL is not set")
+        _sync_engine = create_engine(database_url, echo=False, pool_pre_ping=DB_POOL_PRE_PING)
+    return _sync_engine
+
+
+def get_sync_sessionmaker() -> sessionmaker:
+    """Session factory bound to the synchronous engine"""
+    global _sync_sessionmaker
+    if _sync_sessionmaker is None:
+        _sync_sessionmaker = sessionmaker(autocommit=False, autoflush=False, bind=get_sync_engine())
+    return _sync_sessionmaker
+
+
+def build_async_url(database_url: str) -> Tuple[str, Dict[str, Any]]:
+    """
+    Convert a libpq-style DATABASE_URL into an asyncpg URL plus connect args.
+
+    asyncpg does not understand libpq query options such as ``sslmode``, so
+    they are translated into the equivalent ``connect_args``.
+    """
+    url = make_url(database_url).set(drivername="postgresql+asyncpg")
+    connect_args: Dict[str, Any] = {}
+
+    query = dict(url.query)
+    sslmode = query.pop("sslmode", None)
+    if sslmode and sslmode != "disable":
+        connect_args["ssl"] = sslmode
+    url = url.set(query=query)
+
+    if is_pgbouncer_transaction_mode(database_url):
+        # Disable both asyncpg's and SQLAlchemy's prepared statement caches and
+        # give each statement a unique name so it never collides on a shared
+        # server connection.
+        connect_args["statement_cache_size"] = 0
+        connect_args["prepared_statement_cache_size"] = 0
+        connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid4()}__"
+
+    return url.render_as_string(hide_password=False), connect_args
+
+
+def get_async_engine() -> Optional["AsyncEngine"]:
+    """
+    The pooled async engine for application use, created on first use.
+
+    Returns:
+        The engine, or None when DATABASE_URL is unset or asyncpg is missing
+    """
+    global _async_engine, _async_sessionmaker
+    if _async_engine is None:
+        database_url = get_database_url()
+        if database_url is None or not ASYNC_AVAILABLE:
+            return None
+        try:
+            async_url, connect_args = build_async_url(database_url)
+            _async_engine = create_async_engine(
+                async_url,
+                echo=False,
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT,
+                pool_recycle=DB_POOL_RECYCLE,
+                pool_pre_ping=DB_POOL_PRE_PING,
+                connect_args=connect_args,
+            )
+        except Exception as e:
+            logger.warning(f"Could not create async database engine: {e}")
+            return None
+        _async_sessionmaker = async_sessionmaker(
+            _async_engine, class_=AsyncSession, expire_on_commit=False
         )
-    except Exception as e:
-        print(f"Warning: Could not create async database engine: {e}")
-        # Fall back to sync engine for development/testing
+    return _async_engine
+
+
+def get_async_sessionmaker() -> Optional["async_sessionmaker"]:
+    """Session factory bound to the async engine, or None when there is no engine"""
+    get_async_engine()
+    return _async_sessionmaker
 
 
-async def get_db() -> Generator[AsyncSession, None, None]:
+async def get_db() -> AsyncGenerator["AsyncSession", None]:
     """
     Dependency for FastAPI to get a database session.
     Usage:
@@ -57,8 +155,46 @@ async def get_db() -> Generator[AsyncSession, None, None]:
         async def read_items(db: AsyncSession = Depends(get_db)):
             ...
     """
-    db = AsyncSessionLocal()
+    session_factory = get_async_sessionmaker()
+    if session_factory is None:
+        raise RuntimeError("Async database engine is not configured")
+
+    db = session_factory()
     try:
         yield db
     finally:
         await db.close()
+
+
+async def prefill_pool(size: int) -> int:
+    """
+    Open up to ``size`` pooled connections ahead of traffic, so the first
+    requests don't pay for TCP/TLS setup and authentication.
+
+    Returns:
+        The number of connections opened
+    """
+    engine = get_async_engine()
+    if engine is None or size <= 0:
+        return 0
+    connections = await asyncio.gather(
+        *(engine.connect() for _ in range(min(size, DB_POOL_SIZE))), return_exceptions=True
+    )
+    opened = [conn for conn in connections if not isinstance(conn, BaseException)]
+    # Closing returns them to the pool, still connected
+    for conn in opened:
+        await conn.close()
+    errors = [conn for conn in connections if isinstance(conn, BaseException)]
+    if errors and not opened:
+        raise errors[0]
+    return len(opened)
+
+
+async def dispose_engines() -> None:
+    """Close all pooled connections. Call on application shutdown."""
+    global _sync_engine, _sync_sessionmaker, _async_engine, _async_sessionmaker
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    if _sync_engine is not None:
+        _sync_engine.dispose()
+    _sync_engine = _sync_sessionmaker = _async_engine = _async_sessionmaker = None
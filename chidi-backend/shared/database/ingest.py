@@ -0,0 +1,293 @@
+"""
+Bulk ingestion of conversations and messages from external channels.
+
+Used to backfill a user's Instagram/WhatsApp history when an account is
+connected. Conversations are resolved in sets (one upsert per batch), and
+messages are loaded with ``COPY`` into a transaction-local staging table
+and moved into ``messages`` with a single ``INSERT ... SELECT``. Rows are
+keyed on the channel's own ids (``external_id``, plus the message timestamp
+since ``messages`` is partitioned on it), so a failed import can simply be
+rerun: rows that already exist are skipped. Each message's token count is
+computed here, once, for the chat context window (shared/llm).
+
+Each batch commits on its own, so progress survives a failure midway.
+"""
+import inspect
+import json
+import logging
+import os
+from dataclasses import asdict, dataclass, field, replace
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, overload
+from uuid import UUID
+
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from shared.llm.tokens import get_token_counter
+
+logger = logging.getLogger(__name__)
+
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "5000"))
+
+
+@dataclass
+class IngestConversation:
+    """A conversation thread on the source channel"""
+    external_id: str
+    title: Optional[str] = None
+    source_metadata: Optional[Dict[str, Any]] = None
+    # Last activity on the channel; defaults to the newest imported message
+    updated_at: Optional[datetime] = None
+
+
+@dataclass
+class IngestMessage:
+    """A message on the source channel"""
+    conversation_external_id: str
+    external_id: str
+    role: str
+    content: str
+    created_at: datetime
+    message_metadata: Optional[Dict[str, Any]] = None
+
+
+@dataclass
+class IngestProgress:
+    """Running totals, passed to the progress callback after every batch"""
+    conversations_total: int = 0
+    conversations_created: int = 0
+    messages_total: int = 0
+    messages_processed: int = 0
+    messages_inserted: int = 0
+    batches_done: int = 0
+    unknown_conversations: List[str] = field(default_factory=list)
+
+    @property
+    def messages_skipped(self) -> int:
+        """Messages that already existed (or were duplicated in the input)"""
+        return self.messages_processed - self.messages_inserted
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), "messages_skipped": self.messages_skipped}
+
+
+# Insert the missing conversations and return ids for all requested ones
+RESOLVE_CONVERSATIONS_SQL = """
+WITH incoming AS (
+    SELECT DISTINCT ON (external_id) external_id, title, source_metadata, updated_at
+    FROM unnest($3::text[], $4::text[], $5::text[], $6::timestamp[])
+        AS t(external_id, title, source_metadata, updated_at)
+),
+inserted AS (
+    INSERT INTO conversations (user_context_id, source, external_id, title, source_metadata, created_at, updated_at)
+    SELECT $1, $2, external_id, coalesce(title, 'New Conversation'), CAST(source_metadata AS jsonb),
+           coalesce(updated_at, now()), coalesce(updated_at, now())
+    FROM incoming
+    ON CONFLICT (user_context_id, source, external_id) DO NOTHING
+    RETURNING id, external_id
+)
+SELECT id, external_id, true AS created FROM inserted
+UNION ALL
+SELECT c.id, c.external_id, false AS created
+FROM conversations c
+WHERE c.user_context_id = $1
+  AND c.source = $2
+  AND c.external_id = ANY($3::text[])
+  AND NOT EXISTS (SELECT 1 FROM inserted i WHERE i.external_id = c.external_id)
+"""
+
+STAGING_TABLE = "ingest_messages_staging"
+STAGING_COLUMNS = ("conversation_id", "external_id", "role", "content", "message_metadata", "token_count", "created_at")
+
+CREATE_STAGING_SQL = f"""
+CREATE TEMP TABLE {STAGING_TABLE} (
+    conversation_id uuid NOT NULL,
+    external_id text NOT NULL,
+    role text NOT NULL,
+    content text NOT NULL,
+    message_metadata text,
+    token_count integer,
+    created_at timestamp NOT NULL
+) ON COMMIT DROP
+"""
+
+# Move staged rows into messages and bump each touched conversation's activity.
+# The owner is resolved once, sparing the per-row lookup in the user_id trigger.
+MERGE_STAGING_SQL = f"""
+WITH inserted AS (
+    INSERT INTO messages (conversation_id, user_id, external_id, role, content, message_metadata, token_count, created_at)
+    SELECT conversation_id, (SELECT user_id FROM user_contexts WHERE id = $1),
+           external_id, role, content, CAST(message_metadata AS jsonb), token_count, created_at
+    FROM {STAGING_TABLE}
+    ON CONFLICT (conversation_id, external_id, created_at) DO NOTHING
+    RETURNING conversation_id, created_at
+),
+touched AS (
+    UPDATE conversations c
+    SET updated_at = GREATEST(c.updated_at, latest.created_at)
+    FROM (SELECT conversation_id, max(created_at) AS created_at FROM inserted GROUP BY conversation_id) latest
+    WHERE c.id = latest.conversation_id
+)
+SELECT count(*) FROM inserted
+"""
+
+
+@overload
+def _utc_naive(value: datetime) -> datetime: ...
+
+
+@overload
+def _utc_naive(value: None) -> None: ...
+
+
+def _utc_naive(value: Optional[datetime]) -> Optional[datetime]:
+    """Timestamps are stored as UTC in ``timestamp without time zone`` columns"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _dump_json(value: Optional[Dict[str, Any]]) -> Optional[str]:
+    return None if value is None else json.dumps(value, ensure_ascii=False)
+
+
+async def _driver_connection(conn: AsyncConnection) -> Any:
+    """
+    The asyncpg connection behind a SQLAlchemy ``AsyncConnection``. SQLAlchemy
+    begins its transaction lazily, so callers open one on the driver itself.
+    """
+    raw = await conn.get_raw_connection()
+    return raw.driver_connection
+
+
+async def _report(progress: Optional[Callable[[IngestProgress], Any]], state: IngestProgress) -> None:
+    if progress is None:
+        return
+    result = progress(state)
+    if inspect.isawaitable(result):
+        await result
+
+
+async def resolve_conversations(
+    engine: AsyncEngine,
+    user_context_id: UUID,
+    source: str,
+    conversations: Sequence[IngestConversation],
+) -> Tuple[Dict[str, UUID], int]:
+    """
+    Create missing conversations in one statement and map every requested
+    ``external_id`` to its ``conversations.id``. Returns ``(ids, created)``.
+    """
+    ids: Dict[str, UUID] = {}
+    created = 0
+    if not conversations:
+        return ids, created
+
+    args = (
+        [c.external_id for c in conversations],
+        [c.title for c in conversations],
+        [_dump_json(c.source_metadata) for c in conversations],
+        [_utc_naive(c.updated_at) for c in conversations],
+    )
+    async with engine.connect() as conn:
+        driver = await _driver_connection(conn)
+        for _ in range(2):
+            # A concurrent import may insert a row after this statement's
+            # snapshot; a second statement sees it.
+            for row in await driver.fetch(RESOLVE_CONVERSATIONS_SQL, user_context_id, source, *args):
+                ids[row["external_id"]] = row["id"]
+                created += row["created"]
+            if len(ids) == len(set(args[0])):
+                break
+    return ids, created
+
+
+async def ingest_messages(
+    engine: AsyncEngine,
+    user_context_id: UUID,
+    source: str,
+    conversations: Sequence[IngestConversation],
+    messages: Sequence[IngestMessage],
+    batch_size: int = INGEST_BATCH_SIZE,
+    progress: Optional[Callable[[IngestProgress], Any]] = None,
+) -> IngestProgress:
+    """
+    Import conversations and messages for one user and channel.
+
+    Conversations referenced by a message but not listed in
+    ``conversations`` are created with default values. ``progress`` (sync
+    or async) is called after every committed batch.
+
+    Args:
+        engine: Async SQLAlchemy engine using the asyncpg driver
+        user_context_id: Owner of the imported conversations
+        source: Channel name stored in ``conversations.source``
+        conversations: Threads to create or reuse
+        messages: Messages to insert; existing ``external_id``s are skipped
+        batch_size: Rows per transaction
+        progress: Optional callback receiving the running ``IngestProgress``
+
+    Returns:
+        The final IngestProgress
+    """
+    batch_size = max(batch_size, 1)
+    counter = get_token_counter()
+    threads: Dict[str, IngestConversation] = {c.external_id: c for c in conversations}
+    latest: Dict[str, datetime] = {}
+    for message in messages:
+        threads.setdefault(message.conversation_external_id, IngestConversation(message.conversation_external_id))
+        created_at = _utc_naive(message.created_at)
+        if latest.get(message.conversation_external_id, created_at) <= created_at:
+            latest[message.conversation_external_id] = created_at
+    # Without a channel-provided activity time, new threads sort by their last message
+    threads = {
+        external_id: thread if thread.updated_at or external_id not in latest
+        else replace(thread, updated_at=latest[external_id])
+        for external_id, thread in threads.items()
+    }
+
+    state = IngestProgress(conversations_total=len(threads), messages_total=len(messages))
+
+    thread_list = list(threads.values())
+    conversation_ids: Dict[str, UUID] = {}
+    for start in range(0, len(thread_list), batch_size):
+        ids, created = await resolve_conversations(
+            engine, user_context_id, source, thread_list[start:start + batch_size]
+        )
+        conversation_ids.update(ids)
+        state.conversations_created += created
+    state.unknown_conversations = sorted(set(threads) - set(conversation_ids))
+    if not messages:
+        await _report(progress, state)
+
+    for start in range(0, len(messages), batch_size):
+        batch = messages[start:start + batch_size]
+        records = [
+            (
+                conversation_ids[m.conversation_external_id],
+                m.external_id,
+                m.role,
+                m.content,
+                _dump_json(m.message_metadata),
+                counter.count(m.content),
+                _utc_naive(m.created_at),
+            )
+            for m in batch
+            if m.conversation_external_id in conversation_ids
+        ]
+        if records:
+            async with engine.connect() as conn:
+                driver = await _driver_connection(conn)
+                async with driver.transaction():
+                    await driver.execute(CREATE_STAGING_SQL)
+                    await driver.copy_records_to_table(STAGING_TABLE, records=records, columns=STAGING_COLUMNS)
+                    state.messages_inserted += await driver.fetchval(MERGE_STAGING_SQL, user_context_id)
+
+        state.messages_processed += len(batch)
+        state.batches_done += 1
+        logger.debug(
+            f"Ingest batch {state.batches_done}: {state.messages_processed}/{state.messages_total} messages processed"
+        )
+        await _report(progress, state)
+
+    return state
@@ -20,8 +20,14 @@ from shared.database.models import Base
 # access to the values within the .ini file
 config = context.config
 
-# Import the DATABASE_URL from the connection module
-from shared.database.connection import DATABASE_URL
+# Read DATABASE_URL from the environment or the backend .env file
+from dotenv import load_dotenv
+from shared.database.connection import get_database_url
+
+load_dotenv(Path(parent_dir) / ".env")
+DATABASE_URL = get_database_url()
+if DATABASE_URL is None:
+    raise RuntimeError("DATABASE_URL is not set")
 
 # Override the sqlalchemy.url in the alembic.ini file
 config.set_main_option("sqlalchemy.url", DATABASE_URL)
@@ -0,0 +1,48 @@
+"""Add composite indexes for keyset pagination
+
+Revision ID: 003
+Revises: 002
+Create Date: 2025-07-01
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Build without blocking writes; CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        # Messages of a conversation in chronological order (id breaks ties)
+        op.create_index(
+            'idx_messages_conversation_created_id',
+            'messages',
+            ['conversation_id', 'created_at', 'id'],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        # A user's conversations by most recent activity (id breaks ties)
+        op.create_index(
+            'idx_conversations_user_context_updated',
+            'conversations',
+            ['user_context_id', 'updated_at', 'id'],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+        # The single-column indexes are prefixes of the composite ones
+        op.drop_index('idx_messages_conversation_id', table_name='messages', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('idx_conversations_user_context_id', table_name='conversations', postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('idx_conversations_user_context_id', 'conversations', ['user_context_id'], postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('idx_messages_conversation_id', 'messages', ['conversation_id'], postgresql_concurrently=True, if_not_exists=True)
+        op.drop_index('idx_conversations_user_context_updated', table_name='conversations', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('idx_messages_conversation_created_id', table_name='messages', postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,41 @@
+"""Add external ids for idempotent imports
+
+Revision ID: 004
+Revises: 003
+Create Date: 2025-07-03
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Id of the thread/message on the source channel (Instagram, WhatsApp, ...)
+    op.add_column('conversations', sa.Column('external_id', sa.String(), nullable=True))
+    op.add_column('messages', sa.Column('external_id', sa.String(), nullable=True))
+
+    # Re-running an import must not duplicate rows; NULLs (native chat) never conflict
+    op.create_unique_constraint(
+        'uq_conversations_source_external_id',
+        'conversations',
+        ['user_context_id', 'source', 'external_id'],
+    )
+    op.create_unique_constraint(
+        'uq_messages_conversation_external_id',
+        'messages',
+        ['conversation_id', 'external_id'],
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_messages_conversation_external_id', 'messages', type_='unique')
+    op.drop_constraint('uq_conversations_source_external_id', 'conversations', type_='unique')
+    op.drop_column('messages', 'external_id')
+    op.drop_column('conversations', 'external_id')
@@ -0,0 +1,85 @@
+"""Convert JSON columns to JSONB, add GIN indexes and jsonb_merge_patch
+
+Revision ID: 005
+Revises: 004
+Create Date: 2025-07-05
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+# (table, column, server default)
+JSON_COLUMNS = (
+    ('user_contexts', 'business_data', "'{}'"),
+    ('user_contexts', 'settings', "'{}'"),
+    ('conversations', 'source_metadata', None),
+    ('messages', 'message_metadata', None),
+)
+
+
+def _convert(to_type: str) -> None:
+    for table, column, default in JSON_COLUMNS:
+        # The old default cannot be cast automatically, so drop and re-add it
+        if default is not None:
+            op.execute(f'ALTER TABLE {table} ALTER COLUMN {column} DROP DEFAULT')
+        op.execute(f'ALTER TABLE {table} ALTER COLUMN {column} TYPE {to_type} USING {column}::{to_type}')
+        if default is not None:
+            op.execute(f'ALTER TABLE {table} ALTER COLUMN {column} SET DEFAULT {default}::{to_type}')
+
+
+def upgrade() -> None:
+    _convert('jsonb')
+
+    # Key-existence and containment lookups on business data (onboarding answers)
+    op.create_index(
+        'idx_user_contexts_business_data', 'user_contexts', ['business_data'],
+        postgresql_using='gin',
+    )
+    # Containment lookups of channel account/thread metadata (@> only)
+    op.create_index(
+        'idx_conversations_source_metadata', 'conversations', ['source_metadata'],
+        postgresql_using='gin', postgresql_ops={'source_metadata': 'jsonb_path_ops'},
+    )
+
+    # RFC 7396 JSON merge patch: objects merge recursively, null removes a key,
+    # anything else replaces the target value
+    op.execute("""
+    CREATE OR REPLACE FUNCTION jsonb_merge_patch(target jsonb, patch jsonb)
+    RETURNS jsonb
+    LANGUAGE plpgsql
+    IMMUTABLE
+    PARALLEL SAFE
+    AS $$
+    DECLARE
+        item record;
+    BEGIN
+        IF patch IS NULL OR jsonb_typeof(patch) <> 'object' THEN
+            RETURN patch;
+        END IF;
+        IF target IS NULL OR jsonb_typeof(target) <> 'object' THEN
+            target := '{}'::jsonb;
+        END IF;
+        FOR item IN SELECT key, value FROM jsonb_each(patch) LOOP
+            IF jsonb_typeof(item.value) = 'null' THEN
+                target := target - item.key;
+            ELSE
+                target := jsonb_set(target, ARRAY[item.key], jsonb_merge_patch(target -> item.key, item.value));
+            END IF;
+        END LOOP;
+        RETURN target;
+    END;
+    $$
+    """)
+
+
+def downgrade() -> None:
+    op.execute('DROP FUNCTION IF EXISTS jsonb_merge_patch(jsonb, jsonb)')
+    op.drop_index('idx_conversations_source_metadata', table_name='conversations')
+    op.drop_index('idx_user_contexts_business_data', table_name='user_contexts')
+    _convert('json')
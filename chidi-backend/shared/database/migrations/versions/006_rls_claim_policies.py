@@ -0,0 +1,129 @@
+"""Drive RLS from the JWT subject and denormalize the message owner
+
+Revision ID: 006
+Revises: 005
+Create Date: 2025-07-08
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+# JWT subject set per transaction by the gateway (shared/database/rls.py) or
+# by Supabase/PostgREST. Wrapping it in a sub-select makes Postgres evaluate
+# it once per statement (an InitPlan) instead of once per row.
+CURRENT_SUB = "(SELECT current_setting('request.jwt.claim.sub', true))"
+
+
+def upgrade() -> None:
+    # Owner of each message (user_contexts.user_id), so the messages policy
+    # is a single indexed equality instead of a join per row
+    op.add_column('messages', sa.Column('user_id', sa.String(), nullable=True))
+    op.execute("""
+    UPDATE messages m
+    SET user_id = uc.user_id
+    FROM conversations c
+    JOIN user_contexts uc ON uc.id = c.user_context_id
+    WHERE c.id = m.conversation_id
+    """)
+    op.alter_column('messages', 'user_id', nullable=False)
+    # Serves the policy equality and per-user ordering by time (recent messages, exports)
+    op.create_index('idx_messages_user_created', 'messages', ['user_id', 'created_at'])
+    # conversation_id determines user_id; without this the planner multiplies
+    # both selectivities and underestimates per-conversation row counts
+    op.execute('CREATE STATISTICS IF NOT EXISTS messages_conversation_user_deps (dependencies) ON conversation_id, user_id FROM messages')
+    op.execute('ANALYZE messages')
+
+    # Writers may omit user_id; it is derived from the conversation.
+    # Runs with the caller's privileges, so RLS hides other users' conversations.
+    op.execute("""
+    CREATE OR REPLACE FUNCTION messages_set_user_id()
+    RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+    BEGIN
+        IF NEW.user_id IS NULL THEN
+            SELECT uc.user_id INTO NEW.user_id
+            FROM conversations c
+            JOIN user_contexts uc ON uc.id = c.user_context_id
+            WHERE c.id = NEW.conversation_id;
+        END IF;
+        RETURN NEW;
+    END;
+    $$
+    """)
+    op.execute("""
+    CREATE TRIGGER messages_set_user_id
+    BEFORE INSERT ON messages
+    FOR EACH ROW EXECUTE FUNCTION messages_set_user_id()
+    """)
+
+    op.execute('DROP POLICY IF EXISTS user_contexts_isolation_policy ON user_contexts')
+    op.execute('DROP POLICY IF EXISTS conversations_isolation_policy ON conversations')
+    op.execute('DROP POLICY IF EXISTS messages_isolation_policy ON messages')
+
+    op.execute(f"""
+    CREATE POLICY user_contexts_isolation_policy ON user_contexts
+    USING (user_id = {CURRENT_SUB})
+    WITH CHECK (user_id = {CURRENT_SUB})
+    """)
+
+    # The sub-select returns one user_contexts id, so conversations are
+    # filtered by an equality that can use idx_conversations_user_context_updated
+    op.execute(f"""
+    CREATE POLICY conversations_isolation_policy ON conversations
+    USING (user_context_id = (SELECT id FROM user_contexts WHERE user_id = {CURRENT_SUB}))
+    WITH CHECK (user_context_id = (SELECT id FROM user_contexts WHERE user_id = {CURRENT_SUB}))
+    """)
+
+    # Inserts must also target a conversation the caller can see
+    op.execute(f"""
+    CREATE POLICY messages_isolation_policy ON messages
+    USING (user_id = {CURRENT_SUB})
+    WITH CHECK (
+        user_id = {CURRENT_SUB}
+        AND EXISTS (SELECT 1 FROM conversations c WHERE c.id = conversation_id)
+    )
+    """)
+
+
+def downgrade() -> None:
+    op.execute('DROP POLICY IF EXISTS messages_isolation_policy ON messages')
+    op.execute('DROP POLICY IF EXISTS conversations_isolation_policy ON conversations')
+    op.execute('DROP POLICY IF EXISTS user_contexts_isolation_policy ON user_contexts')
+
+    op.execute("""
+    CREATE POLICY user_contexts_isolation_policy ON user_contexts
+    USING (user_id = current_user)
+    WITH CHECK (user_id = current_user)
+    """)
+    op.execute("""
+    CREATE POLICY conversations_isolation_policy ON conversations
+    USING (user_context_id IN (SELECT id FROM user_contexts WHERE user_id = current_user))
+    WITH CHECK (user_context_id IN (SELECT id FROM user_contexts WHERE user_id = current_user))
+    """)
+    op.execute("""
+    CREATE POLICY messages_isolation_policy ON messages
+    USING (conversation_id IN (
+        SELECT c.id FROM conversations c
+        JOIN user_contexts uc ON c.user_context_id = uc.id
+        WHERE uc.user_id = current_user
+    ))
+    WITH CHECK (conversation_id IN (
+        SELECT c.id FROM conversations c
+        JOIN user_contexts uc ON c.user_context_id = uc.id
+        WHERE uc.user_id = current_user
+    ))
+    """)
+
+    op.execute('DROP TRIGGER IF EXISTS messages_set_user_id ON messages')
+    op.execute('DROP FUNCTION IF EXISTS messages_set_user_id()')
+    op.execute('DROP STATISTICS IF EXISTS messages_conversation_user_deps')
+    op.drop_index('idx_messages_user_created', table_name='messages')
+    op.drop_column('messages', 'user_id')
@@ -0,0 +1,127 @@
+"""Convert messages to a monthly range-partitioned table
+
+Revision ID: 007
+Revises: 006
+Create Date: 2025-07-10
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+# Months of partitions created beyond the current one
+PARTITIONS_AHEAD = 3
+
+COLUMNS = "id, conversation_id, user_id, role, content, message_metadata, external_id, created_at"
+
+CURRENT_SUB = "(SELECT current_setting('request.jwt.claim.sub', true))"
+
+
+def _add_months(month: datetime, count: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def _create_table(name: str, partitioned: bool) -> None:
+    op.execute(f"""
+    CREATE TABLE {name} (
+        id uuid NOT NULL DEFAULT gen_random_uuid(),
+        conversation_id uuid NOT NULL REFERENCES conversations(id) ON DELETE CASCADE,
+        user_id varchar NOT NULL,
+        role varchar NOT NULL,
+        content text NOT NULL,
+        message_metadata jsonb,
+        external_id varchar,
+        created_at timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP
+    ){' PARTITION BY RANGE (created_at)' if partitioned else ''}
+    """)
+
+
+def _create_dependents(partitioned: bool) -> None:
+    """Keys, indexes, statistics, trigger and RLS policy of the messages table"""
+    if partitioned:
+        # Unique keys of a partitioned table must include the partition key
+        op.execute('ALTER TABLE messages ADD CONSTRAINT messages_pkey PRIMARY KEY (id, created_at)')
+        op.execute(
+            'ALTER TABLE messages ADD CONSTRAINT uq_messages_conversation_external_id '
+            'UNIQUE (conversation_id, external_id, created_at)'
+        )
+    else:
+        op.execute('ALTER TABLE messages ADD CONSTRAINT messages_pkey PRIMARY KEY (id)')
+        op.execute(
+            'ALTER TABLE messages ADD CONSTRAINT uq_messages_conversation_external_id '
+            'UNIQUE (conversation_id, external_id)'
+        )
+    op.create_index('idx_messages_conversation_created_id', 'messages', ['conversation_id', 'created_at', 'id'])
+    op.create_index('idx_messages_user_created', 'messages', ['user_id', 'created_at'])
+    op.execute('CREATE STATISTICS messages_conversation_user_deps (dependencies) ON conversation_id, user_id FROM messages')
+
+    op.execute("""
+    CREATE TRIGGER messages_set_user_id
+    BEFORE INSERT ON messages
+    FOR EACH ROW EXECUTE FUNCTION messages_set_user_id()
+    """)
+
+    op.execute('ALTER TABLE messages ENABLE ROW LEVEL SECURITY')
+    op.execute(f"""
+    CREATE POLICY messages_isolation_policy ON messages
+    USING (user_id = {CURRENT_SUB})
+    WITH CHECK (
+        user_id = {CURRENT_SUB}
+        AND EXISTS (SELECT 1 FROM conversations c WHERE c.id = conversation_id)
+    )
+    """)
+    op.execute('ANALYZE messages')
+
+
+def upgrade() -> None:
+    # Rows are copied once into the new layout; on a large table run this in
+    # a maintenance window (it holds an exclusive lock on messages).
+    op.execute('ALTER TABLE messages RENAME TO messages_legacy')
+    _create_table('messages', partitioned=True)
+
+    # One partition per month from the oldest message to PARTITIONS_AHEAD
+    # months out; anything outside (e.g. imported history older than that)
+    # lands in the default partition
+    oldest = op.get_bind().execute(sa.text('SELECT min(created_at) FROM messages_legacy')).scalar()
+    now = datetime.utcnow()
+    month = datetime((oldest or now).year, (oldest or now).month, 1)
+    last = _add_months(datetime(now.year, now.month, 1), PARTITIONS_AHEAD)
+    while month <= last:
+        upper = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE messages_{month:%Y_%m} PARTITION OF messages "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{upper:%Y-%m-%d}')"
+        )
+        month = upper
+    op.execute('CREATE TABLE messages_default PARTITION OF messages DEFAULT')
+
+    op.execute(f'INSERT INTO messages ({COLUMNS}) SELECT {COLUMNS} FROM messages_legacy')
+    op.execute('DROP TABLE messages_legacy')
+    _create_dependents(partitioned=True)
+
+    # Partitions past retention are detached here (shared/database/partitions.py)
+    op.execute('CREATE SCHEMA IF NOT EXISTS archive')
+
+
+def downgrade() -> None:
+    # Partitions already moved to the archive schema are left there
+    op.execute('ALTER TABLE messages RENAME TO messages_partitioned')
+    op.execute('ALTER TABLE messages_partitioned DROP CONSTRAINT messages_pkey')
+    op.execute('ALTER TABLE messages_partitioned DROP CONSTRAINT uq_messages_conversation_external_id')
+    op.drop_index('idx_messages_conversation_created_id', table_name='messages_partitioned')
+    op.drop_index('idx_messages_user_created', table_name='messages_partitioned')
+    op.execute('DROP STATISTICS IF EXISTS messages_conversation_user_deps')
+
+    _create_table('messages', partitioned=False)
+    op.execute(f'INSERT INTO messages ({COLUMNS}) SELECT {COLUMNS} FROM messages_partitioned')
+    op.execute('DROP TABLE messages_partitioned')
+    _create_dependents(partitioned=False)
@@ -0,0 +1,26 @@
+"""Store a token count per message
+
+Revision ID: 008
+Revises: 007
+Create Date: 2025-07-14
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Counted when a message is written so the context window never re-tokenizes
+    # history; existing rows stay NULL and are counted the first time they are read
+    op.add_column('messages', sa.Column('token_count', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('messages', 'token_count')
@@ -0,0 +1,64 @@
+"""Add business_embeddings with pgvector
+
+Revision ID: 009
+Revises: 008
+Create Date: 2025-07-16
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID as PostgresUUID
+from pgvector.sqlalchemy import Vector
+
+
+# revision identifiers, used by Alembic.
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+# Must match EMBEDDING_DIMENSIONS in shared/database/models.py
+EMBEDDING_DIMENSIONS = 1536
+
+CURRENT_SUB = "(SELECT current_setting('request.jwt.claim.sub', true))"
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS vector')
+
+    op.create_table(
+        'business_embeddings',
+        sa.Column('id', PostgresUUID(as_uuid=True), primary_key=True, server_default=sa.text('gen_random_uuid()')),
+        sa.Column(
+            'user_context_id', PostgresUUID(as_uuid=True),
+            sa.ForeignKey('user_contexts.id', ondelete='CASCADE'), nullable=False,
+        ),
+        sa.Column('chunk_key', sa.String(), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('content_hash', sa.String(64), nullable=False),
+        sa.Column('model', sa.String(), nullable=False),
+        sa.Column('embedding', Vector(EMBEDDING_DIMENSIONS), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        # Leads with user_context_id, so it also serves the per-user filter
+        sa.UniqueConstraint('user_context_id', 'chunk_key', name='uq_business_embeddings_user_context_chunk'),
+    )
+    op.create_index(
+        'idx_business_embeddings_embedding_hnsw',
+        'business_embeddings',
+        ['embedding'],
+        postgresql_using='hnsw',
+        postgresql_ops={'embedding': 'vector_cosine_ops'},
+    )
+
+    op.execute('ALTER TABLE business_embeddings ENABLE ROW LEVEL SECURITY')
+    op.execute(f"""
+    CREATE POLICY business_embeddings_isolation_policy ON business_embeddings
+    USING (user_context_id = (SELECT id FROM user_contexts WHERE user_id = {CURRENT_SUB}))
+    WITH CHECK (user_context_id = (SELECT id FROM user_contexts WHERE user_id = {CURRENT_SUB}))
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('business_embeddings')
+    # The vector extension is left installed; other objects may use it
@@ -0,0 +1,62 @@
+"""Add llm_response_cache
+
+Revision ID: 010
+Revises: 009
+Create Date: 2025-07-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID as PostgresUUID
+from pgvector.sqlalchemy import Vector
+
+
+# revision identifiers, used by Alembic.
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+# Must match EMBEDDING_DIMENSIONS in shared/database/models.py
+EMBEDDING_DIMENSIONS = 1536
+
+CURRENT_SUB = "(SELECT current_setting('request.jwt.claim.sub', true))"
+
+
+def upgrade() -> None:
+    # Each user keeps at most a few hundred entries, ranked exactly within
+    # (user_context_id, context_version), so no vector index is needed
+    op.create_table(
+        'llm_response_cache',
+        sa.Column('id', PostgresUUID(as_uuid=True), primary_key=True, server_default=sa.text('gen_random_uuid()')),
+        sa.Column(
+            'user_context_id', PostgresUUID(as_uuid=True),
+            sa.ForeignKey('user_contexts.id', ondelete='CASCADE'), nullable=False,
+        ),
+        sa.Column('context_version', sa.String(16), nullable=False),
+        sa.Column('prompt_hash', sa.String(64), nullable=False),
+        sa.Column('prompt', sa.Text(), nullable=False),
+        sa.Column('response', sa.Text(), nullable=False),
+        sa.Column('embedding', Vector(EMBEDDING_DIMENSIONS), nullable=False),
+        sa.Column('embedding_model', sa.String(), nullable=False),
+        sa.Column('prompt_tokens', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('completion_tokens', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('generation_ms', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('hits', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('last_hit_at', sa.DateTime(), nullable=True),
+        sa.UniqueConstraint(
+            'user_context_id', 'context_version', 'prompt_hash', name='uq_llm_response_cache_context_prompt'
+        ),
+    )
+
+    op.execute('ALTER TABLE llm_response_cache ENABLE ROW LEVEL SECURITY')
+    op.execute(f"""
+    CREATE POLICY llm_response_cache_isolation_policy ON llm_response_cache
+    USING (user_context_id = (SELECT id FROM user_contexts WHERE user_id = {CURRENT_SUB}))
+    WITH CHECK (user_context_id = (SELECT id FROM user_contexts WHERE user_id = {CURRENT_SUB}))
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('llm_response_cache')
@@ -2,10 +2,11 @@ from datetime import datetime, timezone
 from typing import Dict, List, Optional, Any
 from uuid import UUID
 
-from sqlalchemy import Column, DateTime, ForeignKey, String, Text, Boolean, JSON, text
-from sqlalchemy.dialects.postgresql import UUID as PostgresUUID
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String, Text, Boolean, UniqueConstraint, func, text
+from sqlalchemy.dialects.postgresql import JSONB, UUID as PostgresUUID
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
+from pgvector.sqlalchemy import Vector
 
 Base = declarative_base()
 
@@ -16,17 +17,22 @@ class UserContext(Base):
     Protected by RLS to ensure users can only access their own context.
     """
     __tablename__ = "user_contexts"
+    __table_args__ = (
+        Index("idx_user_contexts_business_data", "business_data", postgresql_using="gin"),
+    )
 
     id = Column(PostgresUUID(as_uuid=True), primary_key=True, server_default=text("gen_random_uuid()"))
     user_id = Column(String, nullable=False, unique=True, index=True)
-    business_data = Column(JSON, nullable=False, default=dict)
+    business_data = Column(JSONB, nullable=False, default=dict)
     onboarding_status = Column(String, nullable=False, default="pending")
-    settings = Column(JSON, nullable=False, default=dict)
-    created_at = Column(DateTime, nullable=False, default=datetime.now(timezone.utc))
-    updated_at = Column(DateTime, nullable=False, default=datetime.now(timezone.utc), onupdate=datetime.now(timezone.utc))
+    settings = Column(JSONB, nullable=False, server_default=text("'{}'::jsonb"))
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+    updated_at = Column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
 
     # Relationships
     conversations = relationship("Conversation", back_populates="user_context", cascade="all, delete-orphan")
+    business_embeddings = relationship("BusinessEmbedding", back_populates="user_context", cascade="all, delete-orphan")
+    cached_responses = relationship("ResponseCacheEntry", back_populates="user_context", cascade="all, delete-orphan")
 
 
 class Conversation(Base):
@@ -35,15 +41,26 @@ class Conversation(Base):
     Protected by RLS to ensure users can only access their own conversations.
     """
     __tablename__ = "conversations"
+    __table_args__ = (
+        # Keyset pagination of a user's conversations by latest activity
+        Index("idx_conversations_user_context_updated", "user_context_id", "updated_at", "id"),
+        # Idempotent imports from social channels
+        UniqueConstraint("user_context_id", "source", "external_id", name="uq_conversations_source_external_id"),
+        Index(
+            "idx_conversations_source_metadata", "source_metadata",
+            postgresql_using="gin", postgresql_ops={"source_metadata": "jsonb_path_ops"},
+        ),
+    )
 
     id = Column(PostgresUUID(as_uuid=True), primary_key=True, server_default=text("gen_random_uuid()"))
-    user_context_id = Column(PostgresUUID(as_uuid=True), ForeignKey("user_contexts.id", ondelete="CASCADE"), nullable=False, index=True)
+    user_context_id = Column(PostgresUUID(as_uuid=True), ForeignKey("user_contexts.id", ondelete="CASCADE"), nullable=False)
     title = Column(String, nullable=False, default="New Conversation")
     source = Column(String, nullable=False, default="chat")  # chat, instagram, whatsapp, etc.
-    source_metadata = Column(JSON, nullable=True)
+    source_metadata = Column(JSONB, nullable=True)
+    external_id = Column(String, nullable=True)  # thread id on the source channel
     is_archived = Column(Boolean, nullable=False, default=False)
-    created_at = Column(DateTime, nullable=False, default=datetime.now(timezone.utc))
-    updated_at = Column(DateTime, nullable=False, default=datetime.now(timezone.utc), onupdate=datetime.now(timezone.utc))
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+    updated_at = Column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
 
     # Relationships
     user_context = relationship("UserContext", back_populates="conversations")
@@ -53,16 +70,101 @@ class Conversation(Base):
 class Message(Base):
     """
     Represents a single message within a conversation.
-    Protected by RLS to ensure users can only access their own messages.
+    Protected by RLS on the denormalized user_id column.
+
+    Range-partitioned by month on created_at (see shared/database/partitions.py),
+    so the primary key and unique constraints include created_at. Filter on
+    created_at where possible to let Postgres prune partitions.
     """
     __tablename__ = "messages"
+    __table_args__ = (
+        # Keyset pagination of a conversation's messages in chronological order
+        Index("idx_messages_conversation_created_id", "conversation_id", "created_at", "id"),
+        UniqueConstraint("conversation_id", "external_id", "created_at", name="uq_messages_conversation_external_id"),
+        # RLS policy (user_id = request.jwt.claim.sub) and per-user time ordering
+        Index("idx_messages_user_created", "user_id", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
 
     id = Column(PostgresUUID(as_uuid=True), primary_key=True, server_default=text("gen_random_uuid()"))
-    conversation_id = Column(PostgresUUID(as_uuid=True), ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False, index=True)
+    conversation_id = Column(PostgresUUID(as_uuid=True), ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False)
+    # Owner (user_contexts.user_id); filled from the conversation by a trigger when omitted
+    user_id = Column(String, nullable=False)
     role = Column(String, nullable=False)  # user, assistant, system
     content = Column(Text, nullable=False)
-    message_metadata = Column(JSON, nullable=True)
-    created_at = Column(DateTime, nullable=False, default=datetime.now(timezone.utc))
+    message_metadata = Column(JSONB, nullable=True)
+    external_id = Column(String, nullable=True)  # message id on the source channel
+    # Tokens in content, counted once on write (shared/llm/tokens.py); NULL until counted
+    token_count = Column(Integer, nullable=True)
+    created_at = Column(DateTime, primary_key=True, nullable=False, server_default=func.now())
 
     # Relationships
     conversation = relationship("Conversation", back_populates="messages")
+
+
+# Dimensions of business_embeddings.embedding (text-embedding-3-small); changing it needs a migration
+EMBEDDING_DIMENSIONS = 1536
+
+
+class BusinessEmbedding(Base):
+    """
+    One embedded chunk of a user's business_data, used to retrieve the
+    business rules relevant to a chat message (shared/llm/retrieval.py).
+    Protected by RLS through the owning user context.
+    """
+    __tablename__ = "business_embeddings"
+    __table_args__ = (
+        # One row per chunk; re-syncing upserts on it
+        UniqueConstraint("user_context_id", "chunk_key", name="uq_business_embeddings_user_context_chunk"),
+        # Approximate nearest-neighbour search by cosine distance
+        Index(
+            "idx_business_embeddings_embedding_hnsw", "embedding",
+            postgresql_using="hnsw", postgresql_ops={"embedding": "vector_cosine_ops"},
+        ),
+    )
+
+    id = Column(PostgresUUID(as_uuid=True), primary_key=True, server_default=text("gen_random_uuid()"))
+    user_context_id = Column(PostgresUUID(as_uuid=True), ForeignKey("user_contexts.id", ondelete="CASCADE"), nullable=False)
+    chunk_key = Column(String, nullable=False)  # business_data path, e.g. "shipping" or "faq#2"
+    content = Column(Text, nullable=False)
+    content_hash = Column(String(64), nullable=False)  # sha256 of content; unchanged chunks are not re-embedded
+    model = Column(String, nullable=False)  # embedder that produced the vector
+    embedding = Column(Vector(EMBEDDING_DIMENSIONS), nullable=False)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+    updated_at = Column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
+
+    # Relationships
+    user_context = relationship("UserContext", back_populates="business_embeddings")
+
+
+class ResponseCacheEntry(Base):
+    """
+    A cached LLM answer, reused for the same or a semantically close prompt
+    while the owner's business_data is unchanged (shared/llm/response_cache.py).
+    Protected by RLS through the owning user context.
+    """
+    __tablename__ = "llm_response_cache"
+    __table_args__ = (
+        # Exact lookups; its (user_context_id, context_version) prefix scopes semantic ones
+        UniqueConstraint(
+            "user_context_id", "context_version", "prompt_hash", name="uq_llm_response_cache_context_prompt"
+        ),
+    )
+
+    id = Column(PostgresUUID(as_uuid=True), primary_key=True, server_default=text("gen_random_uuid()"))
+    user_context_id = Column(PostgresUUID(as_uuid=True), ForeignKey("user_contexts.id", ondelete="CASCADE"), nullable=False)
+    context_version = Column(String(16), nullable=False)  # hash of business_data the answer was based on
+    prompt_hash = Column(String(64), nullable=False)  # sha256 of the normalized prompt
+    prompt = Column(Text, nullable=False)
+    response = Column(Text, nullable=False)
+    embedding = Column(Vector(EMBEDDING_DIMENSIONS), nullable=False)
+    embedding_model = Column(String, nullable=False)
+    prompt_tokens = Column(Integer, nullable=False, server_default=text("0"))
+    completion_tokens = Column(Integer, nullable=False, server_default=text("0"))
+    generation_ms = Column(Integer, nullable=False, server_default=text("0"))  # latency of the original completion
+    hits = Column(Integer, nullable=False, server_default=text("0"))
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+    last_hit_at = Column(DateTime, nullable=True)
+
+    # Relationships
+    user_context = relationship("UserContext", back_populates="cached_responses")
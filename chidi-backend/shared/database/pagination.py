@@ -0,0 +1,56 @@
+"""
+Opaque cursors for keyset (seek) pagination.
+
+A cursor encodes the sort key of the last row of a page, e.g.
+``(updated_at, id)``. The next page is fetched with a row comparison such
+as ``(updated_at, id) < (:updated_at, :id)``, which walks a composite index
+from that position, so page cost does not grow with the page number the
+way OFFSET does.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Sequence, Tuple
+from uuid import UUID
+
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a cursor cannot be decoded"""
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Encode a sort key (datetimes, UUIDs, strings, numbers) as a URL-safe token"""
+    encoded = []
+    for value in values:
+        if isinstance(value, datetime):
+            encoded.append({"t": value.isoformat()})
+        elif isinstance(value, UUID):
+            encoded.append({"u": str(value)})
+        else:
+            encoded.append(value)
+    raw = json.dumps(encoded, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: str, size: int) -> Tuple[Any, ...]:
+    """Decode a cursor produced by ``encode_cursor`` holding ``size`` values"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        encoded = json.loads(raw)
+        if not isinstance(encoded, list) or len(encoded) != size:
+            raise InvalidCursorError("Invalid cursor")
+        values: List[Any] = []
+        for value in encoded:
+            if isinstance(value, dict) and "t" in value:
+                values.append(datetime.fromisoformat(value["t"]))
+            elif isinstance(value, dict) and "u" in value:
+                values.append(UUID(value["u"]))
+            else:
+                values.append(value)
+        return tuple(values)
+    except InvalidCursorError:
+        raise
+    except (ValueError, TypeError, KeyError) as e:
+        raise InvalidCursorError("Invalid cursor") from e
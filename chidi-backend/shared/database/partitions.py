@@ -0,0 +1,365 @@
+"""
+Partition management and retention for the monthly-partitioned messages table.
+
+Each maintenance run:
+
+1. creates partitions ahead of time, so inserts never land in the default
+   partition for lack of one;
+2. detaches partitions older than the longest plan retention and moves them
+   to the archive schema (a metadata-only operation, no row deletes). Rows
+   stay queryable there but leave the live table for every user, so this
+   step is skipped while any user is on a plan MESSAGE_RETENTION_MONTHS does
+   not list;
+3. deletes, in batches, messages older than each plan's retention for users
+   on shorter plans (plan = ``user_contexts.settings->>'plan'``), user by
+   user through ``idx_messages_user_created``. Unlisted plans are never
+   purged.
+
+Each transaction takes a transaction-level advisory lock for its step, so
+no two gateway workers create or detach partitions at once. The purge
+re-takes its lock per batch: concurrent runs can interleave batches (each
+deletes only what is still expired, so the result is the same), and a run
+that finds the lock taken stops there and reports the purge as skipped,
+even if it already deleted some rows. Safe behind pgbouncer's transaction
+mode, which rules out session-level locks.
+
+Configuration (environment variables):
+    MESSAGE_PARTITIONS_AHEAD                months created beyond the current one (default 3)
+    MESSAGE_ARCHIVE_SCHEMA                  schema detached partitions move to (default archive)
+    MESSAGE_RETENTION_MONTHS                per-plan retention, e.g. ``free=6,pro=24,business=60``
+    MESSAGE_RETENTION_DEFAULT_PLAN          plan assumed when settings has none (default free)
+    MESSAGE_PURGE_BATCH_SIZE                rows deleted per transaction (default 5000)
+    MESSAGE_PURGE_USERS_PER_BATCH           users whose messages one purge batch covers (default 500)
+    MESSAGE_PARTITION_MAINTENANCE_INTERVAL  seconds between runs in the gateway; 0 disables
+
+Run once from cron with ``python -m shared.database.partitions``.
+"""
+import asyncio
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Collection, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = "messages"
+DEFAULT_PARTITION = "messages_default"
+
+MESSAGE_PARTITIONS_AHEAD = int(os.getenv("MESSAGE_PARTITIONS_AHEAD", "3"))
+MESSAGE_ARCHIVE_SCHEMA = os.getenv("MESSAGE_ARCHIVE_SCHEMA", "archive")
+MESSAGE_RETENTION_DEFAULT_PLAN = os.getenv("MESSAGE_RETENTION_DEFAULT_PLAN", "free")
+MESSAGE_PURGE_BATCH_SIZE = int(os.getenv("MESSAGE_PURGE_BATCH_SIZE", "5000"))
+MESSAGE_PURGE_USERS_PER_BATCH = int(os.getenv("MESSAGE_PURGE_USERS_PER_BATCH", "500"))
+MESSAGE_PARTITION_MAINTENANCE_INTERVAL = float(os.getenv("MESSAGE_PARTITION_MAINTENANCE_INTERVAL", "21600"))
+
+
+def parse_retention(value: Optional[str]) -> Dict[str, int]:
+    """Parse ``plan=months,plan=months``; plans not listed are never purged"""
+    retention: Dict[str, int] = {}
+    for item in (value or "").split(","):
+        plan, sep, months = item.partition("=")
+        if sep and plan.strip():
+            retention[plan.strip()] = int(months)
+    return retention
+
+
+MESSAGE_RETENTION_MONTHS = parse_retention(os.getenv("MESSAGE_RETENTION_MONTHS", "free=6,pro=24,business=60"))
+
+_LOCK_PREFIX = "chidi.messages."
+_BOUND_PATTERN = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+_LIST_PARTITIONS_SQL = text(
+    """
+    SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = CAST(:parent AS regclass)
+    """
+)
+
+_TRY_LOCK_SQL = text("SELECT pg_try_advisory_xact_lock(hashtext(:name))")
+
+# Any user on a plan without a retention (users without a plan get the default)
+_UNLISTED_PLAN_SQL = text(
+    """
+    SELECT coalesce(settings->>'plan', :default_plan) AS plan
+    FROM user_contexts
+    WHERE coalesce(settings->>'plan', :default_plan) <> ALL(:plans)
+    LIMIT 1
+    """
+)
+
+# Next page of a plan's users, in user_id order
+_PLAN_USERS_SQL = text(
+    """
+    SELECT user_id
+    FROM user_contexts
+    WHERE coalesce(settings->>'plan', :default_plan) = :plan
+      AND user_id > :after
+    ORDER BY user_id
+    LIMIT :limit
+    """
+)
+
+# One batch of those users' expired messages. Both sides carry the user and
+# created_at bounds, so they read idx_messages_user_created in the partitions
+# before the cutoff and never visit rows of users on other plans.
+_PURGE_BATCH_SQL = text(
+    """
+    WITH doomed AS (
+        SELECT id, created_at
+        FROM messages
+        WHERE user_id = ANY(:user_ids)
+          AND created_at < :cutoff
+        LIMIT :batch_size
+    )
+    DELETE FROM messages m
+    USING doomed d
+    WHERE m.id = d.id AND m.created_at = d.created_at
+      AND m.user_id = ANY(:user_ids)
+      AND m.created_at < :cutoff
+    """
+)
+
+
+@dataclass
+class PartitionMaintenanceReport:
+    """What one maintenance run did"""
+    created: List[str] = field(default_factory=list)
+    detached: List[str] = field(default_factory=list)
+    purged: Dict[str, int] = field(default_factory=dict)
+    skipped: List[str] = field(default_factory=list)
+
+
+def month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(month: datetime, count: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: datetime) -> str:
+    return f"{PARENT_TABLE}_{month:%Y_%m}"
+
+
+async def list_partitions(conn: AsyncConnection) -> List[Tuple[str, datetime, datetime]]:
+    """Attached monthly partitions as ``(name, lower, upper)``, oldest first"""
+    result = await conn.execute(_LIST_PARTITIONS_SQL, {"parent": PARENT_TABLE})
+    partitions = []
+    for name, bound in result.all():
+        match = _BOUND_PATTERN.search(bound or "")
+        if match:
+            lower, upper = (datetime.fromisoformat(value) for value in match.groups())
+            partitions.append((name, lower, upper))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+async def _try_lock(conn: AsyncConnection, step: str) -> bool:
+    return bool((await conn.execute(_TRY_LOCK_SQL, {"name": _LOCK_PREFIX + step})).scalar())
+
+
+async def ensure_partitions(
+    engine: AsyncEngine, now: datetime, ahead: int = MESSAGE_PARTITIONS_AHEAD
+) -> Optional[List[str]]:
+    """
+    Create missing partitions up to ``ahead`` months past the current one,
+    starting from the newest existing partition so no month is skipped.
+    Returns the created names, or None if another worker holds the lock.
+    """
+    created: List[str] = []
+    async with engine.begin() as conn:
+        if not await _try_lock(conn, "ensure"):
+            return None
+        partitions = await list_partitions(conn)
+        existing = {name for name, _, _ in partitions}
+        month = min(month_start(now), partitions[-1][2]) if partitions else month_start(now)
+        last = add_months(month_start(now), ahead)
+        while month <= last:
+            name = partition_name(month)
+            upper = add_months(month, 1)
+            if name not in existing:
+                try:
+                    # A savepoint keeps one failure from aborting the other months
+                    async with conn.begin_nested():
+                        await conn.execute(text(
+                            f"CREATE TABLE {name} PARTITION OF {PARENT_TABLE} "
+                            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{upper:%Y-%m-%d}')"
+                        ))
+                    created.append(name)
+                except Exception as e:
+                    # Rows for this month already sit in the default partition
+                    logger.warning(f"Could not create partition {name}: {str(e)}")
+            month = upper
+    return created
+
+
+async def detach_expired_partitions(
+    engine: AsyncEngine, cutoff: datetime, plans: Optional[Collection[str]] = None
+) -> Optional[List[str]]:
+    """
+    Detach partitions entirely older than ``cutoff`` and move them to the
+    archive schema. With ``plans``, detaches nothing while any user is on a
+    plan outside it. Returns the detached names, or None if locked.
+    """
+    detached: List[str] = []
+    async with engine.begin() as conn:
+        if not await _try_lock(conn, "detach"):
+            return None
+        if plans is not None:
+            unlisted = (await conn.execute(
+                _UNLISTED_PLAN_SQL, {"plans": list(plans), "default_plan": MESSAGE_RETENTION_DEFAULT_PLAN}
+            )).scalar()
+            if unlisted is not None:
+                logger.warning(
+                    f"Not detaching message partitions older than {cutoff:%Y-%m}: "
+                    f"users on plan {unlisted!r} have no retention in MESSAGE_RETENTION_MONTHS"
+                )
+                return detached
+        await conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {MESSAGE_ARCHIVE_SCHEMA}"))
+        for name, _, upper in await list_partitions(conn):
+            if upper > cutoff:
+                break
+            await conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+            await conn.execute(text(f"ALTER TABLE {name} SET SCHEMA {MESSAGE_ARCHIVE_SCHEMA}"))
+            detached.append(name)
+    return detached
+
+
+async def purge_expired_messages(
+    engine: AsyncEngine,
+    now: datetime,
+    retention: Dict[str, int] = MESSAGE_RETENTION_MONTHS,
+    batch_size: int = MESSAGE_PURGE_BATCH_SIZE,
+    users_per_batch: int = MESSAGE_PURGE_USERS_PER_BATCH,
+) -> Optional[Dict[str, int]]:
+    """
+    Delete each plan's messages older than its retention, ``batch_size`` rows
+    per transaction. Walks the plan's users ``users_per_batch`` at a time, so
+    each batch only reads rows it deletes, whatever other plans keep.
+    Returns rows deleted per plan, or None if another worker held the lock
+    at any batch (rows already deleted by this run stay deleted).
+    """
+    purged: Dict[str, int] = {}
+    for plan, months in retention.items():
+        cutoff = add_months(month_start(now), -months)
+        purged[plan] = 0
+        after = ""
+        while True:
+            async with engine.begin() as conn:
+                if not await _try_lock(conn, "purge"):
+                    return None
+                user_ids = (await conn.execute(
+                    _PLAN_USERS_SQL,
+                    {
+                        "plan": plan,
+                        "default_plan": MESSAGE_RETENTION_DEFAULT_PLAN,
+                        "after": after,
+                        "limit": users_per_batch,
+                    },
+                )).scalars().all()
+            if not user_ids:
+                break
+            while True:
+                async with engine.begin() as conn:
+                    if not await _try_lock(conn, "purge"):
+                        return None
+                    result = await conn.execute(
+                        _PURGE_BATCH_SQL, {"user_ids": user_ids, "cutoff": cutoff, "batch_size": batch_size}
+                    )
+                purged[plan] += result.rowcount
+                if result.rowcount < batch_size:
+                    break
+            if len(user_ids) < users_per_batch:
+                break
+            after = user_ids[-1]
+    return purged
+
+
+async def maintain_message_partitions(engine: AsyncEngine, now: Optional[datetime] = None) -> PartitionMaintenanceReport:
+    """Create upcoming partitions, archive expired ones and purge per-plan history"""
+    now = now or datetime.utcnow()
+    report = PartitionMaintenanceReport()
+
+    created = await ensure_partitions(engine, now)
+    if created is None:
+        report.skipped.append("ensure")
+    else:
+        report.created = created
+
+    if MESSAGE_RETENTION_MONTHS:
+        # Only whole months past every plan's retention can be detached
+        cutoff = add_months(month_start(now), -max(MESSAGE_RETENTION_MONTHS.values()))
+        detached = await detach_expired_partitions(engine, cutoff, MESSAGE_RETENTION_MONTHS)
+        if detached is None:
+            report.skipped.append("detach")
+        else:
+            report.detached = detached
+
+        purged = await purge_expired_messages(engine, now)
+        if purged is None:
+            report.skipped.append("purge")
+        else:
+            report.purged = purged
+
+    logger.info(
+        f"Message partition maintenance: created={report.created} detached={report.detached} "
+        f"purged={report.purged} skipped={report.skipped}"
+    )
+    return report
+
+
+class PartitionMaintenance:
+    """Runs ``maintain_message_partitions`` every ``interval`` seconds in the background"""
+
+    def __init__(self, engine: AsyncEngine, interval: float = MESSAGE_PARTITION_MAINTENANCE_INTERVAL) -> None:
+        self.engine = engine
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await maintain_message_partitions(self.engine)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Message partition maintenance failed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None and self.engine is not None and self.interval > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    from .connection import dispose_engines, get_async_engine
+
+    load_dotenv()
+
+    async def _main() -> None:
+        engine = get_async_engine()
+        if engine is None:
+            raise SystemExit("DATABASE_URL is not set")
+        print(await maintain_message_partitions(engine))
+        await dispose_engines()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
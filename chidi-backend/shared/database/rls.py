@@ -0,0 +1,87 @@
+"""
+Row-Level Security context for gateway database sessions.
+
+The policies from migration 006 compare each row's owner with the
+``request.jwt.claim.sub`` setting, the same setting Supabase/PostgREST use.
+When enabled, every transaction of a user-scoped session starts by setting
+that claim (and optionally switching to a non-bypassing role) with
+``set_config(..., is_local => true)``, so it never leaks to the next
+transaction on a pooled or pgbouncer-shared connection.
+
+Configuration (environment variables):
+    DB_RLS_ENABLED   set the claim on user-scoped sessions (default false:
+                     the gateway's role bypasses RLS and filters explicitly)
+    DB_RLS_ROLE      role assumed per transaction so policies apply
+                     (default ``authenticated``; empty keeps the login role)
+"""
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, Tuple
+
+from fastapi import Depends
+from sqlalchemy import Connection, event, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from sqlalchemy.orm import Session, SessionTransaction
+
+from shared.auth.dependencies import require_user_id
+
+from .connection import get_async_sessionmaker, get_db
+
+logger = logging.getLogger(__name__)
+
+DB_RLS_ENABLED = os.getenv("DB_RLS_ENABLED", "false").lower() in ("1", "true", "yes")
+DB_RLS_ROLE = os.getenv("DB_RLS_ROLE", "authenticated")
+
+CLAIM_SUB_SETTING = "request.jwt.claim.sub"
+
+_SET_CLAIM = text(f"SELECT set_config('{CLAIM_SUB_SETTING}', :sub, true)")
+_SET_CLAIM_AND_ROLE = text(
+    f"SELECT set_config('{CLAIM_SUB_SETTING}', :sub, true), set_config('role', :role, true)"
+)
+
+
+def _claims_statement(user_id: str, role: str) -> Tuple[Any, Dict[str, str]]:
+    if role:
+        return _SET_CLAIM_AND_ROLE, {"sub": user_id, "role": role}
+    return _SET_CLAIM, {"sub": user_id}
+
+
+def apply_rls_claims(session: AsyncSession, user_id: str, role: str = DB_RLS_ROLE) -> None:
+    """Set the JWT subject (and role) at the start of every transaction of ``session``"""
+    statement, params = _claims_statement(user_id, role)
+
+    @event.listens_for(session.sync_session, "after_begin")
+    def _set_claims(sync_session: Session, transaction: SessionTransaction, connection: Connection) -> None:
+        connection.execute(statement, params)
+
+
+async def set_rls_claims(conn: AsyncConnection, user_id: str, role: str = DB_RLS_ROLE) -> None:
+    """Set the JWT subject (and role) for the current transaction of ``conn``"""
+    statement, params = _claims_statement(user_id, role)
+    await conn.execute(statement, params)
+
+
+async def get_user_db(
+    user_id: str = Depends(require_user_id),
+    db: AsyncSession = Depends(get_db),
+) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Dependency for user-scoped endpoints: a pooled session whose
+    transactions run under the caller's RLS claims when DB_RLS_ENABLED.
+    """
+    if DB_RLS_ENABLED:
+        apply_rls_claims(db, user_id)
+    yield db
+
+
+@asynccontextmanager
+async def user_session(user_id: str) -> AsyncIterator[AsyncSession]:
+    """A new session for background work on behalf of ``user_id`` (RLS claims as in get_user_db)"""
+    session_factory = get_async_sessionmaker()
+    if session_factory is None:
+        raise RuntimeError("Async database engine is not configured")
+    async with session_factory() as db:
+        if DB_RLS_ENABLED:
+            apply_rls_claims(db, user_id)
+        yield db
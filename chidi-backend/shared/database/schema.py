@@ -0,0 +1,135 @@
+"""
+Live schema capability detection.
+
+The gateway inspects the connected database once at startup and builds its
+SQL from what it finds, instead of trying a statement and falling back when
+a column from a newer migration is missing.
+"""
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .models import UserContext
+
+logger = logging.getLogger(__name__)
+
+_COLUMNS_QUERY = text(
+    """
+    SELECT column_name
+    FROM information_schema.columns
+    WHERE table_schema = current_schema() AND table_name = :table_name
+    """
+)
+
+# Database functions created by migrations that the gateway calls
+KNOWN_FUNCTIONS = ("jsonb_merge_patch",)
+
+_FUNCTIONS_QUERY = text(
+    """
+    SELECT DISTINCT p.proname
+    FROM pg_proc p
+    JOIN pg_namespace n ON n.oid = p.pronamespace
+    WHERE n.nspname = current_schema() AND p.proname = ANY(:names)
+    """
+)
+
+_REVISION_QUERY = text(
+    """
+    SELECT CASE WHEN to_regclass('alembic_version') IS NOT NULL
+                THEN (SELECT string_agg(version_num, ',') FROM alembic_version)
+           END
+    """
+)
+
+
+@dataclass(frozen=True)
+class SchemaCapabilities:
+    """Which optional schema features the connected database supports"""
+    user_context_columns: FrozenSet[str]
+    functions: FrozenSet[str] = frozenset(KNOWN_FUNCTIONS)
+    alembic_revision: Optional[str] = None
+    detected: bool = False
+    error: Optional[str] = field(default=None, compare=False)
+
+    @property
+    def has_settings_column(self) -> bool:
+        """settings was added to user_contexts in migration 002"""
+        return "settings" in self.user_context_columns
+
+    @property
+    def has_merge_patch(self) -> bool:
+        """jsonb_merge_patch() was added in migration 005"""
+        return "jsonb_merge_patch" in self.functions
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "detected": self.detected,
+            "alembic_revision": self.alembic_revision,
+            "user_context_columns": sorted(self.user_context_columns),
+            "has_settings_column": self.has_settings_column,
+            "functions": sorted(self.functions),
+            "has_merge_patch": self.has_merge_patch,
+            "error": self.error,
+        }
+
+
+# Used until detection has run (or if it fails): assume the schema matches models.py
+DEFAULT_CAPABILITIES = SchemaCapabilities(
+    user_context_columns=frozenset(column.name for column in UserContext.__table__.columns),
+)
+
+_capabilities: SchemaCapabilities = DEFAULT_CAPABILITIES
+
+
+async def detect_schema_capabilities(engine: AsyncEngine) -> SchemaCapabilities:
+    """Inspect the live schema and Alembic revision in one connection checkout"""
+    async with engine.connect() as conn:
+        result = await conn.execute(_COLUMNS_QUERY, {"table_name": UserContext.__tablename__})
+        columns = frozenset(result.scalars().all())
+        result = await conn.execute(_FUNCTIONS_QUERY, {"names": list(KNOWN_FUNCTIONS)})
+        functions = frozenset(result.scalars().all())
+        revision = (await conn.execute(_REVISION_QUERY)).scalar()
+
+    return SchemaCapabilities(
+        user_context_columns=columns,
+        functions=functions,
+        alembic_revision=revision,
+        detected=True,
+    )
+
+
+async def refresh_schema_capabilities(engine: AsyncEngine) -> SchemaCapabilities:
+    """
+    Detect schema capabilities and make them the process-wide default.
+
+    If the database cannot be inspected the previous capabilities are kept
+    (initially ``DEFAULT_CAPABILITIES``) and the error is recorded so it shows
+    up on the diagnostics endpoint.
+    """
+    global _capabilities
+
+    try:
+        _capabilities = await detect_schema_capabilities(engine)
+        logger.info(
+            f"Schema capabilities detected: revision={_capabilities.alembic_revision}, "
+            f"settings_column={_capabilities.has_settings_column}, "
+            f"merge_patch={_capabilities.has_merge_patch}"
+        )
+    except Exception as e:
+        logger.warning(f"Schema capability detection failed, assuming models.py schema: {str(e)}")
+        _capabilities = SchemaCapabilities(
+            user_context_columns=_capabilities.user_context_columns,
+            functions=_capabilities.functions,
+            alembic_revision=_capabilities.alembic_revision,
+            detected=False,
+            error=str(e),
+        )
+    return _capabilities
+
+
+def get_schema_capabilities() -> SchemaCapabilities:
+    """Return the capabilities detected at startup"""
+    return _capabilities
@@ -0,0 +1,390 @@
+"""
+Token-budgeted context window for chat prompts.
+
+A prompt is the system prompt, the user's business context
+(``UserContext.business_data``) and as many of the conversation's most
+recent messages as fit in ``LLM_CONTEXT_MAX_TOKENS`` minus the tokens
+reserved for the reply.
+
+Every message's token count is stored in ``messages.token_count`` when it
+is written, and each process keeps a window per user and conversation
+holding just enough recent messages to fill the history budget. Building a
+prompt reads only the messages near and after the window's tail (so writes
+from other workers are picked up) and tokenizes only new ones, so the cost
+depends on the budget and the new tail, never on the length of the
+conversation.
+
+``created_at`` is the inserting transaction's start time, so a message can
+commit after the window has moved past its timestamp. Each sync re-reads
+``LLM_CONTEXT_SYNC_OVERLAP`` seconds behind the tail and slots such late
+messages into place.
+
+Windows are cached per process, outside any session, so every query also
+filters on ``messages.user_id``: a cached window is only ever served to the
+user it was built for, whatever the session's RLS settings.
+
+Configuration (environment variables):
+    LLM_CONTEXT_MAX_TOKENS         prompt + reply budget (default 128000)
+    LLM_RESPONSE_RESERVE_TOKENS    tokens kept free for the reply (default 4096)
+    LLM_CONTEXT_WINDOW_CACHE_SIZE  conversations cached per process (default 1024)
+    LLM_CONTEXT_WINDOW_TTL         seconds a cached window is kept (default 600)
+    LLM_CONTEXT_SYNC_OVERLAP       seconds re-read behind the tail on sync (default 30)
+"""
+import bisect
+import hashlib
+import json
+import logging
+import os
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Deque, Dict, List, Optional, Sequence, Set, Tuple
+from uuid import UUID
+
+from sqlalchemy import bindparam, insert, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shared.cache.lru import TTLCache
+from shared.database.models import Message
+
+from .tokens import MESSAGE_OVERHEAD_TOKENS, TokenCounter, count_message_tokens, get_token_counter
+
+logger = logging.getLogger(__name__)
+
+LLM_CONTEXT_MAX_TOKENS = int(os.getenv("LLM_CONTEXT_MAX_TOKENS", "128000"))
+LLM_RESPONSE_RESERVE_TOKENS = int(os.getenv("LLM_RESPONSE_RESERVE_TOKENS", "4096"))
+LLM_CONTEXT_WINDOW_CACHE_SIZE = int(os.getenv("LLM_CONTEXT_WINDOW_CACHE_SIZE", "1024"))
+LLM_CONTEXT_WINDOW_TTL = float(os.getenv("LLM_CONTEXT_WINDOW_TTL", "600"))
+LLM_CONTEXT_SYNC_OVERLAP = float(os.getenv("LLM_CONTEXT_SYNC_OVERLAP", "30"))
+
+# Rows fetched per round trip when filling or syncing a window
+WINDOW_FETCH_SIZE = 200
+
+messages = Message.__table__
+
+WINDOW_COLUMNS = (
+    messages.c.id,
+    messages.c.role,
+    messages.c.content,
+    messages.c.token_count,
+    messages.c.created_at,
+)
+
+_STORE_TOKEN_COUNT = (
+    update(messages)
+    .where(messages.c.id == bindparam("message_id"), messages.c.created_at == bindparam("message_created_at"))
+    .values(token_count=bindparam("message_token_count"))
+)
+
+
+@dataclass
+class WindowMessage:
+    """A message held in a context window; ``tokens`` includes chat framing"""
+    id: UUID
+    role: str
+    content: str
+    created_at: datetime
+    tokens: int
+
+    @property
+    def key(self) -> Tuple[datetime, UUID]:
+        return self.created_at, self.id
+
+
+@dataclass
+class ContextPrompt:
+    """Messages ready to send to the model"""
+    messages: List[Dict[str, str]]
+    tokens: int
+    history_messages: int
+    # True when older messages of the conversation were left out
+    truncated: bool
+
+
+class ConversationWindow:
+    """
+    The most recent messages of one conversation, in chronological order,
+    trimmed from the front once the rest still covers ``capacity`` tokens.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.messages: Deque[WindowMessage] = deque()
+        self.tokens = 0
+        self._ids: Set[UUID] = set()
+        # False once anything older than messages[0] exists but is not held
+        self.complete = True
+
+    @property
+    def last_key(self) -> Optional[Tuple[datetime, UUID]]:
+        return self.messages[-1].key if self.messages else None
+
+    def __contains__(self, message_id: UUID) -> bool:
+        return message_id in self._ids
+
+    def append(self, message: WindowMessage) -> None:
+        """
+        Add a message in ``(created_at, id)`` order. One older than the tail
+        (committed late) is slotted into place; one older than everything
+        held after the window was trimmed is outside it and dropped.
+        """
+        if message.id in self._ids:
+            return  # already synced by a concurrent request
+        last_key = self.last_key
+        if last_key is None or message.key > last_key:
+            self.messages.append(message)
+        elif message.key > self.messages[0].key or self.complete:
+            index = bisect.bisect_left([held.key for held in self.messages], message.key)
+            self.messages.insert(index, message)
+        else:
+            return
+        self._ids.add(message.id)
+        self.tokens += message.tokens
+        while len(self.messages) > 1 and self.tokens - self.messages[0].tokens >= self.capacity:
+            dropped = self.messages.popleft()
+            self._ids.discard(dropped.id)
+            self.tokens -= dropped.tokens
+            self.complete = False
+
+    def select(self, budget: int) -> List[WindowMessage]:
+        """The longest suffix of the window that fits in ``budget`` tokens"""
+        selected: List[WindowMessage] = []
+        used = 0
+        for message in reversed(self.messages):
+            if used + message.tokens > budget:
+                break
+            selected.append(message)
+            used += message.tokens
+        selected.reverse()
+        return selected
+
+
+def render_business_context(business_data: Optional[Dict[str, Any]]) -> Optional[str]:
+    """System message carrying the user's business context, or None when empty"""
+    if not business_data:
+        return None
+    return "Business context:\n" + json.dumps(business_data, ensure_ascii=False, sort_keys=True)
+
+
+class ContextAssembler:
+    """
+    Builds token-budgeted prompts from stored messages.
+
+    Args:
+        counter: Token counter; defaults to the configured one (tokens.py)
+        max_tokens: Context size of the model
+        reserve_tokens: Tokens left free for the reply
+        cache_size: Conversation windows kept in this process
+        ttl: Seconds an idle window is kept
+        sync_overlap: Seconds re-read behind a window's tail for late commits
+    """
+
+    def __init__(
+        self,
+        counter: Optional[TokenCounter] = None,
+        max_tokens: int = LLM_CONTEXT_MAX_TOKENS,
+        reserve_tokens: int = LLM_RESPONSE_RESERVE_TOKENS,
+        cache_size: int = LLM_CONTEXT_WINDOW_CACHE_SIZE,
+        ttl: float = LLM_CONTEXT_WINDOW_TTL,
+        sync_overlap: float = LLM_CONTEXT_SYNC_OVERLAP,
+    ):
+        self._counter = counter
+        self.max_tokens = max_tokens
+        self.reserve_tokens = reserve_tokens
+        self.sync_overlap = timedelta(seconds=sync_overlap)
+        # Keyed by owner too: a window is never served to another user's request
+        self._windows: TTLCache[Tuple[str, UUID], ConversationWindow] = TTLCache(maxsize=cache_size, ttl=ttl)
+        # Business context is re-sent with every prompt but rarely changes
+        self._text_tokens: TTLCache[str, int] = TTLCache(maxsize=cache_size, ttl=ttl)
+
+    @property
+    def counter(self) -> TokenCounter:
+        return self._counter or get_token_counter()
+
+    @property
+    def history_capacity(self) -> int:
+        return max(self.max_tokens - self.reserve_tokens, 0)
+
+    def count_text(self, content: str) -> int:
+        """Tokens of a framed message, memoized by content hash"""
+        key = hashlib.sha1(content.encode("utf-8")).hexdigest()
+        tokens: Optional[int] = self._text_tokens.get(key)
+        if tokens is None:
+            tokens = count_message_tokens(content, self.counter)
+            self._text_tokens.set(key, tokens)
+        return tokens
+
+    async def add_message(
+        self,
+        db: AsyncSession,
+        conversation_id: UUID,
+        role: str,
+        content: str,
+        message_metadata: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Insert a message with its token count. The caller commits; cached
+        windows pick the message up on their next sync.
+
+        Returns:
+            The new row's ``id``, ``created_at`` and ``token_count``
+        """
+        token_count = self.counter.count(content)
+        result = await db.execute(
+            insert(messages)
+            .values(
+                conversation_id=conversation_id,
+                role=role,
+                content=content,
+                message_metadata=message_metadata,
+                token_count=token_count,
+            )
+            .returning(messages.c.id, messages.c.created_at, messages.c.token_count)
+        )
+        return dict(result.mappings().one())
+
+    async def window(self, db: AsyncSession, user_id: str, conversation_id: UUID) -> ConversationWindow:
+        """``user_id``'s window of the conversation, synced with messages written since it was built"""
+        key = (user_id, conversation_id)
+        window: Optional[ConversationWindow] = self._windows.get(key)
+        if window is None or not await self._sync(db, user_id, conversation_id, window):
+            window = await self._load(db, user_id, conversation_id)
+        self._windows.set(key, window)
+        return window
+
+    def invalidate(self, user_id: str, conversation_id: UUID) -> None:
+        """Drop a cached window, e.g. after messages were edited or deleted"""
+        self._windows.pop((user_id, conversation_id))
+
+    async def build_prompt(
+        self,
+        db: AsyncSession,
+        user_id: str,
+        conversation_id: UUID,
+        system_prompt: str,
+        business_data: Optional[Dict[str, Any]] = None,
+    ) -> ContextPrompt:
+        """
+        Assemble system prompt, business context and the most recent
+        messages that fit the budget.
+
+        Args:
+            db: Session (RLS-scoped for user requests)
+            user_id: Owner of the conversation; only their messages are read
+            conversation_id: Conversation to continue
+            system_prompt: Instructions for the model
+            business_data: ``UserContext.business_data`` of the owner
+
+        Returns:
+            ContextPrompt with chat messages in chronological order
+        """
+        prompt: List[Dict[str, str]] = [{"role": "system", "content": system_prompt}]
+        used = self.count_text(system_prompt)
+        business_context = render_business_context(business_data)
+        if business_context is not None:
+            prompt.append({"role": "system", "content": business_context})
+            used += self.count_text(business_context)
+
+        budget = self.history_capacity - used
+        if budget <= 0:
+            logger.warning(
+                f"System prompt and business context use {used} tokens; "
+                f"no room for history in conversation {conversation_id}"
+            )
+            budget = 0
+
+        window = await self.window(db, user_id, conversation_id)
+        history = window.select(budget)
+        prompt.extend({"role": message.role, "content": message.content} for message in history)
+        return ContextPrompt(
+            messages=prompt,
+            tokens=used + sum(message.tokens for message in history),
+            history_messages=len(history),
+            truncated=len(history) < len(window.messages) or not window.complete,
+        )
+
+    async def _load(self, db: AsyncSession, user_id: str, conversation_id: UUID) -> ConversationWindow:
+        """Read messages newest first until the history budget is covered"""
+        window = ConversationWindow(self.history_capacity)
+        newest_first: List[WindowMessage] = []
+        tokens = 0
+        before: Optional[Tuple[datetime, UUID]] = None
+        exhausted = False
+        while not exhausted and tokens < window.capacity:
+            query = (
+                select(*WINDOW_COLUMNS)
+                .where(messages.c.conversation_id == conversation_id, messages.c.user_id == user_id)
+                .order_by(messages.c.created_at.desc(), messages.c.id.desc())
+                .limit(WINDOW_FETCH_SIZE)
+            )
+            if before is not None:
+                query = query.where(
+                    messages.c.created_at <= before[0],
+                    tuple_(messages.c.created_at, messages.c.id) < before,
+                )
+            page = await self._window_messages(db, (await db.execute(query)).all())
+            taken = 0
+            for message in page:
+                if tokens >= window.capacity:
+                    break
+                newest_first.append(message)
+                tokens += message.tokens
+                taken += 1
+            exhausted = len(page) < WINDOW_FETCH_SIZE and taken == len(page)
+            if page:
+                before = page[-1].key
+
+        for message in reversed(newest_first):
+            window.append(message)
+        window.complete = exhausted
+        return window
+
+    async def _sync(
+        self, db: AsyncSession, user_id: str, conversation_id: UUID, window: ConversationWindow
+    ) -> bool:
+        """
+        Add messages newer than the window's tail, or committed late within
+        the overlap behind it; False if there are too many to sync
+        """
+        query = (
+            select(*WINDOW_COLUMNS)
+            .where(messages.c.conversation_id == conversation_id, messages.c.user_id == user_id)
+            .order_by(messages.c.created_at, messages.c.id)
+            .limit(WINDOW_FETCH_SIZE)
+        )
+        last_key = window.last_key
+        if last_key is not None:
+            query = query.where(messages.c.created_at >= last_key[0] - self.sync_overlap)
+        rows = (await db.execute(query)).all()
+        if len(rows) == WINDOW_FETCH_SIZE:
+            # A bulk write landed; rebuilding from the newest end is cheaper
+            return False
+        new_rows = [row for row in rows if row.id not in window]
+        for message in await self._window_messages(db, new_rows):
+            window.append(message)
+        return True
+
+    async def _window_messages(self, db: AsyncSession, rows: Sequence[Any]) -> List[WindowMessage]:
+        """Turn rows into window messages, counting (and storing) missing token counts"""
+        result: List[WindowMessage] = []
+        counted: List[Dict[str, Any]] = []
+        for row in rows:
+            token_count = row.token_count
+            if token_count is None:
+                token_count = self.counter.count(row.content)
+                counted.append({
+                    "message_id": row.id,
+                    "message_created_at": row.created_at,
+                    "message_token_count": token_count,
+                })
+            result.append(WindowMessage(
+                id=row.id,
+                role=row.role,
+                content=row.content,
+                created_at=row.created_at,
+                tokens=token_count + MESSAGE_OVERHEAD_TOKENS,
+            ))
+        if counted:
+            # Rows written before token counts existed; kept if the caller commits
+            await db.execute(_STORE_TOKEN_COUNT, counted)
+        return result
@@ -0,0 +1,139 @@
+"""
+Text embedders for business-context retrieval.
+
+``HashingEmbedder`` is deterministic and runs offline (signed feature
+hashing of word unigrams and bigrams), so the whole pipeline works in
+development and tests; texts sharing words land close together.
+``OpenAIEmbedder`` calls the OpenAI embeddings API, many texts per request.
+
+Configuration (environment variables):
+    EMBEDDING_PROVIDER   ``local`` (default) or ``openai``
+    EMBEDDING_MODEL      OpenAI model (default text-embedding-3-small)
+    OPENAI_API_KEY       required for ``openai``
+    OPENAI_BASE_URL      API base URL (default https://api.openai.com/v1)
+    EMBEDDING_TIMEOUT    seconds per embeddings request (default 30)
+
+Vectors must have ``EMBEDDING_DIMENSIONS`` (shared/database/models.py)
+components to fit the ``business_embeddings.embedding`` column.
+"""
+import hashlib
+import logging
+import math
+import os
+import re
+from typing import List, Optional, Protocol, Sequence
+
+import httpx
+
+from shared.database.models import EMBEDDING_DIMENSIONS
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "local")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+EMBEDDING_TIMEOUT = float(os.getenv("EMBEDDING_TIMEOUT", "30"))
+
+
+class Embedder(Protocol):
+    """Turns texts into vectors; ``name`` is stored with every vector"""
+    name: str
+    dimensions: int
+
+    async def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        ...
+
+
+class HashingEmbedder:
+    """Deterministic local embedder: L2-normalized signed hashing of word n-grams"""
+
+    _WORDS = re.compile(r"\w+")
+
+    def __init__(self, dimensions: int = EMBEDDING_DIMENSIONS):
+        self.dimensions = dimensions
+        self.name = f"hashing-{dimensions}"
+
+    def _vector(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        words = self._WORDS.findall(text.lower())
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(value * value for value in vector))
+        if norm == 0:
+            # Cosine distance is undefined for a zero vector
+            vector[0], norm = 1.0, 1.0
+        return [value / norm for value in vector]
+
+    async def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        return [self._vector(text) for text in texts]
+
+
+class OpenAIEmbedder:
+    """OpenAI embeddings API; one request per call, however many texts"""
+
+    def __init__(
+        self,
+        model: str = EMBEDDING_MODEL,
+        dimensions: int = EMBEDDING_DIMENSIONS,
+        api_key: Optional[str] = None,
+        base_url: str = OPENAI_BASE_URL,
+        timeout: float = EMBEDDING_TIMEOUT,
+    ):
+        api_key = api_key or os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise RuntimeError("OPENAI_API_KEY is not set")
+        self.model = model
+        self.dimensions = dimensions
+        self.name = f"openai:{model}"
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            headers={"Authorization": f"Bearer {api_key}"},
+            timeout=timeout,
+        )
+
+    async def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        response = await self._client.post(
+            "/embeddings",
+            json={"model": self.model, "input": list(texts), "dimensions": self.dimensions},
+        )
+        response.raise_for_status()
+        data = sorted(response.json()["data"], key=lambda item: item["index"])
+        return [item["embedding"] for item in data]
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+_embedder: Optional[Embedder] = None
+
+
+def get_embedder() -> Embedder:
+    """The configured embedder, created on first use"""
+    global _embedder
+    if _embedder is None:
+        if EMBEDDING_PROVIDER == "openai":
+            _embedder = OpenAIEmbedder()
+        else:
+            _embedder = HashingEmbedder()
+        logger.info(f"Embedder: {_embedder.name}")
+    return _embedder
+
+
+async def close_embedder() -> None:
+    """Close the embedder's pooled connections, if it has any (application shutdown)"""
+    global _embedder
+    if _embedder is not None:
+        aclose = getattr(_embedder, "aclose", None)
+        if aclose is not None:
+            await aclose()
+        _embedder = None
+
+
+def set_embedder(embedder: Optional[Embedder]) -> None:
+    """Swap the process-wide embedder (None restores the configured one)"""
+    global _embedder
+    _embedder = embedder
@@ -0,0 +1 @@
+# This file makes the providers directory a Python package
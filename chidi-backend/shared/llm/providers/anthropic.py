@@ -0,0 +1,57 @@
+"""
+Anthropic Messages API (streaming)
+"""
+from typing import Any, Dict, Optional
+
+from .base import HTTPProvider, Messages, ProviderError, StreamChunk
+
+ANTHROPIC_VERSION = "2023-06-01"
+
+
+class AnthropicProvider(HTTPProvider):
+    """``POST /messages`` with ``stream: true``; system messages go in the ``system`` field"""
+
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "claude-3-5-sonnet-latest",
+        base_url: str = "https://api.anthropic.com/v1",
+        name: str = "anthropic",
+        **kwargs: Any,
+    ):
+        super().__init__(
+            name=name,
+            base_url=base_url,
+            model=model,
+            headers={"x-api-key": api_key, "anthropic-version": ANTHROPIC_VERSION},
+            **kwargs,
+        )
+
+    def _request(self, messages: Messages, max_tokens: int, temperature: float) -> Dict[str, Any]:
+        system = "\n\n".join(m["content"] for m in messages if m["role"] == "system")
+        payload: Dict[str, Any] = {
+            "model": self.model,
+            "messages": [{"role": m["role"], "content": m["content"]} for m in messages if m["role"] != "system"],
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "stream": True,
+        }
+        if system:
+            payload["system"] = system
+        return {"url": "/messages", "json": payload}
+
+    def _parse_event(self, event: Dict[str, Any]) -> Optional[StreamChunk]:
+        kind = event.get("type")
+        if kind == "content_block_delta":
+            return StreamChunk(text=(event.get("delta") or {}).get("text") or "")
+        if kind == "message_start":
+            usage = (event.get("message") or {}).get("usage") or {}
+            return StreamChunk(prompt_tokens=usage.get("input_tokens"))
+        if kind == "message_delta":
+            usage = event.get("usage") or {}
+            return StreamChunk(completion_tokens=usage.get("output_tokens"))
+        if kind == "error":
+            # e.g. overloaded_error after the stream started
+            error = event.get("error") or {}
+            raise ProviderError(self.name, f"{error.get('type')}: {error.get('message')}")
+        return None
@@ -0,0 +1,254 @@
+"""
+Streaming LLM provider clients.
+
+Every provider keeps one pooled ``httpx.AsyncClient`` (HTTP/2 when ``h2``
+is installed) for the life of the process, streams tokens as server-sent
+events, caps its own concurrency with a semaphore and trips a circuit
+breaker after repeated failures so callers fail over immediately instead
+of waiting for timeouts.
+"""
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator, AsyncIterator, Callable, Dict, List, Optional, Sequence
+
+import httpx
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+Messages = Sequence[Dict[str, str]]
+
+
+@dataclass
+class Completion:
+    """What the model returned for a prompt"""
+    response: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    provider: Optional[str] = None
+
+
+@dataclass
+class StreamChunk:
+    """A piece of a streamed completion; usage arrives on (usually) the last chunk"""
+    text: str = ""
+    provider: str = ""
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+
+
+class ProviderError(Exception):
+    """A provider call failed; ``retryable`` says whether another provider may succeed"""
+
+    def __init__(self, provider: str, message: str, retryable: bool = True, status_code: Optional[int] = None):
+        super().__init__(f"{provider}: {message}")
+        self.provider = provider
+        self.retryable = retryable
+        self.status_code = status_code
+
+
+class ProviderUnavailable(ProviderError):
+    """The circuit is open or the concurrency cap was not released in time"""
+
+
+class CircuitBreaker:
+    """
+    Opens after ``failure_threshold`` consecutive failures; after
+    ``reset_timeout`` seconds one probe request is let through (half-open)
+    and its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str = "",
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(f"Circuit for {self.name} opened after {self.failures} failures")
+            self.state = self.OPEN
+            self._opened_at = self._clock()
+
+    def release(self) -> None:
+        """The probe ended without a verdict (e.g. cancelled); let another one through"""
+        self._probing = False
+
+
+class HTTPProvider:
+    """
+    Base for SSE-streaming chat providers. Subclasses build the request
+    (``_request``) and turn each event into a chunk (``_parse_event``).
+
+    Args:
+        name: Label for logs and metrics
+        base_url: API base URL
+        model: Model name sent with every request
+        headers: Authentication and version headers
+        max_concurrency: Requests in flight at once; more wait up to ``queue_timeout``
+        connect_timeout: Seconds to open a connection
+        read_timeout: Longest gap between two streamed events
+        breaker: Circuit breaker (one per provider)
+    """
+
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        model: str,
+        headers: Optional[Dict[str, str]] = None,
+        max_concurrency: int = 32,
+        queue_timeout: float = 2.0,
+        connect_timeout: float = 3.0,
+        read_timeout: float = 30.0,
+        breaker: Optional[CircuitBreaker] = None,
+        client: Optional[httpx.AsyncClient] = None,
+    ):
+        self.name = name
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.breaker = breaker or CircuitBreaker(name)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self._client = client or httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            http2=HTTP2_AVAILABLE,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout, pool=queue_timeout),
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+        )
+
+    def _request(self, messages: Messages, max_tokens: int, temperature: float) -> Dict[str, Any]:
+        """``{"url": ..., "json": ...}`` for a streaming completion"""
+        raise NotImplementedError
+
+    def _parse_event(self, event: Dict[str, Any]) -> Optional[StreamChunk]:
+        raise NotImplementedError
+
+    async def stream(
+        self,
+        messages: Messages,
+        max_tokens: int = 1024,
+        temperature: float = 0.7,
+    ) -> AsyncGenerator[StreamChunk, None]:
+        """
+        Stream a completion. Raises ProviderUnavailable without calling the
+        API when the circuit is open or the concurrency cap is saturated.
+        """
+        if not self.breaker.allow():
+            raise ProviderUnavailable(self.name, "circuit open")
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.breaker.release()
+            raise ProviderUnavailable(self.name, f"{self.max_concurrency} requests already in flight")
+        except BaseException:
+            # Cancelled while queued (a hedge that lost, a client that left)
+            self.breaker.release()
+            raise
+
+        self.in_flight += 1
+        verdict = False
+        try:
+            request = self._request(messages, max_tokens, temperature)
+            async with self._client.stream("POST", request["url"], json=request["json"]) as response:
+                if response.status_code >= 400:
+                    body = (await response.aread())[:500].decode("utf-8", "replace")
+                    # Rate limits and server errors are the provider's; other 4xx are ours
+                    raise ProviderError(
+                        self.name, f"HTTP {response.status_code}: {body}",
+                        retryable=response.status_code == 429 or response.status_code >= 500,
+                        status_code=response.status_code,
+                    )
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    chunk = self._parse_event(json.loads(data))
+                    if chunk is not None:
+                        chunk.provider = self.name
+                        yield chunk
+            self.breaker.record_success()
+            verdict = True
+        except ProviderError as e:
+            if e.retryable:
+                self.breaker.record_failure()
+            else:
+                self.breaker.release()
+            verdict = True
+            raise
+        except (httpx.HTTPError, ValueError) as e:
+            self.breaker.record_failure()
+            verdict = True
+            raise ProviderError(self.name, f"{type(e).__name__}: {str(e)}") from e
+        finally:
+            if not verdict:
+                # Cancelled or closed by the caller (e.g. a hedge that lost)
+                self.breaker.release()
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    async def complete(self, messages: Messages, max_tokens: int = 1024, temperature: float = 0.7) -> Completion:
+        """Non-streaming convenience wrapper around ``stream``"""
+        return await collect(self.stream(messages, max_tokens, temperature))
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+async def collect(chunks: AsyncIterator[StreamChunk]) -> Completion:
+    """Join a stream into a Completion"""
+    parts: List[str] = []
+    completion = Completion(response="")
+    async for chunk in chunks:
+        parts.append(chunk.text)
+        completion.provider = chunk.provider
+        if chunk.prompt_tokens is not None:
+            completion.prompt_tokens = chunk.prompt_tokens
+        if chunk.completion_tokens is not None:
+            completion.completion_tokens = chunk.completion_tokens
+    completion.response = "".join(parts)
+    return completion
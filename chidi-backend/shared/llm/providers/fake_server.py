@@ -0,0 +1,168 @@
+"""
+Local stand-in for the OpenAI and Anthropic streaming APIs, for tests and
+benchmarks. Latency, failures and stalls are configurable so fallback,
+hedging and circuit breaking can be exercised without a real provider.
+
+    python -m shared.llm.providers.fake_server --port 9100 --ttft-ms 300 --stall-rate 0.1
+
+Then point ``OPENAI_BASE_URL`` / ``ANTHROPIC_BASE_URL`` at
+``http://127.0.0.1:9100/v1`` (any API key is accepted).
+"""
+import argparse
+import asyncio
+import json
+import random
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+from shared.llm.tokens import LocalTokenCounter
+
+WORDS = "the quick brown fox jumps over the lazy dog while chidi answers every customer".split()
+
+
+@dataclass
+class FakeProviderConfig:
+    """
+    Args:
+        ttft_ms: Delay before the first token
+        token_ms: Delay between tokens
+        tokens: Tokens per completion
+        fail_rate: Share of requests answered with ``fail_status``
+        fail_status: HTTP status of failed requests
+        stall_rate: Share of requests whose first token takes ``stall_ms``
+        stall_ms: First-token delay of stalled requests
+        seed: Random seed for failures and stalls
+    """
+    ttft_ms: float = 200
+    token_ms: float = 15
+    tokens: int = 40
+    fail_rate: float = 0.0
+    fail_status: int = 503
+    stall_rate: float = 0.0
+    stall_ms: float = 5000
+    seed: Optional[int] = None
+
+
+def create_app(config: Optional[FakeProviderConfig] = None) -> FastAPI:
+    """Fake provider app; ``app.state.requests`` counts requests served"""
+    config = config or FakeProviderConfig()
+    rng = random.Random(config.seed)
+    counter = LocalTokenCounter()
+    app = FastAPI(title="Fake LLM provider")
+    app.state.config = config
+    app.state.requests = 0
+
+    def prompt_tokens(payload: Dict[str, Any]) -> int:
+        texts = [m.get("content") or "" for m in payload.get("messages", [])]
+        return sum(counter.count(text) for text in texts + [payload.get("system") or ""])
+
+    def plan() -> Optional[float]:
+        """First-token delay in seconds, or None when this request should fail"""
+        app.state.requests += 1
+        if rng.random() < config.fail_rate:
+            return None
+        ttft = config.stall_ms if rng.random() < config.stall_rate else config.ttft_ms
+        return ttft / 1000
+
+    def completion_tokens(payload: Dict[str, Any]) -> List[str]:
+        count = min(config.tokens, payload.get("max_tokens") or config.tokens)
+        return [WORDS[i % len(WORDS)] + " " for i in range(count)]
+
+    async def generate(ttft: float, tokens: List[str]) -> AsyncIterator[str]:
+        await asyncio.sleep(ttft)
+        for index, token in enumerate(tokens):
+            if index:
+                await asyncio.sleep(config.token_ms / 1000)
+            yield token
+
+    def error(status_code: int) -> JSONResponse:
+        return JSONResponse(
+            {"error": {"type": "overloaded_error", "message": "Fake provider failure"}}, status_code=status_code
+        )
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request) -> Response:
+        payload = await request.json()
+        ttft = plan()
+        if ttft is None:
+            return error(config.fail_status)
+        tokens = completion_tokens(payload)
+        usage = {"prompt_tokens": prompt_tokens(payload), "completion_tokens": len(tokens)}
+
+        if not payload.get("stream"):
+            text = "".join([token async for token in generate(ttft, tokens)])
+            return JSONResponse({
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+        async def events() -> AsyncIterator[str]:
+            async for token in generate(ttft, tokens):
+                yield f"data: {json.dumps({'choices': [{'index': 0, 'delta': {'content': token}}]})}\n\n"
+            if (payload.get("stream_options") or {}).get("include_usage"):
+                yield f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/v1/messages")
+    async def messages(request: Request) -> Response:
+        payload = await request.json()
+        ttft = plan()
+        if ttft is None:
+            return error(config.fail_status)
+        tokens = completion_tokens(payload)
+
+        if not payload.get("stream"):
+            text = "".join([token async for token in generate(ttft, tokens)])
+            return JSONResponse({
+                "type": "message",
+                "content": [{"type": "text", "text": text}],
+                "usage": {"input_tokens": prompt_tokens(payload), "output_tokens": len(tokens)},
+            })
+
+        def event(name: str, data: Dict[str, Any]) -> str:
+            return f"event: {name}\ndata: {json.dumps({'type': name, **data})}\n\n"
+
+        async def events() -> AsyncIterator[str]:
+            yield event("message_start", {"message": {"usage": {"input_tokens": prompt_tokens(payload)}}})
+            async for token in generate(ttft, tokens):
+                yield event("content_block_delta", {"index": 0, "delta": {"type": "text_delta", "text": token}})
+            yield event("message_delta", {"usage": {"output_tokens": len(tokens)}})
+            yield event("message_stop", {})
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake OpenAI/Anthropic streaming server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--ttft-ms", type=float, default=200)
+    parser.add_argument("--token-ms", type=float, default=15)
+    parser.add_argument("--tokens", type=int, default=40)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--fail-status", type=int, default=503)
+    parser.add_argument("--stall-rate", type=float, default=0.0)
+    parser.add_argument("--stall-ms", type=float, default=5000)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    config = FakeProviderConfig(
+        ttft_ms=args.ttft_ms,
+        token_ms=args.token_ms,
+        tokens=args.tokens,
+        fail_rate=args.fail_rate,
+        fail_status=args.fail_status,
+        stall_rate=args.stall_rate,
+        stall_ms=args.stall_ms,
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
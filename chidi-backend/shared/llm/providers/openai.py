@@ -0,0 +1,52 @@
+"""
+OpenAI chat completions (streaming)
+"""
+from typing import Any, Dict, Optional
+
+from .base import HTTPProvider, Messages, StreamChunk
+
+
+class OpenAIProvider(HTTPProvider):
+    """``POST /chat/completions`` with ``stream: true``; usage arrives on the last event"""
+
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "gpt-4o",
+        base_url: str = "https://api.openai.com/v1",
+        name: str = "openai",
+        **kwargs: Any,
+    ):
+        super().__init__(
+            name=name,
+            base_url=base_url,
+            model=model,
+            headers={"Authorization": f"Bearer {api_key}"},
+            **kwargs,
+        )
+
+    def _request(self, messages: Messages, max_tokens: int, temperature: float) -> Dict[str, Any]:
+        return {
+            "url": "/chat/completions",
+            "json": {
+                "model": self.model,
+                "messages": list(messages),
+                "max_tokens": max_tokens,
+                "temperature": temperature,
+                "stream": True,
+                "stream_options": {"include_usage": True},
+            },
+        }
+
+    def _parse_event(self, event: Dict[str, Any]) -> Optional[StreamChunk]:
+        chunk = StreamChunk()
+        choices = event.get("choices") or []
+        if choices:
+            chunk.text = (choices[0].get("delta") or {}).get("content") or ""
+        usage = event.get("usage")
+        if usage:
+            chunk.prompt_tokens = usage.get("prompt_tokens")
+            chunk.completion_tokens = usage.get("completion_tokens")
+        if not chunk.text and chunk.prompt_tokens is None:
+            return None
+        return chunk
@@ -0,0 +1,266 @@
+"""
+Fallback and hedging across LLM providers.
+
+``ProviderRouter.stream`` tries providers in order. A provider whose circuit
+is open, whose concurrency cap is saturated or that fails before its first
+token is skipped for the next one. With ``hedge_after`` set, the next
+provider is also started when the first token is late; whichever produces
+text first wins and the others are cancelled, so a stalled provider costs
+``hedge_after`` seconds instead of a full read timeout. Once tokens have
+been yielded the stream is committed to its provider and a failure is
+raised to the caller.
+
+Metrics:
+    llm_time_to_first_token_seconds{provider}
+    llm_provider_attempts_total{provider,result}  won, failed, unavailable or lost (hedge)
+    llm_hedges_total
+    llm_<provider>_in_flight, llm_<provider>_circuit_open
+
+Configuration (environment variables):
+    LLM_PROVIDERS          provider order (default ``openai,anthropic``); those without a key are skipped
+    OPENAI_API_KEY, OPENAI_BASE_URL, LLM_OPENAI_MODEL (default gpt-4o)
+    ANTHROPIC_API_KEY, ANTHROPIC_BASE_URL, LLM_ANTHROPIC_MODEL (default claude-3-5-sonnet-latest)
+    LLM_HEDGE_AFTER_MS     start the next provider when the first token is this late (default 0, off)
+    LLM_MAX_CONCURRENCY    requests in flight per provider (default 32)
+    LLM_QUEUE_TIMEOUT      seconds to wait for a free slot before failing over (default 2)
+    LLM_CONNECT_TIMEOUT    default 3
+    LLM_READ_TIMEOUT       longest gap between streamed events (default 30)
+    LLM_BREAKER_FAILURES   consecutive failures that open a circuit (default 5)
+    LLM_BREAKER_RESET      seconds before an open circuit lets a probe through (default 30)
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Any, AsyncGenerator, Dict, List, Optional, Sequence
+
+from shared.observability.metrics import REGISTRY, MetricsRegistry
+
+from .anthropic import AnthropicProvider
+from .base import (
+    CircuitBreaker,
+    Completion,
+    HTTPProvider,
+    Messages,
+    ProviderError,
+    ProviderUnavailable,
+    StreamChunk,
+    collect,
+)
+from .openai import OpenAIProvider
+
+logger = logging.getLogger(__name__)
+
+LLM_PROVIDERS = [name.strip() for name in os.getenv("LLM_PROVIDERS", "openai,anthropic").split(",") if name.strip()]
+LLM_HEDGE_AFTER_MS = float(os.getenv("LLM_HEDGE_AFTER_MS", "0"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "2"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "3"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "30"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))
+
+TTFT_BUCKETS = (0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0, 30.0)
+
+
+class _Attempt:
+    """One provider's stream, read up to its first text chunk"""
+
+    def __init__(self, provider: HTTPProvider, chunks: AsyncGenerator[StreamChunk, None]):
+        self.provider = provider
+        self.chunks = chunks
+        self.buffered: List[StreamChunk] = []
+
+    async def first_text(self) -> bool:
+        """Buffer chunks until one carries text; False if the stream ended without any"""
+        async for chunk in self.chunks:
+            self.buffered.append(chunk)
+            if chunk.text:
+                return True
+        return False
+
+    async def aclose(self) -> None:
+        await self.chunks.aclose()
+
+
+class ProviderRouter:
+    """
+    Streams from the first healthy provider, failing over and hedging.
+
+    Args:
+        providers: In order of preference
+        hedge_after: Seconds without a first token before the next provider
+            is started as well; None disables hedging
+        registry: Metrics registry
+    """
+
+    def __init__(
+        self,
+        providers: Sequence[HTTPProvider],
+        hedge_after: Optional[float] = None,
+        registry: MetricsRegistry = REGISTRY,
+    ):
+        if not providers:
+            raise ValueError("At least one provider is required")
+        self.providers = list(providers)
+        self.hedge_after = hedge_after
+
+        self._ttft = registry.histogram(
+            "llm_time_to_first_token_seconds", "Time until the first streamed token, by provider",
+            ("provider",), buckets=TTFT_BUCKETS,
+        )
+        self._attempts = registry.counter(
+            "llm_provider_attempts_total", "LLM provider attempts by outcome", ("provider", "result")
+        )
+        self._hedges = registry.counter("llm_hedges_total", "Fallback providers started because a first token was late")
+        for provider in self.providers:
+            self._register_gauges(registry, provider)
+
+    @staticmethod
+    def _register_gauges(registry: MetricsRegistry, provider: HTTPProvider) -> None:
+        registry.register_callback(
+            f"llm_{provider.name}_in_flight", f"Requests in flight to {provider.name}",
+            lambda: provider.in_flight,
+        )
+        registry.register_callback(
+            f"llm_{provider.name}_circuit_open", f"1 while the {provider.name} circuit is open",
+            lambda: float(provider.breaker.state == CircuitBreaker.OPEN),
+        )
+
+    async def stream(
+        self,
+        messages: Messages,
+        max_tokens: int = 1024,
+        temperature: float = 0.7,
+    ) -> AsyncGenerator[StreamChunk, None]:
+        """
+        Stream a completion from the first provider to produce a token.
+        Raises ProviderError when every provider failed, or when a
+        non-retryable error (a bad request) makes failing over pointless.
+        """
+        started = time.perf_counter()
+        pending = list(self.providers)
+        attempts: Dict["asyncio.Task[bool]", _Attempt] = {}
+        errors: List[ProviderError] = []
+        winner: Optional[_Attempt] = None
+        last_launch = started
+
+        def launch() -> bool:
+            nonlocal last_launch
+            if not pending:
+                return False
+            provider = pending.pop(0)
+            attempt = _Attempt(provider, provider.stream(messages, max_tokens, temperature))
+            attempts[asyncio.ensure_future(attempt.first_text())] = attempt
+            last_launch = time.perf_counter()
+            return True
+
+        launch()
+        try:
+            while attempts and winner is None:
+                timeout: Optional[float] = None
+                if self.hedge_after is not None and pending:
+                    timeout = max(last_launch + self.hedge_after - time.perf_counter(), 0)
+                done, _ = await asyncio.wait(attempts, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    waited = time.perf_counter() - last_launch
+                    logger.info(f"No first token after {waited * 1000:.0f}ms, hedging with {pending[0].name}")
+                    self._hedges.inc()
+                    launch()
+                    continue
+                for task in done:
+                    attempt = attempts.pop(task)
+                    try:
+                        task.result()
+                    except ProviderError as e:
+                        errors.append(e)
+                        result = "unavailable" if isinstance(e, ProviderUnavailable) else "failed"
+                        self._attempts.inc(provider=attempt.provider.name, result=result)
+                        logger.warning(f"LLM provider {attempt.provider.name} {result}: {str(e)}")
+                        if not e.retryable:
+                            raise
+                        continue
+                    if winner is None:
+                        winner = attempt
+                    else:
+                        # Two providers answered in the same tick; keep the first
+                        attempts[task] = attempt
+                if winner is None and not attempts:
+                    launch()
+        finally:
+            for task, attempt in attempts.items():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                await attempt.aclose()
+                self._attempts.inc(provider=attempt.provider.name, result="lost")
+
+        if winner is None:
+            raise ProviderError("all", "; ".join(str(e) for e in errors) or "no provider available")
+
+        self._attempts.inc(provider=winner.provider.name, result="won")
+        self._ttft.observe(time.perf_counter() - started, provider=winner.provider.name)
+        try:
+            for chunk in winner.buffered:
+                yield chunk
+            async for chunk in winner.chunks:
+                yield chunk
+        finally:
+            await winner.aclose()
+
+    async def complete(self, messages: Messages, max_tokens: int = 1024, temperature: float = 0.7) -> Completion:
+        """Non-streaming convenience wrapper around ``stream``"""
+        return await collect(self.stream(messages, max_tokens, temperature))
+
+    async def aclose(self) -> None:
+        for provider in self.providers:
+            await provider.aclose()
+
+
+def _provider_from_env(name: str) -> Optional[HTTPProvider]:
+    options: Dict[str, Any] = dict(
+        max_concurrency=LLM_MAX_CONCURRENCY,
+        queue_timeout=LLM_QUEUE_TIMEOUT,
+        connect_timeout=LLM_CONNECT_TIMEOUT,
+        read_timeout=LLM_READ_TIMEOUT,
+        breaker=CircuitBreaker(name, LLM_BREAKER_FAILURES, LLM_BREAKER_RESET),
+    )
+    openai_key = os.getenv("OPENAI_API_KEY")
+    anthropic_key = os.getenv("ANTHROPIC_API_KEY")
+    if name == "openai" and openai_key:
+        return OpenAIProvider(
+            openai_key,
+            model=os.getenv("LLM_OPENAI_MODEL", "gpt-4o"),
+            base_url=os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1"),
+            **options,
+        )
+    if name == "anthropic" and anthropic_key:
+        return AnthropicProvider(
+            anthropic_key,
+            model=os.getenv("LLM_ANTHROPIC_MODEL", "claude-3-5-sonnet-latest"),
+            base_url=os.getenv("ANTHROPIC_BASE_URL", "https://api.anthropic.com/v1"),
+            **options,
+        )
+    return None
+
+
+_router: Optional[ProviderRouter] = None
+
+
+def get_llm_router() -> ProviderRouter:
+    """The configured provider router, created on first use"""
+    global _router
+    if _router is None:
+        providers = [provider for provider in map(_provider_from_env, LLM_PROVIDERS) if provider is not None]
+        if not providers:
+            raise RuntimeError("No LLM provider configured (set OPENAI_API_KEY or ANTHROPIC_API_KEY)")
+        _router = ProviderRouter(providers, hedge_after=LLM_HEDGE_AFTER_MS / 1000 if LLM_HEDGE_AFTER_MS > 0 else None)
+        logger.info(f"LLM providers: {', '.join(provider.name for provider in providers)}")
+    return _router
+
+
+async def close_llm_router() -> None:
+    """Close the pooled provider connections (application shutdown)"""
+    global _router
+    if _router is not None:
+        await _router.aclose()
+        _router = None
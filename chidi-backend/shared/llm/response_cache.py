@@ -0,0 +1,362 @@
+"""
+Response cache for LLM completions, scoped per user context.
+
+Both tiers are keyed on the owner's business-context version (a hash of
+``business_data``), so an answer is never served once the facts it was
+based on have changed:
+
+    exact     normalized prompt hash -> answer in the per-process LRU and
+              Redis (``TieredCache``): no embedding call, no database query
+    semantic  the most similar earlier prompt of the same user and version
+              in ``llm_response_cache`` (cosine similarity of prompt
+              embeddings), reused at or above ``LLM_CACHE_SIMILARITY_THRESHOLD``
+
+Only cache prompts that stand on their own (e.g. a customer question whose
+answer does not depend on the rest of the thread); the caller decides.
+
+Every method that takes a session commits it: a semantic hit records its
+hit count, a miss stores the fresh answer. Don't pass a session holding
+writes you may still roll back.
+
+Metrics:
+    llm_cache_lookups_total{tier,result}
+    llm_cache_semantic_similarity          best similarity of each semantic lookup
+    llm_cache_tokens_saved_total           prompt + completion tokens not sent
+    llm_cache_latency_saved_seconds_total  generation time avoided, net of lookup time
+    llm_cache_hit_ratio
+
+Configuration (environment variables):
+    LLM_CACHE_ENABLED               default true
+    LLM_CACHE_SIMILARITY_THRESHOLD  default 0.95
+    LLM_CACHE_TTL                   seconds an answer is reused (default 86400)
+    LLM_CACHE_MAX_ENTRIES           semantic entries kept per user (default 500)
+    LLM_CACHE_L1_SIZE               exact entries per process (default 4096)
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+import unicodedata
+from dataclasses import asdict, dataclass, replace
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, cast
+from uuid import UUID
+
+from sqlalchemy import CursorResult, delete, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shared.cache.lru import TTLCache
+from shared.cache.redis import get_redis
+from shared.cache.tiered import TieredCache
+from shared.database.models import ResponseCacheEntry, UserContext
+from shared.observability.metrics import REGISTRY, MetricsRegistry
+
+from .embeddings import Embedder, get_embedder
+from .providers.base import Completion
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("LLM_CACHE_SIMILARITY_THRESHOLD", "0.95"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "500"))
+LLM_CACHE_L1_SIZE = int(os.getenv("LLM_CACHE_L1_SIZE", "4096"))
+
+SIMILARITY_BUCKETS = (0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.92, 0.94, 0.96, 0.98, 0.99, 1.0)
+
+entries = ResponseCacheEntry.__table__
+user_contexts = UserContext.__table__
+
+
+@dataclass
+class CachedResponse:
+    """A reusable answer and what producing it originally cost"""
+    response: str
+    prompt_tokens: int
+    completion_tokens: int
+    generation_ms: int
+    tier: str = "exact"
+    similarity: float = 1.0
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Case, width, whitespace and trailing punctuation do not change the answer"""
+    text = " ".join(unicodedata.normalize("NFKC", prompt).lower().split())
+    return text.rstrip(" ?!.")
+
+
+def context_version(business_data: Optional[Dict[str, Any]]) -> str:
+    """Short, stable hash of business_data; answers are only reused within one version"""
+    payload = json.dumps(business_data or {}, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _prompt_hash(normalized: str) -> str:
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Args:
+        embedder: Embeds prompts for the semantic tier (defaults to the configured one)
+        threshold: Minimum cosine similarity for a semantic hit
+        ttl: Seconds an answer may be reused
+        max_entries: Semantic entries kept per user; least recently used go first
+    """
+
+    def __init__(
+        self,
+        embedder: Optional[Embedder] = None,
+        threshold: float = LLM_CACHE_SIMILARITY_THRESHOLD,
+        ttl: float = LLM_CACHE_TTL,
+        max_entries: int = LLM_CACHE_MAX_ENTRIES,
+        l1_maxsize: int = LLM_CACHE_L1_SIZE,
+        redis_factory: Callable[[], Any] = get_redis,
+        registry: MetricsRegistry = REGISTRY,
+    ):
+        self._embedder = embedder
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # Keys embed the context version, so entries are never invalidated, only expire
+        self._exact = TieredCache(
+            "llm_response",
+            dumps=lambda entry: json.dumps(asdict(entry)),
+            loads=lambda raw: CachedResponse(**json.loads(raw)),
+            l1_maxsize=l1_maxsize,
+            l1_ttl=min(ttl, 300),
+            l2_ttl=ttl,
+            redis_factory=redis_factory,
+            registry=registry,
+        )
+        # Prompt embeddings computed by a missed lookup, reused when the answer is stored
+        self._pending_embeddings: TTLCache[str, List[float]] = TTLCache(maxsize=1024, ttl=300)
+        self.lookups = 0
+        self.hits = 0
+
+        self._lookups = registry.counter(
+            "llm_cache_lookups_total", "LLM response cache lookups by tier and result", ("tier", "result")
+        )
+        self._similarity = registry.histogram(
+            "llm_cache_semantic_similarity",
+            "Best cosine similarity found by semantic cache lookups",
+            buckets=SIMILARITY_BUCKETS,
+        )
+        self._tokens_saved = registry.counter(
+            "llm_cache_tokens_saved_total", "Prompt and completion tokens served from the LLM response cache"
+        )
+        self._latency_saved = registry.counter(
+            "llm_cache_latency_saved_seconds_total", "Generation time avoided by LLM response cache hits"
+        )
+        registry.register_callback(
+            "llm_cache_hit_ratio", "Share of LLM response cache lookups served from either tier",
+            lambda: self.hits / max(self.lookups, 1),
+        )
+
+    @property
+    def embedder(self) -> Embedder:
+        return self._embedder or get_embedder()
+
+    def _record_hit(self, entry: CachedResponse, started: float) -> None:
+        self.hits += 1
+        self._tokens_saved.inc(entry.prompt_tokens + entry.completion_tokens)
+        self._latency_saved.inc(max(entry.generation_ms / 1000 - (time.perf_counter() - started), 0))
+
+    async def lookup(
+        self,
+        db: AsyncSession,
+        user_context_id: UUID,
+        business_data: Optional[Dict[str, Any]],
+        prompt: str,
+    ) -> Optional[CachedResponse]:
+        """
+        A cached answer for ``prompt`` under the current business_data, or
+        None. A semantic hit bumps the entry's hit count and commits ``db``.
+        """
+        started = time.perf_counter()
+        self.lookups += 1
+        normalized = normalize_prompt(prompt)
+        version = context_version(business_data)
+        key = f"{user_context_id}:{version}:{_prompt_hash(normalized)}"
+
+        entry: Optional[CachedResponse] = await self._exact.get(key)
+        if entry is not None:
+            self._lookups.inc(tier="exact", result="hit")
+            self._record_hit(entry, started)
+            return replace(entry, tier="exact", similarity=1.0)
+        self._lookups.inc(tier="exact", result="miss")
+
+        embedding = (await self.embedder.embed([normalized]))[0]
+        # The user's current entries are few, so they are ranked exactly
+        candidates = (
+            select(
+                entries.c.id,
+                entries.c.response,
+                entries.c.prompt_tokens,
+                entries.c.completion_tokens,
+                entries.c.generation_ms,
+                (1 - entries.c.embedding.cosine_distance(embedding)).label("similarity"),
+            )
+            .where(
+                entries.c.user_context_id == user_context_id,
+                entries.c.context_version == version,
+                entries.c.embedding_model == self.embedder.name,
+                entries.c.created_at > func.now() - timedelta(seconds=self.ttl),
+            )
+            .cte("candidates")
+            .prefix_with("MATERIALIZED")
+        )
+        best = (
+            await db.execute(select(candidates).order_by(candidates.c.similarity.desc()).limit(1))
+        ).first()
+        if best is not None:
+            self._similarity.observe(best.similarity)
+
+        if best is None or best.similarity < self.threshold:
+            self._lookups.inc(tier="semantic", result="miss")
+            self._pending_embeddings.set(key, embedding)
+            return None
+
+        self._lookups.inc(tier="semantic", result="hit")
+        entry = CachedResponse(
+            response=best.response,
+            prompt_tokens=best.prompt_tokens,
+            completion_tokens=best.completion_tokens,
+            generation_ms=best.generation_ms,
+        )
+        await db.execute(
+            update(entries)
+            .where(entries.c.id == best.id)
+            .values(hits=entries.c.hits + 1, last_hit_at=func.now())
+        )
+        # Commits the caller's session too (see the docstring)
+        await db.commit()
+        # The next identical prompt skips the embedding call
+        await self._exact.set(key, entry)
+        self._record_hit(entry, started)
+        return replace(entry, tier="semantic", similarity=best.similarity)
+
+    async def store(
+        self,
+        db: AsyncSession,
+        user_context_id: UUID,
+        business_data: Optional[Dict[str, Any]],
+        prompt: str,
+        completion: Completion,
+        generation_ms: int,
+    ) -> None:
+        """Cache a fresh answer in both tiers and commit ``db``"""
+        normalized = normalize_prompt(prompt)
+        version = context_version(business_data)
+        prompt_hash = _prompt_hash(normalized)
+        key = f"{user_context_id}:{version}:{prompt_hash}"
+        embedding = self._pending_embeddings.pop(key)
+        if embedding is None:
+            embedding = (await self.embedder.embed([normalized]))[0]
+
+        statement = pg_insert(entries).values(
+            user_context_id=user_context_id,
+            context_version=version,
+            prompt_hash=prompt_hash,
+            prompt=prompt,
+            response=completion.response,
+            embedding=embedding,
+            embedding_model=self.embedder.name,
+            prompt_tokens=completion.prompt_tokens,
+            completion_tokens=completion.completion_tokens,
+            generation_ms=generation_ms,
+        )
+        await db.execute(
+            statement.on_conflict_do_update(
+                constraint="uq_llm_response_cache_context_prompt",
+                set_={
+                    "prompt": statement.excluded.prompt,
+                    "response": statement.excluded.response,
+                    "embedding": statement.excluded.embedding,
+                    "embedding_model": statement.excluded.embedding_model,
+                    "prompt_tokens": statement.excluded.prompt_tokens,
+                    "completion_tokens": statement.excluded.completion_tokens,
+                    "generation_ms": statement.excluded.generation_ms,
+                    "hits": 0,
+                    "created_at": func.now(),
+                    "last_hit_at": None,
+                },
+            )
+        )
+        # Keep the user's most recently used entries
+        overflow = (
+            select(entries.c.id)
+            .where(entries.c.user_context_id == user_context_id)
+            .order_by(func.coalesce(entries.c.last_hit_at, entries.c.created_at).desc())
+            .offset(self.max_entries)
+        )
+        await db.execute(delete(entries).where(entries.c.id.in_(overflow)))
+        await db.commit()
+
+        await self._exact.set(key, CachedResponse(
+            response=completion.response,
+            prompt_tokens=completion.prompt_tokens,
+            completion_tokens=completion.completion_tokens,
+            generation_ms=generation_ms,
+        ))
+
+    async def get_or_generate(
+        self,
+        db: AsyncSession,
+        user_context_id: UUID,
+        business_data: Optional[Dict[str, Any]],
+        prompt: str,
+        generate: Callable[[], Awaitable[Completion]],
+    ) -> Tuple[Completion, Optional[CachedResponse]]:
+        """
+        Serve ``prompt`` from the cache, or call ``generate`` and cache the
+        answer. Returns the completion and the cache hit (None on a miss).
+        Commits ``db`` on a semantic hit and after storing an answer.
+        """
+        if not LLM_CACHE_ENABLED:
+            return await generate(), None
+
+        cached = await self.lookup(db, user_context_id, business_data, prompt)
+        if cached is not None:
+            return Completion(cached.response, cached.prompt_tokens, cached.completion_tokens), cached
+
+        started = time.perf_counter()
+        completion = await generate()
+        generation_ms = int((time.perf_counter() - started) * 1000)
+        try:
+            await self.store(db, user_context_id, business_data, prompt, completion, generation_ms)
+        except Exception as e:
+            # The answer is still good; only caching it failed
+            logger.warning(f"Could not cache LLM response for {user_context_id}: {str(e)}")
+            await db.rollback()
+        return completion, None
+
+    async def purge_stale(self, db: AsyncSession, user_context_id: UUID) -> int:
+        """Delete entries made under older business_data or past the TTL; commits ``db``"""
+        business_data = await db.scalar(
+            select(user_contexts.c.business_data).where(user_contexts.c.id == user_context_id)
+        )
+        result = cast(CursorResult[Any], await db.execute(
+            delete(entries).where(
+                entries.c.user_context_id == user_context_id,
+                or_(
+                    entries.c.context_version != context_version(business_data),
+                    entries.c.created_at <= func.now() - timedelta(seconds=self.ttl),
+                ),
+            )
+        ))
+        await db.commit()
+        return result.rowcount
+
+
+_response_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> ResponseCache:
+    """The process-wide response cache, created on first use"""
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = ResponseCache()
+    return _response_cache
@@ -0,0 +1,256 @@
+"""
+Business-context retrieval backed by ``business_embeddings`` (pgvector).
+
+``sync_business_embeddings`` splits a user's ``business_data`` into chunks
+(one per top-level key, split further when long), embeds only the chunks
+whose content hash or embedder changed, ``EMBEDDING_BATCH_SIZE`` texts per
+embedder call, upserts them and deletes chunks that no longer exist.
+
+``search_business_embeddings`` returns the top-k chunks for a query by
+cosine distance. A user's chunks are usually few, so they are ranked
+exactly; past ``EMBEDDING_EXACT_SEARCH_MAX_ROWS`` the HNSW index is used
+with a larger ``hnsw.ef_search``, since an approximate scan filtered to
+one user can otherwise return fewer than k rows.
+
+Configuration (environment variables):
+    EMBEDDING_BATCH_SIZE             texts per embedder call (default 64)
+    EMBEDDING_CHUNK_CHARS            max characters per chunk (default 1500)
+    EMBEDDING_EXACT_SEARCH_MAX_ROWS  rank exactly up to this many chunks (default 5000)
+    EMBEDDING_EF_SEARCH              hnsw.ef_search for indexed searches (default 200)
+"""
+import hashlib
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, cast
+from uuid import UUID
+
+from sqlalchemy import CursorResult, delete, func, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shared.database.models import BusinessEmbedding, UserContext
+
+from .embeddings import Embedder, get_embedder
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_CHUNK_CHARS = int(os.getenv("EMBEDDING_CHUNK_CHARS", "1500"))
+EMBEDDING_EXACT_SEARCH_MAX_ROWS = int(os.getenv("EMBEDDING_EXACT_SEARCH_MAX_ROWS", "5000"))
+EMBEDDING_EF_SEARCH = int(os.getenv("EMBEDDING_EF_SEARCH", "200"))
+
+business_embeddings = BusinessEmbedding.__table__
+user_contexts = UserContext.__table__
+
+# Serializes syncs of one user so an older business_data never overwrites a newer one
+_SYNC_LOCK_SQL = text("SELECT pg_advisory_xact_lock(hashtext('business_embeddings:' || :user_context_id))")
+_SET_EF_SEARCH_SQL = text("SELECT set_config('hnsw.ef_search', :ef_search, true)")
+
+
+@dataclass
+class BusinessChunk:
+    """A piece of business_data to embed; ``key`` is stable across syncs"""
+    key: str
+    content: str
+
+    @property
+    def content_hash(self) -> str:
+        return hashlib.sha256(self.content.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class EmbeddingSyncReport:
+    """What one sync did"""
+    chunks: int = 0
+    embedded: int = 0
+    unchanged: int = 0
+    deleted: int = 0
+    batches: int = 0
+    embedded_keys: List[str] = field(default_factory=list)
+
+
+def _flatten(value: Any, path: str) -> Iterator[str]:
+    """``path: value`` lines for every leaf of a JSON value"""
+    if isinstance(value, dict):
+        for key in sorted(value):
+            yield from _flatten(value[key], f"{path}.{key}")
+    elif isinstance(value, list) and any(isinstance(item, (dict, list)) for item in value):
+        for index, item in enumerate(value):
+            yield from _flatten(item, f"{path}[{index}]")
+    elif isinstance(value, list):
+        yield f"{path}: {', '.join(str(item) for item in value)}"
+    elif isinstance(value, str):
+        yield f"{path}: {value}"
+    else:
+        yield f"{path}: {json.dumps(value)}"
+
+
+def chunk_business_data(
+    business_data: Optional[Dict[str, Any]],
+    max_chars: int = EMBEDDING_CHUNK_CHARS,
+) -> List[BusinessChunk]:
+    """
+    One chunk per top-level key of ``business_data``. A key whose lines
+    exceed ``max_chars`` is split at line boundaries into ``key``,
+    ``key#1``, ``key#2``, ...
+    """
+    business_data = business_data or {}
+    chunks: List[BusinessChunk] = []
+    for key in sorted(business_data):
+        pieces: List[str] = []
+        current = ""
+        for line in _flatten(business_data[key], key):
+            while len(line) > max_chars:
+                pieces.append(line[:max_chars])
+                line = line[max_chars:]
+            if current and len(current) + 1 + len(line) > max_chars:
+                pieces.append(current)
+                current = ""
+            current = f"{current}\n{line}" if current else line
+        if current:
+            pieces.append(current)
+        for index, piece in enumerate(pieces):
+            chunks.append(BusinessChunk(key if index == 0 else f"{key}#{index}", piece))
+    return chunks
+
+
+async def sync_business_embeddings(
+    db: AsyncSession,
+    user_context_id: UUID,
+    embedder: Optional[Embedder] = None,
+    batch_size: int = EMBEDDING_BATCH_SIZE,
+) -> EmbeddingSyncReport:
+    """
+    Bring a user's embeddings in line with their current business_data and
+    commit.
+
+    Args:
+        db: Session (RLS-scoped for user requests)
+        user_context_id: Owner of the business_data
+        embedder: Defaults to the configured embedder
+        batch_size: Texts per embedder call
+
+    Returns:
+        EmbeddingSyncReport with embedded/unchanged/deleted counts
+    """
+    embedder = embedder or get_embedder()
+    batch_size = max(batch_size, 1)
+    report = EmbeddingSyncReport()
+
+    await db.execute(_SYNC_LOCK_SQL, {"user_context_id": str(user_context_id)})
+    business_data = await db.scalar(
+        select(user_contexts.c.business_data).where(user_contexts.c.id == user_context_id)
+    )
+    chunks = chunk_business_data(business_data)
+    report.chunks = len(chunks)
+
+    existing = {
+        row.chunk_key: (row.content_hash, row.model)
+        for row in await db.execute(
+            select(business_embeddings.c.chunk_key, business_embeddings.c.content_hash, business_embeddings.c.model)
+            .where(business_embeddings.c.user_context_id == user_context_id)
+        )
+    }
+    changed = [chunk for chunk in chunks if existing.get(chunk.key) != (chunk.content_hash, embedder.name)]
+    report.unchanged = len(chunks) - len(changed)
+
+    for start in range(0, len(changed), batch_size):
+        batch = changed[start:start + batch_size]
+        vectors = await embedder.embed([chunk.content for chunk in batch])
+        statement = pg_insert(business_embeddings).values([
+            {
+                "user_context_id": user_context_id,
+                "chunk_key": chunk.key,
+                "content": chunk.content,
+                "content_hash": chunk.content_hash,
+                "model": embedder.name,
+                "embedding": vector,
+            }
+            for chunk, vector in zip(batch, vectors)
+        ])
+        await db.execute(
+            statement.on_conflict_do_update(
+                constraint="uq_business_embeddings_user_context_chunk",
+                set_={
+                    "content": statement.excluded.content,
+                    "content_hash": statement.excluded.content_hash,
+                    "model": statement.excluded.model,
+                    "embedding": statement.excluded.embedding,
+                    "updated_at": func.now(),
+                },
+            )
+        )
+        report.embedded += len(batch)
+        report.batches += 1
+        report.embedded_keys.extend(chunk.key for chunk in batch)
+
+    stale = set(existing) - {chunk.key for chunk in chunks}
+    if stale:
+        result = cast(CursorResult[Any], await db.execute(
+            delete(business_embeddings).where(
+                business_embeddings.c.user_context_id == user_context_id,
+                business_embeddings.c.chunk_key.in_(sorted(stale)),
+            )
+        ))
+        report.deleted = result.rowcount
+
+    await db.commit()
+    logger.info(
+        f"Business embeddings synced for {user_context_id}: {report.embedded} embedded, "
+        f"{report.unchanged} unchanged, {report.deleted} deleted in {report.batches} batches"
+    )
+    return report
+
+
+async def search_business_embeddings(
+    db: AsyncSession,
+    user_context_id: UUID,
+    query: str,
+    k: int = 5,
+    embedder: Optional[Embedder] = None,
+) -> List[Dict[str, Any]]:
+    """
+    The ``k`` chunks closest to ``query``, best first, as dicts with
+    ``chunk_key``, ``content`` and ``score`` (cosine similarity).
+    """
+    embedder = embedder or get_embedder()
+    vector = (await embedder.embed([query]))[0]
+
+    # Bounded count: only needs to know whether the user is past the threshold
+    rows = await db.scalar(
+        select(func.count()).select_from(
+            select(business_embeddings.c.id)
+            .where(business_embeddings.c.user_context_id == user_context_id)
+            .limit(EMBEDDING_EXACT_SEARCH_MAX_ROWS + 1)
+            .subquery()
+        )
+    )
+    if (rows or 0) <= EMBEDDING_EXACT_SEARCH_MAX_ROWS:
+        # Materializing the user's rows keeps the planner off the HNSW index
+        candidates = (
+            select(
+                business_embeddings.c.chunk_key,
+                business_embeddings.c.content,
+                business_embeddings.c.embedding.cosine_distance(vector).label("distance"),
+            )
+            .where(business_embeddings.c.user_context_id == user_context_id)
+            .cte("candidates")
+            .prefix_with("MATERIALIZED")
+        )
+        query_stmt = select(candidates).order_by(candidates.c.distance).limit(k)
+    else:
+        await db.execute(_SET_EF_SEARCH_SQL, {"ef_search": str(max(EMBEDDING_EF_SEARCH, k))})
+        distance = business_embeddings.c.embedding.cosine_distance(vector)
+        query_stmt = (
+            select(business_embeddings.c.chunk_key, business_embeddings.c.content, distance.label("distance"))
+            .where(business_embeddings.c.user_context_id == user_context_id)
+            .order_by(distance)
+            .limit(k)
+        )
+
+    return [
+        {"chunk_key": row.chunk_key, "content": row.content, "score": 1 - row.distance}
+        for row in await db.execute(query_stmt)
+    ]
@@ -0,0 +1,110 @@
+"""
+Token counting for LLM prompts.
+
+Counters are swappable: ``LocalTokenCounter`` is a deterministic,
+dependency-free approximation of a BPE tokenizer (about four characters per
+token), and ``TiktokenCounter`` uses the real encoding when ``tiktoken`` is
+installed.
+
+Configuration (environment variables):
+    LLM_TOKEN_COUNTER    ``local`` (default) or ``tiktoken``
+    LLM_TOKEN_ENCODING   tiktoken encoding name (default o200k_base)
+
+Token counts stored on messages come from whichever counter was configured
+when the message was written; switch counters together with a backfill (or
+by resetting ``messages.token_count`` to NULL).
+"""
+import logging
+import math
+import os
+import re
+from typing import Optional, Protocol
+
+try:
+    import tiktoken  # type: ignore[import-not-found]
+except ImportError:  # optional: the local counter needs nothing
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+LLM_TOKEN_COUNTER = os.getenv("LLM_TOKEN_COUNTER", "local")
+LLM_TOKEN_ENCODING = os.getenv("LLM_TOKEN_ENCODING", "o200k_base")
+
+# Role and delimiter tokens chat formats add around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class TokenCounter(Protocol):
+    """Anything that can count the tokens in a string"""
+    name: str
+
+    def count(self, text: str) -> int:
+        ...
+
+
+class LocalTokenCounter:
+    """
+    Deterministic approximation: every run of word characters costs one
+    token per ``chars_per_token`` characters, every other non-space
+    character one token.
+    """
+
+    name = "local"
+    # Group 1 is a word; the symbol alternative yields an empty match for it
+    _PIECES = re.compile(r"(\w+)|[^\w\s]")
+
+    def __init__(self, chars_per_token: int = 4):
+        self.chars_per_token = chars_per_token
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        return sum(
+            math.ceil(len(word) / self.chars_per_token) if word else 1
+            for word in self._PIECES.findall(text)
+        )
+
+
+class TiktokenCounter:
+    """Exact counts for OpenAI-style BPE encodings (requires ``tiktoken``)"""
+
+    def __init__(self, encoding: str = LLM_TOKEN_ENCODING):
+        if tiktoken is None:
+            raise RuntimeError("tiktoken is not installed")
+        self._encoding = tiktoken.get_encoding(encoding)
+        self.name = f"tiktoken:{encoding}"
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(content: str, counter: TokenCounter) -> int:
+    """Tokens one chat message adds to a prompt, framing included"""
+    return counter.count(content) + MESSAGE_OVERHEAD_TOKENS
+
+
+_token_counter: Optional[TokenCounter] = None
+
+
+def get_token_counter() -> TokenCounter:
+    """The configured counter, created on first use"""
+    global _token_counter
+    if _token_counter is None:
+        if LLM_TOKEN_COUNTER == "tiktoken":
+            try:
+                _token_counter = TiktokenCounter()
+            except Exception as e:
+                logger.warning(f"Falling back to the local token counter: {str(e)}")
+                _token_counter = LocalTokenCounter()
+        else:
+            _token_counter = LocalTokenCounter()
+        logger.info(f"Token counter: {_token_counter.name}")
+    return _token_counter
+
+
+def set_token_counter(counter: Optional[TokenCounter]) -> None:
+    """Swap the process-wide counter (None restores the configured one)"""
+    global _token_counter
+    _token_counter = counter
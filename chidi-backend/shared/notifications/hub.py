@@ -0,0 +1,308 @@
+"""
+Per-user notifications fanned out to SSE connections.
+
+``publish`` appends an event to the user's short replay stream
+(``notify:stream:<user_id>``, the last ``NOTIFY_REPLAY_MAXLEN`` events for
+``NOTIFY_REPLAY_TTL`` seconds) and publishes it on ``notify:user:<user_id>``.
+The stream entry id doubles as the SSE event id.
+
+Each process runs one ``NotificationHub`` holding a single pattern
+subscription (``notify:user:*``) however many browsers are connected. It
+hands each event to that user's local connections through bounded
+queues:
+
+- An event with a ``coalesce_key`` replaces a queued, unsent event with the
+  same key (e.g. an unread count), so a slow client only gets the latest.
+- A connection whose queue is still full is closed. The client reconnects
+  with ``Last-Event-ID`` and catches up from the replay stream, so a slow
+  consumer never holds up delivery to others.
+
+Metrics:
+    notify_connections, notify_users_connected, notify_queued_events, notify_max_queue_depth
+    notify_events_total{result}  delivered, coalesced or dropped
+    notify_replayed_events_total, notify_slow_consumers_closed_total
+
+Configuration (environment variables):
+    NOTIFY_QUEUE_SIZE      events buffered per connection (default 256)
+    NOTIFY_REPLAY_MAXLEN   events kept per user for replay (default 200)
+    NOTIFY_REPLAY_TTL      seconds the replay stream outlives the last event (default 3600)
+"""
+import asyncio
+import json
+import logging
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from shared.cache.redis import get_redis, pubsub_messages
+from shared.observability.metrics import REGISTRY, MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_QUEUE_SIZE = int(os.getenv("NOTIFY_QUEUE_SIZE", "256"))
+NOTIFY_REPLAY_MAXLEN = int(os.getenv("NOTIFY_REPLAY_MAXLEN", "200"))
+NOTIFY_REPLAY_TTL = int(os.getenv("NOTIFY_REPLAY_TTL", "3600"))
+
+CHANNEL_PREFIX = "notify:user:"
+STREAM_PREFIX = "notify:stream:"
+
+
+def _str(value: Any) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else str(value)
+
+
+@dataclass
+class Notification:
+    """One event for one user; ``id`` is its replay stream id"""
+    id: str
+    type: str
+    data: Any
+    coalesce_key: Optional[str] = None
+
+    def to_sse(self) -> str:
+        return f"id: {self.id}\nevent: {self.type}\ndata: {json.dumps(self.data, separators=(',', ':'))}\n\n"
+
+
+async def publish(
+    user_id: str,
+    event_type: str,
+    data: Any,
+    coalesce_key: Optional[str] = None,
+    redis_factory: Callable[[], Any] = get_redis,
+) -> Optional[str]:
+    """
+    Send an event to every connection of ``user_id``, in any process.
+
+    Returns:
+        The event id, or None when Redis is not configured
+    """
+    redis = redis_factory()
+    if redis is None:
+        return None
+    fields = {"type": event_type, "data": json.dumps(data, separators=(",", ":"))}
+    if coalesce_key:
+        fields["coalesce_key"] = coalesce_key
+    stream = f"{STREAM_PREFIX}{user_id}"
+    event_id = _str(await redis.xadd(stream, fields, maxlen=NOTIFY_REPLAY_MAXLEN, approximate=True))
+    pipe = redis.pipeline(transaction=False)
+    pipe.expire(stream, NOTIFY_REPLAY_TTL)
+    pipe.publish(f"{CHANNEL_PREFIX}{user_id}", json.dumps({"id": event_id, **fields}))
+    await pipe.execute()
+    return event_id
+
+
+class Subscription:
+    """One SSE connection's bounded queue; ``closed`` is set when it overflowed"""
+
+    def __init__(self, user_id: str, maxsize: int):
+        self.user_id = user_id
+        self.maxsize = maxsize
+        # Event id -> event, in arrival order
+        self._events: "OrderedDict[str, Notification]" = OrderedDict()
+        self._by_coalesce_key: Dict[str, str] = {}
+        self._ready = asyncio.Event()
+        self.closed = False
+        # Live events held back while replayed ones are queued, so order is kept
+        self._held: Optional[List[Notification]] = None
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def offer(self, event: Notification) -> str:
+        """Queue an event: ``delivered``, ``coalesced``, ``held``, ``overflow`` (now closed) or ``closed``"""
+        if self.closed:
+            return "closed"
+        if self._held is not None:
+            self._held.append(event)
+            return "held"
+        result = "delivered"
+        if event.coalesce_key and event.coalesce_key in self._by_coalesce_key:
+            del self._events[self._by_coalesce_key[event.coalesce_key]]
+            result = "coalesced"
+        elif len(self._events) >= self.maxsize:
+            self.close()
+            return "overflow"
+        self._events[event.id] = event
+        if event.coalesce_key:
+            self._by_coalesce_key[event.coalesce_key] = event.id
+        self._ready.set()
+        return result
+
+    def close(self) -> None:
+        self.closed = True
+        self._ready.set()
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Notification]:
+        """Next event, or None on timeout or once closed and drained"""
+        if not self._events and not self.closed:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        if not self._events:
+            return None
+        _, event = self._events.popitem(last=False)
+        if event.coalesce_key and self._by_coalesce_key.get(event.coalesce_key) == event.id:
+            del self._by_coalesce_key[event.coalesce_key]
+        return event
+
+
+class NotificationHub:
+    """
+    Args:
+        queue_size: Events buffered per connection before it is closed
+        redis_factory: Returns the Redis client, or None when Redis is not configured
+        registry: Metrics registry
+    """
+
+    def __init__(
+        self,
+        queue_size: int = NOTIFY_QUEUE_SIZE,
+        redis_factory: Callable[[], Any] = get_redis,
+        registry: MetricsRegistry = REGISTRY,
+    ):
+        self.queue_size = queue_size
+        self._redis_factory = redis_factory
+        self._subscriptions: Dict[str, Set[Subscription]] = {}
+        self._listener: Optional[asyncio.Task] = None
+        self._listening = asyncio.Event()
+
+        self._events = registry.counter("notify_events_total", "Notifications handed to connections", ("result",))
+        self._replayed = registry.counter("notify_replayed_events_total", "Notifications replayed after Last-Event-ID")
+        self._slow_closed = registry.counter(
+            "notify_slow_consumers_closed_total", "SSE connections closed because their queue was full"
+        )
+        registry.register_callback("notify_connections", "Open SSE notification connections", self.connection_count)
+        registry.register_callback(
+            "notify_users_connected", "Users with an open SSE connection", lambda: len(self._subscriptions)
+        )
+        registry.register_callback(
+            "notify_queued_events", "Events waiting in SSE connection queues",
+            lambda: sum(len(sub) for subs in self._subscriptions.values() for sub in subs),
+        )
+        registry.register_callback(
+            "notify_max_queue_depth", "Deepest SSE connection queue",
+            lambda: max((len(sub) for subs in self._subscriptions.values() for sub in subs), default=0),
+        )
+
+    @property
+    def available(self) -> bool:
+        return self._redis_factory() is not None
+
+    def connection_count(self) -> int:
+        return sum(len(subs) for subs in self._subscriptions.values())
+
+    def _offer(self, subscription: Subscription, event: Notification) -> None:
+        result = subscription.offer(event)
+        if result in ("delivered", "coalesced"):
+            self._events.inc(result=result)
+        elif result in ("overflow", "closed"):
+            self._events.inc(result="dropped")
+        if result == "overflow":
+            self._slow_closed.inc()
+            logger.warning(
+                f"Closing slow SSE connection for user {subscription.user_id} ({subscription.maxsize} events queued)"
+            )
+
+    def _dispatch(self, user_id: str, event: Notification) -> None:
+        for subscription in list(self._subscriptions.get(user_id, ())):
+            self._offer(subscription, event)
+
+    async def _listen(self) -> None:
+        while True:
+            redis = self._redis_factory()
+            pubsub = redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+                self._listening.set()
+                async for message in pubsub_messages(pubsub):
+                    user_id = _str(message["channel"])[len(CHANNEL_PREFIX):]
+                    if user_id not in self._subscriptions:
+                        continue
+                    fields = json.loads(message["data"])
+                    self._dispatch(user_id, Notification(
+                        fields["id"], fields["type"], json.loads(fields["data"]), fields.get("coalesce_key"),
+                    ))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Events published meanwhile are recovered by clients through Last-Event-ID
+                logger.warning(f"Notification subscriber failed: {str(e)}")
+                self._listening.clear()
+                await asyncio.sleep(1.0)
+            finally:
+                await pubsub.aclose()
+
+    async def _replay(self, subscription: Subscription, last_event_id: str) -> None:
+        redis = self._redis_factory()
+        subscription._held = []
+        replayed: Set[str] = set()
+        try:
+            entries = await redis.xrange(
+                f"{STREAM_PREFIX}{subscription.user_id}", min=f"({last_event_id}", count=NOTIFY_REPLAY_MAXLEN
+            )
+        except Exception as e:
+            # Malformed Last-Event-ID or Redis error: continue with live events only
+            logger.warning(f"Notification replay failed for user {subscription.user_id}: {str(e)}")
+            entries = []
+        held, subscription._held = subscription._held, None
+        for entry_id, fields in entries:
+            fields = {_str(k): _str(v) for k, v in fields.items()}
+            event = Notification(_str(entry_id), fields["type"], json.loads(fields["data"]), fields.get("coalesce_key"))
+            replayed.add(event.id)
+            self._offer(subscription, event)
+        self._replayed.inc(len(entries))
+        for event in held:
+            # Published during the replay: already in the stream range or newer
+            if event.id not in replayed:
+                self._offer(subscription, event)
+
+    async def subscribe(self, user_id: str, last_event_id: Optional[str] = None) -> Subscription:
+        """
+        Register a connection, replaying events after ``last_event_id``. Live
+        events are registered for first, so none are missed during replay.
+        """
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+        try:
+            await asyncio.wait_for(self._listening.wait(), 2.0)
+        except asyncio.TimeoutError:
+            logger.warning("Notification subscriber not ready; live events may be delayed until reconnect")
+        subscription = Subscription(user_id, self.queue_size)
+        self._subscriptions.setdefault(user_id, set()).add(subscription)
+        if last_event_id:
+            await self._replay(subscription, last_event_id)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscriptions = self._subscriptions.get(subscription.user_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.user_id]
+
+    async def stop(self) -> None:
+        for subscriptions in list(self._subscriptions.values()):
+            for subscription in subscriptions:
+                subscription.close()
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+            self._listening.clear()
+
+
+_hub: Optional[NotificationHub] = None
+
+
+def get_notification_hub() -> NotificationHub:
+    """The process-wide notification hub"""
+    global _hub
+    if _hub is None:
+        _hub = NotificationHub()
+    return _hub
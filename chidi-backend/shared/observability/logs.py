@@ -0,0 +1,245 @@
+"""
+Non-blocking structured logging pipeline.
+
+Request code only formats a record and puts it on a bounded in-memory queue;
+a background ``QueueListener`` thread does all console and file I/O. Files
+are rotated by size or time and compressed with gzip on rotation.
+
+Configuration (environment variables):
+    LOG_LEVEL           root level (default INFO)
+    LOG_FORMAT          ``json`` (default) or ``text``
+    LOG_DIR             directory for the log file; unset disables file logging
+    LOG_FILE_NAME       file name inside LOG_DIR (default chidi_api.log)
+    LOG_TO_FILE         set to false to log to the console only (default true)
+    LOG_ROTATE_WHEN     time-based rotation (e.g. ``midnight``, ``H``); when
+                        unset, files rotate by LOG_MAX_BYTES
+    LOG_MAX_BYTES       size-based rotation threshold (default 50 MB)
+    LOG_BACKUP_COUNT    rotated files to keep (default 14)
+    LOG_QUEUE_SIZE      records buffered before new ones are dropped (default 10000)
+    LOG_LEVELS          per-logger levels, e.g. ``shared.auth.jwt_handler=DEBUG``
+    LOG_SAMPLE_RATES    per-logger sampling of records below WARNING, e.g.
+                        ``shared.auth.jwt_handler=0.05``
+
+File logging is single-process only: processes sharing one file race each
+other's rotation and lose records. Under gunicorn (several workers, plus an
+old and a new one overlapping on every restart) ``app.gunicorn_conf`` sets
+LOG_TO_FILE=false and logs go to the console for the platform to collect.
+"""
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import shutil
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Request id of the request being handled in the current task/thread
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+_TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s"
+
+# Attributes every LogRecord has; anything else was passed via ``extra=``
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message",
+    "asctime",
+    "request_id",
+}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def parse_logger_map(value: Optional[str]) -> Dict[str, str]:
+    """Parse ``name=value,name=value`` into a dict"""
+    result: Dict[str, str] = {}
+    for item in (value or "").split(","):
+        name, sep, setting = item.partition("=")
+        if sep and name.strip():
+            result[name.strip()] = setting.strip()
+    return result
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the current request id (runs in the caller's thread)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get() or "-"
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of sub-WARNING records from selected loggers.
+
+    Rates are matched on the longest logger-name prefix, so
+    ``shared.auth=0.1`` also samples ``shared.auth.jwt_handler``.
+    WARNING and above are never sampled out.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._resolved: Dict[str, float] = {}
+
+    def _rate_for(self, name: str) -> float:
+        rate = self._resolved.get(name)
+        if rate is None:
+            rate = 1.0
+            prefix = name
+            while prefix:
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+                prefix = prefix.rpartition(".")[0]
+            self._resolved[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate_for(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including any ``extra=`` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-"),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full"""
+
+    dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge args now (they may be mutated after the call returns) and
+        # render the traceback, which cannot cross threads safely. Extra
+        # fields are left intact for the JSON formatter.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _gzip_namer(name: str) -> str:
+    return name + ".gz"
+
+
+def _gzip_rotator(source: str, dest: str) -> None:
+    with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+def _file_handler(log_dir: Path) -> logging.Handler:
+    log_dir.mkdir(parents=True, exist_ok=True)
+    path = log_dir / os.getenv("LOG_FILE_NAME", "chidi_api.log")
+    backup_count = int(os.getenv("LOG_BACKUP_COUNT", "14"))
+    rotate_when = os.getenv("LOG_ROTATE_WHEN")
+
+    handler: logging.handlers.BaseRotatingHandler
+    if rotate_when:
+        handler = logging.handlers.TimedRotatingFileHandler(
+            path, when=rotate_when, backupCount=backup_count, utc=True, delay=True
+        )
+    else:
+        handler = logging.handlers.RotatingFileHandler(
+            path,
+            maxBytes=int(os.getenv("LOG_MAX_BYTES", str(50 * 1024 * 1024))),
+            backupCount=backup_count,
+            delay=True,
+        )
+    handler.namer = _gzip_namer
+    handler.rotator = _gzip_rotator
+    return handler
+
+
+def configure_logging(log_dir: Optional[Path] = None) -> Optional[Path]:
+    """
+    Route all logging through a queue to a background writer thread.
+
+    ``log_dir`` is used when LOG_DIR is not set. Returns the log directory in
+    use, or None when file logging is disabled (LOG_TO_FILE=false). Safe to
+    call more than once.
+    """
+    global _listener
+
+    if os.getenv("LOG_DIR"):
+        log_dir = Path(os.environ["LOG_DIR"])
+    if os.getenv("LOG_TO_FILE", "true").lower() not in ("1", "true", "yes"):
+        log_dir = None
+
+    if os.getenv("LOG_FORMAT", "json").lower() == "text":
+        formatter: logging.Formatter = logging.Formatter(_TEXT_FORMAT)
+    else:
+        formatter = JsonFormatter()
+
+    handlers: List[logging.Handler] = [logging.StreamHandler()]
+    if log_dir is not None:
+        handlers.append(_file_handler(log_dir))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    shutdown_logging()
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(
+        maxsize=int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+    )
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(RequestIdFilter())
+    sample_rates = {
+        name: float(rate) for name, rate in parse_logger_map(os.getenv("LOG_SAMPLE_RATES")).items()
+    }
+    if sample_rates:
+        queue_handler.addFilter(SamplingFilter(sample_rates))
+
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(queue_handler)
+    root_logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+    for name, level in parse_logger_map(os.getenv("LOG_LEVELS")).items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return log_dir
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the background writer"""
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
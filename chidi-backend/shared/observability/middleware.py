@@ -0,0 +1,176 @@
+"""
+Pure ASGI request instrumentation middleware.
+
+Times every HTTP request and records method, route template, status and
+duration into the metrics registry, plus one structured log line. Unlike a
+``BaseHTTPMiddleware`` it never buffers the request body: bodies are only
+copied (up to a size cap) while the endpoint itself streams them, and only
+for routes that opted in.
+"""
+import logging
+import random
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Collection, Dict, Iterable, List, Optional, Tuple
+
+from .logs import request_id_var
+from .metrics import REGISTRY, MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+Message = Dict[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+
+# Headers whose values never reach the logs
+DEFAULT_REDACTED_HEADERS = frozenset(
+    {
+        "authorization",
+        "cookie",
+        "set-cookie",
+        "apikey",
+        "x-api-key",
+        "x-hub-signature",
+        "x-hub-signature-256",
+        "proxy-authorization",
+    }
+)
+
+UNMATCHED_ROUTE = "unmatched"
+
+# Routes whose bodies are never captured, whatever capture_body_routes says:
+# high-volume and carrying third-party message content
+NEVER_CAPTURE_PREFIXES = ("/webhooks",)
+
+
+def redact_headers(
+    raw_headers: Iterable[Tuple[bytes, bytes]], redacted: Collection[str] = DEFAULT_REDACTED_HEADERS
+) -> Dict[str, str]:
+    """Decode ASGI headers, masking sensitive values"""
+    headers: Dict[str, str] = {}
+    for raw_name, raw_value in raw_headers:
+        name = raw_name.decode("latin-1").lower()
+        headers[name] = "[REDACTED]" if name in redacted else raw_value.decode("latin-1")
+    return headers
+
+
+def route_template(scope: Dict[str, Any]) -> str:
+    """The matched route's path template (``/users/{id}``), never the raw path"""
+    route = scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+class RequestInstrumentationMiddleware:
+    """
+    Args:
+        app: The ASGI application to wrap.
+        capture_body_routes: Route templates (e.g. ``"/users/context"``) whose
+            request bodies may be logged. Empty by default; routes under
+            ``NEVER_CAPTURE_PREFIXES`` are ignored.
+        body_sample_rate: Fraction of requests to opted-in routes whose body
+            is captured.
+        max_body_bytes: Cap on captured body bytes per request.
+        redacted_headers: Header names masked when headers are logged
+            (headers are only logged at DEBUG level).
+        registry: Metrics registry to record into.
+    """
+
+    def __init__(
+        self,
+        app: Callable,
+        capture_body_routes: Collection[str] = (),
+        body_sample_rate: float = 1.0,
+        max_body_bytes: int = 2048,
+        redacted_headers: Collection[str] = DEFAULT_REDACTED_HEADERS,
+        registry: MetricsRegistry = REGISTRY,
+    ):
+        self.app = app
+        self.capture_body_routes = frozenset(
+            route for route in capture_body_routes if not route.startswith(NEVER_CAPTURE_PREFIXES)
+        )
+        self.body_sample_rate = body_sample_rate
+        self.max_body_bytes = max_body_bytes
+        self.redacted_headers = frozenset(name.lower() for name in redacted_headers)
+
+        self.requests_total = registry.counter(
+            "http_requests_total", "HTTP requests handled", ("method", "route", "status")
+        )
+        self.request_duration = registry.histogram(
+            "http_request_duration_seconds", "HTTP request duration", ("method", "route")
+        )
+        self.requests_in_flight = registry.gauge(
+            "http_requests_in_flight", "HTTP requests currently being handled"
+        )
+
+    async def __call__(self, scope: Dict[str, Any], receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        status_code = 500
+        captured: Optional[List[bytes]] = None
+        captured_size = 0
+        capture_decided = False
+
+        async def receive_wrapper() -> Message:
+            nonlocal captured, captured_size, capture_decided
+            message = await receive()
+            if not capture_decided:
+                # The router has resolved the route by the time the endpoint reads the body
+                capture_decided = True
+                if (
+                    route_template(scope) in self.capture_body_routes
+                    and random.random() < self.body_sample_rate
+                ):
+                    captured = []
+            if captured is not None and message["type"] == "http.request":
+                remaining = self.max_body_bytes - captured_size
+                if remaining > 0:
+                    chunk = message.get("body", b"")[:remaining]
+                    captured.append(chunk)
+                    captured_size += len(chunk)
+            return message
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-request-id", request_id.encode("latin-1"))
+                ]
+            await send(message)
+
+        self.requests_in_flight.inc()
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            self.requests_in_flight.dec()
+            duration = time.perf_counter() - start
+            method = scope["method"]
+            route = route_template(scope)
+            self.requests_total.inc(method=method, route=route, status=str(status_code))
+            self.request_duration.observe(duration, method=method, route=route)
+
+            extra: Dict[str, Any] = {
+                "method": method,
+                "route": route,
+                "status": status_code,
+                "duration_ms": round(duration * 1000, 2),
+            }
+            if captured is not None:
+                extra["body"] = b"".join(captured).decode("utf-8", "replace")
+            if logger.isEnabledFor(logging.DEBUG):
+                extra["headers"] = redact_headers(scope["headers"], self.redacted_headers)
+            logger.info(
+                f"{method} {route} {status_code} {extra['duration_ms']}ms", extra=extra
+            )
+            request_id_var.reset(token)
@@ -0,0 +1 @@
+# This file makes the queue directory a Python package
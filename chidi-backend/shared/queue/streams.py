@@ -0,0 +1,278 @@
+"""
+Background job queue on Redis Streams.
+
+A queue is split into ``QUEUE_SHARDS`` streams (``queue:<name>:<shard>``),
+each with one consumer group. A job goes to the shard of its ordering key
+(usually the user id), and a shard is consumed by one worker at a time
+(see ``shared/queue/worker.py``). So one user's jobs run in order while
+different users' jobs run in parallel.
+
+Delivery is at least once: a job stays in the group's pending list until
+it is acknowledged. Its owner re-reads it there to retry it, and a worker
+taking over a shard claims what the previous owner left behind with
+``XAUTOCLAIM``. Handlers must therefore be idempotent. Failed attempts and
+the time of the next retry are kept in a per-shard hash. After
+``max_attempts`` the job moves to the dead-letter stream
+``queue:<name>:dead``, which is never trimmed: a dead job stays there,
+payload intact, until someone re-enqueues or deletes it. Watch its length
+(``queue_dead_letters``).
+
+Configuration (environment variables):
+    QUEUE_SHARDS   streams per queue; changing it remaps keys, so drain first (default 16)
+    QUEUE_MAXLEN   approximate entries kept per shard stream, processed or not (default 100000)
+"""
+import json
+import logging
+import os
+import time
+import zlib
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from shared.cache.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SHARDS = int(os.getenv("QUEUE_SHARDS", "16"))
+QUEUE_MAXLEN = int(os.getenv("QUEUE_MAXLEN", "100000"))
+
+GROUP = "workers"
+
+
+class QueueUnavailable(RuntimeError):
+    """Redis is not configured, so jobs cannot be enqueued"""
+
+
+def _str(value: Any) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else str(value)
+
+
+@dataclass
+class Job:
+    """A queued unit of work; ``attempts`` counts earlier failed runs"""
+    id: str
+    type: str
+    key: str
+    payload: Dict[str, Any] = field(default_factory=dict)
+    shard: int = 0
+    attempts: int = 0
+    retry_at: float = 0.0
+
+    @property
+    def enqueued_at(self) -> float:
+        """Enqueue time in epoch seconds, from the stream entry id"""
+        return int(self.id.split("-")[0]) / 1000
+
+
+class StreamQueue:
+    """
+    Args:
+        name: Queue name, part of every Redis key
+        shards: Number of streams; jobs with the same key share one
+        maxlen: Approximate cap per shard stream (``XADD MAXLEN ~``); the
+            dead-letter stream is not capped
+        redis_factory: Returns the Redis client, or None when Redis is not configured
+    """
+
+    def __init__(
+        self,
+        name: str = "jobs",
+        shards: int = QUEUE_SHARDS,
+        maxlen: int = QUEUE_MAXLEN,
+        redis_factory: Callable[[], Any] = get_redis,
+    ):
+        self.name = name
+        self.shards = shards
+        self.maxlen = maxlen
+        self.dead_letter_stream = f"queue:{name}:dead"
+        self._redis_factory = redis_factory
+        self._groups_ready = False
+
+    @property
+    def redis(self) -> Any:
+        redis = self._redis_factory()
+        if redis is None:
+            raise QueueUnavailable(f"Queue {self.name} needs REDIS_URL")
+        return redis
+
+    @property
+    def available(self) -> bool:
+        return self._redis_factory() is not None
+
+    def stream(self, shard: int) -> str:
+        return f"queue:{self.name}:{shard}"
+
+    def _retries_key(self, shard: int) -> str:
+        return f"queue:{self.name}:{shard}:retries"
+
+    def shard_for(self, key: str) -> int:
+        return zlib.crc32(key.encode("utf-8")) % self.shards
+
+    async def ensure_groups(self) -> None:
+        """Create every shard's stream and consumer group (once per process; idempotent)"""
+        if self._groups_ready:
+            return
+        for shard in range(self.shards):
+            try:
+                await self.redis.xgroup_create(self.stream(shard), GROUP, id="0", mkstream=True)
+            except Exception as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+        self._groups_ready = True
+
+    def _fields(self, job_type: str, payload: Dict[str, Any], key: str) -> Dict[str, str]:
+        return {"type": job_type, "key": key, "payload": json.dumps(payload, separators=(",", ":"))}
+
+    async def enqueue(self, job_type: str, payload: Dict[str, Any], key: str) -> str:
+        """Append a job; jobs with the same ``key`` are processed in enqueue order"""
+        await self.ensure_groups()
+        entry_id = await self.redis.xadd(
+            self.stream(self.shard_for(key)), self._fields(job_type, payload, key),
+            maxlen=self.maxlen, approximate=True,
+        )
+        return _str(entry_id)
+
+    async def enqueue_many(self, jobs: Sequence[Tuple[str, Dict[str, Any], str]]) -> List[str]:
+        """Append ``(job_type, payload, key)`` jobs in one round trip, keeping their order"""
+        if not jobs:
+            return []
+        await self.ensure_groups()
+        pipe = self.redis.pipeline(transaction=False)
+        for job_type, payload, key in jobs:
+            pipe.xadd(
+                self.stream(self.shard_for(key)), self._fields(job_type, payload, key),
+                maxlen=self.maxlen, approximate=True,
+            )
+        return [_str(entry_id) for entry_id in await pipe.execute()]
+
+    async def claim(self, shard: int, consumer: str, batch_size: int = 100) -> int:
+        """Move every pending job of ``shard`` to ``consumer`` (after taking the shard over)"""
+        claimed = 0
+        start = "0-0"
+        while True:
+            result = await self.redis.xautoclaim(
+                self.stream(shard), GROUP, consumer, min_idle_time=0, start_id=start, count=batch_size
+            )
+            start, entries = _str(result[0]), result[1]
+            claimed += len(entries)
+            if start == "0-0":
+                return claimed
+
+    async def read(
+        self,
+        shard: int,
+        consumer: str,
+        count: int,
+        block_ms: Optional[int] = None,
+        pending_scan: int = 0,
+    ) -> List[Job]:
+        """
+        ``consumer``'s pending jobs (up to ``pending_scan``), then up to
+        ``count`` new ones, in stream order. Blocks for new jobs only when
+        nothing is pending.
+        """
+        redis = self.redis
+        stream = self.stream(shard)
+        entries: List[Any] = []
+        if pending_scan:
+            result = await redis.xreadgroup(GROUP, consumer, {stream: "0"}, count=pending_scan)
+            entries = result[0][1] if result else []
+        result = await redis.xreadgroup(
+            GROUP, consumer, {stream: ">"}, count=count, block=None if entries else block_ms
+        )
+        entries += result[0][1] if result else []
+
+        jobs: List[Job] = []
+        trimmed: List[str] = []
+        for entry_id, fields in entries:
+            entry_id = _str(entry_id)
+            if not fields:
+                # Trimmed by MAXLEN while pending; nothing left to run
+                trimmed.append(entry_id)
+                continue
+            fields = {_str(k): _str(v) for k, v in fields.items()}
+            jobs.append(Job(
+                id=entry_id, type=fields.get("type", ""), key=fields.get("key", ""),
+                payload=json.loads(fields.get("payload") or "{}"), shard=shard,
+            ))
+        if trimmed:
+            logger.warning(f"Queue {self.name} shard {shard}: {len(trimmed)} pending jobs were trimmed before running")
+            await redis.xack(stream, GROUP, *trimmed)
+
+        if jobs:
+            states = await redis.hmget(self._retries_key(shard), [job.id for job in jobs])
+            for job, state in zip(jobs, states):
+                if state:
+                    state = json.loads(state)
+                    job.attempts, job.retry_at = state["attempts"], state["retry_at"]
+        return jobs
+
+    async def ack(self, job: Job) -> None:
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.xack(self.stream(job.shard), GROUP, job.id)
+        pipe.hdel(self._retries_key(job.shard), job.id)
+        await pipe.execute()
+
+    async def retry_later(self, job: Job, delay: float, error: str) -> None:
+        """Record a failed attempt; the job stays pending and runs again after ``delay``"""
+        job.attempts += 1
+        job.retry_at = time.time() + delay
+        await self.redis.hset(
+            self._retries_key(job.shard), job.id,
+            json.dumps({"attempts": job.attempts, "retry_at": job.retry_at, "error": error[:500]}),
+        )
+
+    async def dead_letter(self, job: Job, error: str) -> None:
+        """Move a job to the dead-letter stream and acknowledge it"""
+        pipe = self.redis.pipeline(transaction=True)
+        # No MAXLEN: the dead-letter stream is the only copy left
+        pipe.xadd(
+            self.dead_letter_stream,
+            {
+                **self._fields(job.type, job.payload, job.key),
+                "job_id": job.id, "attempts": str(job.attempts), "error": error[:2000],
+            },
+        )
+        pipe.xack(self.stream(job.shard), GROUP, job.id)
+        pipe.hdel(self._retries_key(job.shard), job.id)
+        await pipe.execute()
+
+    async def stats(self) -> Dict[str, float]:
+        """
+        ``backlog`` (not yet delivered), ``pending`` (delivered, not acked),
+        ``oldest_age`` (seconds the oldest undelivered job has waited) and
+        ``dead`` (dead-letter stream length), summed over shards.
+        """
+        redis = self.redis
+        stats = {"backlog": 0.0, "pending": 0.0, "oldest_age": 0.0, "dead": float(await redis.xlen(self.dead_letter_stream))}
+        now_ms = time.time() * 1000
+        for shard in range(self.shards):
+            stream = self.stream(shard)
+            try:
+                groups = [g for g in await redis.xinfo_groups(stream) if _str(g["name"]) == GROUP]
+            except Exception as e:
+                # Nothing enqueued to this shard yet
+                if "no such key" in str(e):
+                    continue
+                raise
+            if not groups:
+                continue
+            group = groups[0]
+            stats["pending"] += group["pending"]
+            stats["backlog"] += group.get("lag") or 0
+            oldest = await redis.xrange(stream, min=f"({_str(group['last-delivered-id'])}", count=1)
+            if oldest:
+                age = (now_ms - int(_str(oldest[0][0]).split("-")[0])) / 1000
+                stats["oldest_age"] = max(stats["oldest_age"], age)
+        return stats
+
+
+_queue: Optional[StreamQueue] = None
+
+
+def get_queue() -> StreamQueue:
+    """The process-wide job queue"""
+    global _queue
+    if _queue is None:
+        _queue = StreamQueue()
+    return _queue
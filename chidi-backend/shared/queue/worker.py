@@ -0,0 +1,337 @@
+"""
+Worker process for ``StreamQueue`` jobs.
+
+A worker leases shards (``queue:<name>:lease:<shard>``, renewed every
+``lease_ttl / 3`` seconds) and runs one consumer loop per leased shard.
+Live workers heartbeat into ``queue:<name>:workers``, and each worker
+holds about ``shards / live workers`` leases: it takes free shards when it
+has fewer and gives shards back when it has more. Adding or removing
+worker processes rebalances the shards within a lease period. When a
+worker takes a shard over, it first claims the jobs the previous owner
+left pending.
+
+Each batch is grouped by job key. Groups run concurrently, at most
+``concurrency`` jobs at once per process, and the jobs within a group run
+one after another. A failed job is retried after an exponential backoff
+(``retry_backoff * 2 ** (attempts - 1)``). Later jobs with the same key
+wait behind it, so order holds across retries. After ``max_attempts``
+failures the job is dead-lettered and its key moves on.
+
+Metrics:
+    queue_jobs_total{queue,type,result}       ok, retry or dead
+    queue_job_duration_seconds{queue,type}
+    queue_job_lag_seconds{queue}              enqueue to first run
+    queue_backlog{queue}, queue_pending{queue}, queue_oldest_job_age_seconds{queue},
+    queue_dead_letters{queue}                 refreshed every ``stats_interval`` seconds
+    queue_worker_shards, queue_worker_jobs_in_progress
+
+Configuration (environment variables):
+    QUEUE_WORKER_CONCURRENCY  jobs run at once per process (default 16)
+    QUEUE_BATCH_SIZE          new jobs read per shard per round (default 50)
+    QUEUE_MAX_ATTEMPTS        failures before dead-lettering (default 5)
+    QUEUE_RETRY_BACKOFF       seconds before the first retry (default 2)
+    QUEUE_LEASE_TTL           seconds a shard lease lasts without renewal (default 30)
+    QUEUE_BLOCK_MS            longest blocking read; keep below REDIS_SOCKET_TIMEOUT (default 1000)
+    QUEUE_STATS_INTERVAL      seconds between depth/lag refreshes (default 15)
+    QUEUE_DEAD_LETTER_ALERT   log an error while the dead-letter stream holds this many
+                              jobs and is still growing; 0 disables (default 1000)
+"""
+import asyncio
+import logging
+import math
+import os
+import random
+import socket
+import time
+import uuid
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from redis.exceptions import WatchError
+
+from shared.observability.metrics import REGISTRY, MetricsRegistry
+
+from .streams import Job, StreamQueue
+
+logger = logging.getLogger(__name__)
+
+QUEUE_WORKER_CONCURRENCY = int(os.getenv("QUEUE_WORKER_CONCURRENCY", "16"))
+QUEUE_BATCH_SIZE = int(os.getenv("QUEUE_BATCH_SIZE", "50"))
+QUEUE_MAX_ATTEMPTS = int(os.getenv("QUEUE_MAX_ATTEMPTS", "5"))
+QUEUE_RETRY_BACKOFF = float(os.getenv("QUEUE_RETRY_BACKOFF", "2"))
+QUEUE_LEASE_TTL = float(os.getenv("QUEUE_LEASE_TTL", "30"))
+QUEUE_BLOCK_MS = int(os.getenv("QUEUE_BLOCK_MS", "1000"))
+QUEUE_STATS_INTERVAL = float(os.getenv("QUEUE_STATS_INTERVAL", "15"))
+QUEUE_DEAD_LETTER_ALERT = int(os.getenv("QUEUE_DEAD_LETTER_ALERT", "1000"))
+
+Handler = Callable[[Job], Awaitable[None]]
+
+LAG_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+class Worker:
+    """
+    Args:
+        queue: Queue to consume
+        handlers: Job type to coroutine; unknown types are dead-lettered
+        concurrency: Jobs run at once in this process
+        batch_size: New jobs read per shard per round
+        max_attempts: Failures before a job is dead-lettered
+        retry_backoff: Seconds before the first retry, doubling after each failure
+        lease_ttl: Seconds a shard lease lasts without renewal
+        block_ms: Longest blocking read per round
+        dead_letter_alert: Dead-letter stream length that is logged as an error
+        consumer: Consumer name (default ``<hostname>-<random>``)
+    """
+
+    def __init__(
+        self,
+        queue: StreamQueue,
+        handlers: Dict[str, Handler],
+        concurrency: int = QUEUE_WORKER_CONCURRENCY,
+        batch_size: int = QUEUE_BATCH_SIZE,
+        max_attempts: int = QUEUE_MAX_ATTEMPTS,
+        retry_backoff: float = QUEUE_RETRY_BACKOFF,
+        lease_ttl: float = QUEUE_LEASE_TTL,
+        block_ms: int = QUEUE_BLOCK_MS,
+        stats_interval: float = QUEUE_STATS_INTERVAL,
+        dead_letter_alert: int = QUEUE_DEAD_LETTER_ALERT,
+        consumer: Optional[str] = None,
+        registry: MetricsRegistry = REGISTRY,
+    ):
+        self.queue = queue
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.lease_ttl = lease_ttl
+        self.block_ms = block_ms
+        self.stats_interval = stats_interval
+        self.dead_letter_alert = dead_letter_alert
+        self._dead_letters = 0.0
+        self.consumer = consumer or f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._shards: Dict[int, asyncio.Task] = {}
+        self._shard_stops: Dict[int, asyncio.Event] = {}
+        self._stopping = asyncio.Event()
+        self.in_progress = 0
+
+        self._jobs = registry.counter("queue_jobs_total", "Queue jobs run, by outcome", ("queue", "type", "result"))
+        self._duration = registry.histogram(
+            "queue_job_duration_seconds", "Queue job handler run time", ("queue", "type")
+        )
+        self._lag = registry.histogram(
+            "queue_job_lag_seconds", "Time from enqueue to a job's first run", ("queue",), buckets=LAG_BUCKETS
+        )
+        self._backlog = registry.gauge("queue_backlog", "Jobs not yet delivered to a worker", ("queue",))
+        self._pending = registry.gauge("queue_pending", "Jobs delivered but not yet acknowledged", ("queue",))
+        self._oldest = registry.gauge(
+            "queue_oldest_job_age_seconds", "How long the oldest undelivered job has waited", ("queue",)
+        )
+        self._dead = registry.gauge("queue_dead_letters", "Jobs in the dead-letter stream", ("queue",))
+        registry.register_callback("queue_worker_shards", "Shards leased by this worker", lambda: len(self._shards))
+        registry.register_callback(
+            "queue_worker_jobs_in_progress", "Jobs running in this worker", lambda: self.in_progress
+        )
+
+    # Leases
+
+    def _lease_key(self, shard: int) -> str:
+        return f"queue:{self.queue.name}:lease:{shard}"
+
+    @property
+    def _workers_key(self) -> str:
+        return f"queue:{self.queue.name}:workers"
+
+    async def _acquire(self, shard: int) -> bool:
+        return bool(await self.queue.redis.set(
+            self._lease_key(shard), self.consumer, nx=True, px=int(self.lease_ttl * 1000)
+        ))
+
+    async def _if_owner(self, shard: int, action: Callable) -> bool:
+        """Run ``action(pipe, key)`` atomically if this worker still holds the lease"""
+        key = self._lease_key(shard)
+        async with self.queue.redis.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(key)
+                owner = await pipe.get(key)
+                if owner is None or owner.decode("utf-8") != self.consumer:
+                    return False
+                pipe.multi()
+                action(pipe, key)
+                await pipe.execute()
+                return True
+            except WatchError:
+                return False
+
+    async def _renew(self, shard: int) -> bool:
+        return await self._if_owner(shard, lambda pipe, key: pipe.pexpire(key, int(self.lease_ttl * 1000)))
+
+    async def _release(self, shard: int) -> None:
+        await self._if_owner(shard, lambda pipe, key: pipe.delete(key))
+
+    async def _rebalance(self) -> None:
+        """Heartbeat, renew leases, then take or give back shards to hold a fair share"""
+        redis = self.queue.redis
+        now = time.time()
+        await redis.zadd(self._workers_key, {self.consumer: now})
+        await redis.zremrangebyscore(self._workers_key, "-inf", now - self.lease_ttl)
+        live = max(await redis.zcard(self._workers_key), 1)
+        fair_share = math.ceil(self.queue.shards / live)
+
+        for shard, task in list(self._shards.items()):
+            if task.done() or not await self._renew(shard):
+                logger.warning(f"Queue {self.queue.name}: lost shard {shard}")
+                await self._stop_shard(shard, release=False)
+
+        if len(self._shards) < fair_share:
+            free = [shard for shard in range(self.queue.shards) if shard not in self._shards]
+            random.shuffle(free)
+            for shard in free:
+                if len(self._shards) >= fair_share:
+                    break
+                if await self._acquire(shard):
+                    self._shard_stops[shard] = asyncio.Event()
+                    self._shards[shard] = asyncio.create_task(self._consume(shard, self._shard_stops[shard]))
+        while len(self._shards) > fair_share:
+            await self._stop_shard(max(self._shards), release=True)
+
+    async def _stop_shard(self, shard: int, release: bool) -> None:
+        """Stop after the current round (a read blocks at most ``block_ms``), cancelling if it overruns"""
+        task = self._shards.pop(shard)
+        self._shard_stops.pop(shard).set()
+        await asyncio.wait([task], timeout=self.lease_ttl / 2)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        if release:
+            await self._release(shard)
+
+    # Consuming
+
+    async def _consume(self, shard: int, stop: asyncio.Event) -> None:
+        claimed = await self.queue.claim(shard, self.consumer)
+        if claimed:
+            logger.info(f"Queue {self.queue.name}: took over shard {shard} with {claimed} pending jobs")
+        while not stop.is_set() and not self._stopping.is_set():
+            try:
+                jobs = await self.queue.read(
+                    shard, self.consumer, self.batch_size, self.block_ms, pending_scan=self.batch_size * 10
+                )
+                ready = await self._process(jobs)
+                if jobs and not ready:
+                    # Only jobs waiting for their retry time; don't spin on them
+                    wake = min(job.retry_at for job in jobs)
+                    await asyncio.sleep(min(max(wake - time.time(), 0.05), self.block_ms / 1000))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Queue {self.queue.name} shard {shard} read failed: {str(e)}")
+                await asyncio.sleep(1)
+
+    async def _process(self, jobs: List[Job]) -> int:
+        """Run a batch: keys concurrently, each key's jobs in order. Returns jobs run."""
+        groups: "OrderedDict[str, List[Job]]" = OrderedDict()
+        for job in jobs:
+            groups.setdefault(job.key, []).append(job)
+        results = await asyncio.gather(*(self._run_group(group) for group in groups.values()))
+        return sum(results)
+
+    async def _run_group(self, jobs: List[Job]) -> int:
+        ran = 0
+        for job in jobs:
+            if job.retry_at > time.time():
+                break
+            ran += 1
+            if not await self._run(job):
+                break
+        return ran
+
+    async def _run(self, job: Job) -> bool:
+        """Run one job; False when it failed and later jobs with its key must wait"""
+        handler = self.handlers.get(job.type)
+        if handler is None:
+            await self.queue.dead_letter(job, f"No handler for job type {job.type!r}")
+            self._jobs.inc(queue=self.queue.name, type=job.type, result="dead")
+            return True
+
+        async with self._semaphore:
+            if job.attempts == 0:
+                self._lag.observe(max(time.time() - job.enqueued_at, 0), queue=self.queue.name)
+            self.in_progress += 1
+            started = time.perf_counter()
+            try:
+                await handler(job)
+                error = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error = f"{type(e).__name__}: {str(e)}"
+            finally:
+                self.in_progress -= 1
+                self._duration.observe(time.perf_counter() - started, queue=self.queue.name, type=job.type)
+
+        if error is None:
+            await self.queue.ack(job)
+            self._jobs.inc(queue=self.queue.name, type=job.type, result="ok")
+            return True
+        if job.attempts + 1 >= self.max_attempts:
+            job.attempts += 1
+            logger.error(f"Queue job {job.type} {job.id} dead-lettered after {job.attempts} attempts: {error}")
+            await self.queue.dead_letter(job, error)
+            self._jobs.inc(queue=self.queue.name, type=job.type, result="dead")
+            return True
+        delay = self.retry_backoff * 2 ** job.attempts
+        logger.warning(f"Queue job {job.type} {job.id} failed (attempt {job.attempts + 1}), retrying in {delay:.0f}s: {error}")
+        await self.queue.retry_later(job, delay, error)
+        self._jobs.inc(queue=self.queue.name, type=job.type, result="retry")
+        return False
+
+    async def _refresh_stats(self) -> None:
+        stats = await self.queue.stats()
+        self._backlog.set(stats["backlog"], queue=self.queue.name)
+        self._pending.set(stats["pending"], queue=self.queue.name)
+        self._oldest.set(stats["oldest_age"], queue=self.queue.name)
+        self._dead.set(stats["dead"], queue=self.queue.name)
+        if self.dead_letter_alert and stats["dead"] >= self.dead_letter_alert and stats["dead"] > self._dead_letters:
+            logger.error(
+                f"Queue {self.queue.name}: {stats['dead']:.0f} jobs in {self.queue.dead_letter_stream}; "
+                f"they are kept until re-enqueued or deleted"
+            )
+        self._dead_letters = stats["dead"]
+
+    # Lifecycle
+
+    async def run(self) -> None:
+        """Consume until ``stop()``; running jobs finish, unfinished ones stay pending for the next owner"""
+        await self.queue.ensure_groups()
+        logger.info(f"Queue worker {self.consumer} started on {self.queue.name} ({self.queue.shards} shards)")
+        last_stats = 0.0
+        try:
+            while not self._stopping.is_set():
+                try:
+                    await self._rebalance()
+                    if time.monotonic() - last_stats >= self.stats_interval:
+                        await self._refresh_stats()
+                        last_stats = time.monotonic()
+                except Exception as e:
+                    logger.error(f"Queue worker {self.consumer} rebalance failed: {str(e)}")
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), self.lease_ttl / 3)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            # In-flight rounds finish, then the shards are handed back
+            for shard in list(self._shards):
+                await self._stop_shard(shard, release=True)
+            try:
+                await self.queue.redis.zrem(self._workers_key, self.consumer)
+            except Exception as e:
+                logger.error(f"Queue worker {self.consumer} could not unregister: {str(e)}")
+            logger.info(f"Queue worker {self.consumer} stopped")
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    @property
+    def shards(self) -> Set[int]:
+        return set(self._shards)
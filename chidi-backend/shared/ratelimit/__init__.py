@@ -0,0 +1 @@
+# This file makes the ratelimit directory a Python package
@@ -0,0 +1,119 @@
+"""
+FastAPI dependencies for rate limiting.
+
+These run as route dependencies rather than middleware: middleware runs
+before routing and authentication, so it would have to verify the JWT a
+second time and could not tell which route limit applies. As a
+dependency, ``UserRateLimit`` reuses the request's ``get_current_user``
+result and runs before the endpoint touches the database.
+
+Limits are per scope and plan. A route can carry several scopes (the
+router-wide ``api`` limit plus a tighter one for expensive endpoints); the
+``RateLimit-*`` headers then describe whichever has the fewest requests
+left. Error responses and endpoints that return a ``Response`` themselves
+(streams) only carry the headers on 429.
+
+Configuration (environment variables):
+    RATE_LIMIT_ENABLED        set to false to turn limiting off (default true)
+    RATE_LIMIT_DEFAULT_PLAN   plan for tokens without ``app_metadata.plan`` (default free)
+    RATE_LIMIT_<SCOPE>        per-plan rates, e.g. ``free=300/m,pro=1200/m``; one rate for IP scopes
+    RATE_LIMIT_TRUST_PROXY    take the client IP from X-Forwarded-For (default false)
+"""
+import logging
+import math
+import os
+from typing import Any, Dict
+
+from fastapi import Depends, HTTPException, Request, Response, status
+
+from shared.auth.dependencies import get_current_user
+
+from .limiter import Decision, Rate, get_rate_limiter, parse_plan_rates, parse_rate
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMIT_DEFAULT_PLAN = os.getenv("RATE_LIMIT_DEFAULT_PLAN", "free")
+RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "false").lower() in ("1", "true", "yes")
+
+# Per-plan defaults by scope, overridden by RATE_LIMIT_<SCOPE>
+DEFAULT_USER_LIMITS = {
+    "api": "free=300/m,pro=1200/m,business=6000/m",
+    "exports": "free=10/h,pro=60/h,business=300/h",
+    "embeddings_sync": "free=10/h,pro=60/h,business=300/h",
+    "bulk": "free=60/h,pro=60/h,business=60/h",
+}
+DEFAULT_IP_LIMITS = {
+    "webhooks": "6000/m",
+    "diagnostics": "60/m",
+}
+
+
+def _headers(decision: Decision) -> Dict[str, str]:
+    return {
+        "RateLimit-Limit": str(decision.rate.limit),
+        "RateLimit-Remaining": str(decision.remaining),
+        "RateLimit-Reset": str(math.ceil(decision.reset)),
+        "RateLimit-Policy": decision.rate.policy(),
+    }
+
+
+async def _enforce(scope: str, identity: str, rate: Rate, response: Response) -> None:
+    decision = await get_rate_limiter().hit(scope, identity, rate)
+    if not decision.allowed:
+        logger.warning(f" Rate limit exceeded: {scope} for {identity} ({rate.limit}/{int(rate.period)}s)")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Rate limit exceeded: {rate.limit} requests per {int(rate.period)} seconds",
+            headers={**_headers(decision), "Retry-After": str(max(1, math.ceil(decision.retry_after)))},
+        )
+    current = response.headers.get("RateLimit-Remaining")
+    if current is None or decision.remaining < int(current):
+        response.headers.update(_headers(decision))
+
+
+class UserRateLimit:
+    """
+    Limit requests per authenticated user, at the rate of their plan
+    (``app_metadata.plan`` on the token).
+
+    Args:
+        scope: Limit name; rates come from RATE_LIMIT_<SCOPE> or DEFAULT_USER_LIMITS
+    """
+
+    def __init__(self, scope: str):
+        self.scope = scope
+        self.rates = parse_plan_rates(
+            os.getenv(f"RATE_LIMIT_{scope.upper()}", DEFAULT_USER_LIMITS.get(scope, ""))
+        )
+
+    async def __call__(self, response: Response, user: Dict[str, Any] = Depends(get_current_user)) -> None:
+        if not RATE_LIMIT_ENABLED:
+            return
+        plan = (user.get("app_metadata") or {}).get("plan") or RATE_LIMIT_DEFAULT_PLAN
+        rate = self.rates.get(plan) or self.rates.get(RATE_LIMIT_DEFAULT_PLAN)
+        if rate is not None:
+            await _enforce(self.scope, f"user:{user['user_id']}", rate, response)
+
+
+class IPRateLimit:
+    """
+    Limit requests per client IP, for routes without a user token.
+
+    Args:
+        scope: Limit name; the rate comes from RATE_LIMIT_<SCOPE> or DEFAULT_IP_LIMITS
+    """
+
+    def __init__(self, scope: str):
+        self.scope = scope
+        self.rate = parse_rate(os.getenv(f"RATE_LIMIT_{scope.upper()}", DEFAULT_IP_LIMITS[scope]))
+
+    async def __call__(self, request: Request, response: Response) -> None:
+        if not RATE_LIMIT_ENABLED:
+            return
+        client_ip = request.client.host if request.client else "unknown"
+        forwarded = request.headers.get("x-forwarded-for")
+        if RATE_LIMIT_TRUST_PROXY and forwarded:
+            client_ip = forwarded.split(",")[0].strip()
+        await _enforce(self.scope, f"ip:{client_ip}", self.rate, response)
@@ -0,0 +1,241 @@
+"""
+Distributed rate limiting with GCRA (generic cell rate algorithm).
+
+A limit of N requests per period is one Redis key per client and scope,
+holding the "theoretical arrival time" (TAT), updated atomically by a Lua
+script. It allows bursts of up to N and then one request every
+period / N.
+
+Most requests never reach Redis. A process takes a lease of several
+tokens in one script call and spends them locally until they run out or
+``lease_ttl`` passes. A denial is also remembered locally until its retry
+time, so a client hammering past its limit costs no Redis round trips.
+Leases are capped at 5% of the limit, so every process together can
+overshoot by at most one lease each. Unused leased tokens simply expire.
+
+If Redis is unavailable, the same algorithm runs per process (fail open to
+a local limit) and a warning is logged.
+
+Metrics:
+    ratelimit_decisions_total{scope,result,source}  allowed/limited, local/redis/fallback
+
+Configuration (environment variables):
+    RATE_LIMIT_LEASE_SIZE  most tokens leased per Redis call (default 10)
+    RATE_LIMIT_LEASE_TTL   seconds a lease may be spent (default 1)
+"""
+import logging
+import math
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from redis.commands.core import AsyncScript
+
+from shared.cache.lru import TTLCache
+from shared.cache.redis import get_redis
+from shared.observability.metrics import REGISTRY, MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_LEASE_SIZE = int(os.getenv("RATE_LIMIT_LEASE_SIZE", "10"))
+RATE_LIMIT_LEASE_TTL = float(os.getenv("RATE_LIMIT_LEASE_TTL", "1"))
+
+# Returns {allowed, remaining, retry_after_ms, reset_ms}. Time comes from the
+# Redis server so gateway clock skew cannot matter.
+GCRA_SCRIPT = """
+local interval = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local tat = tonumber(redis.call('GET', KEYS[1])) or now
+if tat < now then
+  tat = now
+end
+local new_tat = tat + interval * cost
+local allow_at = new_tat - interval - tolerance
+if now < allow_at then
+  return {0, 0, math.ceil(allow_at - now), math.ceil(tat - now)}
+end
+redis.call('SET', KEYS[1], string.format('%.3f', new_tat), 'PX', math.max(1, math.ceil(new_tat - now)))
+return {1, math.floor((now - allow_at) / interval), 0, math.ceil(new_tat - now)}
+"""
+
+
+@dataclass(frozen=True)
+class Rate:
+    """``limit`` requests per ``period`` seconds"""
+    limit: int
+    period: float
+
+    @property
+    def interval_ms(self) -> float:
+        return self.period * 1000 / self.limit
+
+    @property
+    def tolerance_ms(self) -> float:
+        return self.interval_ms * (self.limit - 1)
+
+    def policy(self) -> str:
+        return f"{self.limit};w={int(self.period)}"
+
+
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(value: str) -> Rate:
+    """``"120/60"`` (per 60 seconds), ``"120/m"``, ``"5000/1h"``"""
+    limit, _, period = value.strip().partition("/")
+    period = period.strip() or "1"
+    if period[-1] in _UNITS:
+        seconds = float(period[:-1] or 1) * _UNITS[period[-1]]
+    else:
+        seconds = float(period)
+    if int(limit) < 1 or seconds <= 0:
+        raise ValueError(f"Invalid rate: {value!r}")
+    return Rate(int(limit), seconds)
+
+
+def parse_plan_rates(value: Optional[str]) -> Dict[str, Rate]:
+    """``"free=60/m,pro=600/m"`` to a rate per plan"""
+    rates: Dict[str, Rate] = {}
+    for item in (value or "").split(","):
+        plan, sep, rate = item.partition("=")
+        if sep and plan.strip():
+            rates[plan.strip()] = parse_rate(rate)
+    return rates
+
+
+@dataclass
+class Decision:
+    """Outcome of one check; times in seconds"""
+    allowed: bool
+    rate: Rate
+    remaining: int
+    reset: float
+    retry_after: float = 0.0
+
+
+def gcra(tat: Optional[float], now: float, rate: Rate, cost: int = 1) -> Tuple[Decision, Optional[float]]:
+    """Pure-Python GCRA (milliseconds), the same as ``GCRA_SCRIPT``; returns the decision and the new TAT"""
+    interval, tolerance = rate.interval_ms, rate.tolerance_ms
+    tat = max(tat if tat is not None else now, now)
+    new_tat = tat + interval * cost
+    allow_at = new_tat - interval - tolerance
+    if now < allow_at:
+        return Decision(False, rate, 0, (tat - now) / 1000, (allow_at - now) / 1000), None
+    return Decision(True, rate, math.floor((now - allow_at) / interval), (new_tat - now) / 1000), new_tat
+
+
+@dataclass
+class _Lease:
+    tokens: int
+    remaining: int
+    reset_at: float
+
+
+class RateLimiter:
+    """
+    Args:
+        redis_factory: Returns the Redis client, or None to limit per process
+        lease_size: Most tokens leased per Redis call
+        lease_ttl: Seconds a lease may be spent
+        max_keys: Clients tracked locally (leases, denials, fallback state)
+    """
+
+    def __init__(
+        self,
+        redis_factory: Callable[[], Any] = get_redis,
+        lease_size: int = RATE_LIMIT_LEASE_SIZE,
+        lease_ttl: float = RATE_LIMIT_LEASE_TTL,
+        max_keys: int = 100_000,
+        registry: MetricsRegistry = REGISTRY,
+    ):
+        self._redis_factory = redis_factory
+        self.lease_size = lease_size
+        self.lease_ttl = lease_ttl
+        self._leases: TTLCache[str, _Lease] = TTLCache(maxsize=max_keys, ttl=lease_ttl)
+        self._denials: TTLCache[str, Decision] = TTLCache(maxsize=max_keys)
+        self._fallback: TTLCache[str, float] = TTLCache(maxsize=max_keys)
+        self._script: Optional[AsyncScript] = None
+        self._fallback_warned = 0.0
+
+        self._decisions = registry.counter(
+            "ratelimit_decisions_total", "Rate limit decisions", ("scope", "result", "source")
+        )
+
+    def _record(self, scope: str, decision: Decision, source: str) -> Decision:
+        self._decisions.inc(scope=scope, result="allowed" if decision.allowed else "limited", source=source)
+        return decision
+
+    async def hit(self, scope: str, identity: str, rate: Rate) -> Decision:
+        """Count one request by ``identity`` against ``rate`` in ``scope``"""
+        key = f"ratelimit:{scope}:{rate.limit}:{int(rate.period)}:{identity}"
+        now = time.monotonic()
+
+        denial = self._denials.get(key)
+        if denial is not None:
+            return self._record(scope, Decision(
+                False, rate, 0, max(denial.reset - now, 0), max(denial.retry_after - now, 0)
+            ), "local")
+
+        lease = self._leases.get(key)
+        if lease is not None and lease.tokens > 0:
+            lease.tokens -= 1
+            return self._record(
+                scope, Decision(True, rate, lease.remaining + lease.tokens, max(lease.reset_at - now, 0)), "local"
+            )
+
+        redis = self._redis_factory()
+        if redis is not None:
+            try:
+                decision, leased = await self._hit_redis(redis, key, rate)
+            except Exception as e:
+                if now - self._fallback_warned > 60:
+                    self._fallback_warned = now
+                    logger.warning(f"Rate limiter falling back to per-process limits: {str(e)}")
+            else:
+                if decision.allowed:
+                    if leased > 1:
+                        self._leases.set(key, _Lease(leased - 1, decision.remaining, now + decision.reset))
+                        # The client has used one token; the rest of the lease is still theirs
+                        decision.remaining += leased - 1
+                else:
+                    self._denials.set(
+                        key, Decision(False, rate, 0, now + decision.reset, now + decision.retry_after),
+                        ttl=decision.retry_after,
+                    )
+                return self._record(scope, decision, "redis")
+
+        decision, new_tat = gcra(self._fallback.get(key), now * 1000, rate)
+        if new_tat is not None:
+            self._fallback.set(key, new_tat, ttl=decision.reset)
+        return self._record(scope, decision, "fallback")
+
+    async def _hit_redis(self, redis: Any, key: str, rate: Rate) -> Tuple[Decision, int]:
+        if self._script is None:
+            self._script = redis.register_script(GCRA_SCRIPT)
+        # Small limits stay exact; large ones lease up to 5% at a time
+        size = max(1, min(self.lease_size, rate.limit // 20))
+        while True:
+            allowed, remaining, retry_after_ms, reset_ms = await self._script(
+                keys=[key], args=[rate.interval_ms, rate.tolerance_ms, size], client=redis
+            )
+            if allowed or size == 1:
+                break
+            # Not enough for a whole lease; a single token may still fit
+            size = 1
+        decision = Decision(bool(allowed), rate, int(remaining), reset_ms / 1000, retry_after_ms / 1000)
+        return decision, size
+
+
+_limiter: Optional[RateLimiter] = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    """The process-wide rate limiter"""
+    global _limiter
+    if _limiter is None:
+        _limiter = RateLimiter()
+    return _limiter
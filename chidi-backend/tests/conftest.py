@@ -0,0 +1,56 @@
+"""
+Shared fixtures.
+
+Tests that need PostgreSQL (with the pgvector extension) use the ``db``
+fixture and are skipped unless TEST_DATABASE_URL is set, e.g.
+``postgresql://postgres@localhost:5432/chidi_test``. Each test gets its
+own schema, dropped afterwards.
+"""
+import os
+from typing import AsyncIterator
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from shared.database.connection import build_async_url
+from shared.database.models import Base, Conversation, Message, ResponseCacheEntry, UserContext
+from shared.observability.metrics import MetricsRegistry
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+
+@pytest.fixture
+def registry() -> MetricsRegistry:
+    """A metrics registry of the test's own, so metric names never collide"""
+    return MetricsRegistry()
+
+
+@pytest.fixture
+async def db() -> AsyncIterator[AsyncSession]:
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    schema = f"test_{uuid4().hex[:12]}"
+    async_url, connect_args = build_async_url(TEST_DATABASE_URL)
+    connect_args["server_settings"] = {"search_path": f"{schema},public"}
+    engine = create_async_engine(async_url, connect_args=connect_args)
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+            await conn.execute(text(f"CREATE SCHEMA {schema}"))
+            # No checkfirst: tables already in public would be found through search_path
+            await conn.run_sync(
+                Base.metadata.create_all,
+                tables=[
+                    UserContext.__table__, Conversation.__table__, Message.__table__, ResponseCacheEntry.__table__,
+                ],
+                checkfirst=False,
+            )
+            await conn.execute(text("CREATE TABLE messages_default PARTITION OF messages DEFAULT"))
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            yield session
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+        await engine.dispose()
@@ -0,0 +1,185 @@
+"""
+ConversationWindow: appending, trimming to capacity and selecting history;
+ContextAssembler: cached windows per owner and late commits
+"""
+from datetime import datetime, timedelta
+from uuid import UUID
+
+from sqlalchemy import insert
+
+from shared.database.models import Conversation, Message, UserContext
+from shared.llm.context_window import ContextAssembler, ConversationWindow, WindowMessage
+from shared.llm.tokens import LocalTokenCounter
+
+START = datetime(2024, 1, 1, 12, 0, 0)
+
+
+def message(index: int, tokens: int, role: str = "user") -> WindowMessage:
+    return WindowMessage(
+        id=UUID(int=index),
+        role=role,
+        content=f"message {index}",
+        created_at=START + timedelta(seconds=index),
+        tokens=tokens,
+    )
+
+
+def ids(messages) -> list:
+    return [m.id.int for m in messages]
+
+
+def test_append_keeps_messages_in_order_under_capacity():
+    window = ConversationWindow(capacity=100)
+    for index in range(3):
+        window.append(message(index, 10))
+
+    assert ids(window.messages) == [0, 1, 2]
+    assert window.tokens == 30
+    assert window.complete
+    assert window.last_key == (START + timedelta(seconds=2), UUID(int=2))
+
+
+def test_append_ignores_messages_already_held():
+    window = ConversationWindow(capacity=100)
+    window.append(message(1, 10))
+    window.append(message(2, 10))
+
+    window.append(message(2, 10))  # synced twice
+    window.append(message(1, 10))
+
+    assert ids(window.messages) == [1, 2]
+    assert window.tokens == 20
+    assert UUID(int=1) in window
+
+
+def test_append_slots_a_late_commit_into_place():
+    window = ConversationWindow(capacity=100)
+    for index in (0, 1, 3):
+        window.append(message(index, 10))
+
+    window.append(message(2, 10))  # older created_at, committed after message 3
+
+    assert ids(window.messages) == [0, 1, 2, 3]
+    assert window.tokens == 40
+
+
+def test_append_drops_a_late_commit_older_than_a_trimmed_window():
+    window = ConversationWindow(capacity=20)
+    for index in (0, 2, 3, 4):
+        window.append(message(index, 10))
+    assert ids(window.messages) == [3, 4]
+    assert not window.complete
+
+    window.append(message(1, 10))  # belongs before what the window still holds
+
+    assert ids(window.messages) == [3, 4]
+    assert window.tokens == 20
+
+
+def test_append_orders_same_timestamp_by_id():
+    window = ConversationWindow(capacity=100)
+    first = message(1, 10)
+    window.append(first)
+    window.append(WindowMessage(UUID(int=3), "user", "same second", first.created_at, 10))
+    window.append(WindowMessage(UUID(int=2), "user", "lower id", first.created_at, 10))
+
+    assert ids(window.messages) == [1, 2, 3]
+
+
+def test_trim_drops_oldest_once_the_rest_covers_capacity():
+    window = ConversationWindow(capacity=25)
+    for index in range(3):
+        window.append(message(index, 10))
+    # 30 tokens held, but dropping message 0 would leave only 20 < 25
+    assert ids(window.messages) == [0, 1, 2]
+    assert window.complete
+
+    window.append(message(3, 10))
+    # 1..3 hold 30 >= 25 on their own, 2..3 would not
+    assert ids(window.messages) == [1, 2, 3]
+    assert window.tokens == 30
+    assert not window.complete
+
+
+def test_trim_keeps_exactly_capacity():
+    window = ConversationWindow(capacity=20)
+    for index in range(3):
+        window.append(message(index, 10))
+
+    assert ids(window.messages) == [1, 2]
+    assert window.tokens == 20
+
+
+def test_trim_keeps_a_message_larger_than_capacity():
+    window = ConversationWindow(capacity=50)
+    window.append(message(0, 10))
+    window.append(message(1, 80))
+
+    assert ids(window.messages) == [1]
+    assert window.tokens == 80
+    assert not window.complete
+
+
+def test_select_returns_the_longest_suffix_within_budget():
+    window = ConversationWindow(capacity=1000)
+    for index, tokens in enumerate([30, 20, 10, 40]):
+        window.append(message(index, tokens))
+
+    assert ids(window.select(100)) == [0, 1, 2, 3]
+    assert ids(window.select(70)) == [1, 2, 3]
+    # Stops at the first message that does not fit, never skips over it
+    assert ids(window.select(65)) == [2, 3]
+    assert window.select(39) == []
+    assert window.select(0) == []
+
+
+async def create_conversation(db, user_id: str) -> UUID:
+    user_context_id = await db.scalar(
+        insert(UserContext.__table__).values(user_id=user_id, business_data={}).returning(UserContext.__table__.c.id)
+    )
+    return await db.scalar(
+        insert(Conversation.__table__)
+        .values(user_context_id=user_context_id, title="Chat", source="chat", is_archived=False)
+        .returning(Conversation.__table__.c.id)
+    )
+
+
+async def add_message(db, conversation_id: UUID, user_id: str, content: str, created_at: datetime) -> None:
+    await db.execute(insert(Message.__table__).values(
+        conversation_id=conversation_id, user_id=user_id, role="user", content=content, created_at=created_at,
+    ))
+
+
+def contents(prompt) -> list:
+    return [m["content"] for m in prompt.messages[1:]]
+
+
+async def test_cached_window_is_only_served_to_its_owner(db):
+    conversation_id = await create_conversation(db, "owner")
+    await create_conversation(db, "other")
+    await add_message(db, conversation_id, "owner", "my supplier's number is 0803", START)
+    await db.commit()
+    assembler = ContextAssembler(counter=LocalTokenCounter(), max_tokens=1000, reserve_tokens=100)
+
+    owner_prompt = await assembler.build_prompt(db, "owner", conversation_id, "Be helpful")
+    # The test session bypasses RLS, as a worker's or a misconfigured one would
+    other_prompt = await assembler.build_prompt(db, "other", conversation_id, "Be helpful")
+
+    assert contents(owner_prompt) == ["my supplier's number is 0803"]
+    assert contents(other_prompt) == []
+
+
+async def test_sync_picks_up_a_message_committed_behind_the_tail(db):
+    conversation_id = await create_conversation(db, "owner")
+    await add_message(db, conversation_id, "owner", "first", START)
+    await add_message(db, conversation_id, "owner", "third", START + timedelta(seconds=2))
+    await db.commit()
+    assembler = ContextAssembler(counter=LocalTokenCounter(), max_tokens=1000, reserve_tokens=100, sync_overlap=30)
+    await assembler.build_prompt(db, "owner", conversation_id, "Be helpful")
+
+    # Its transaction started before "third" was written but committed after the window was built
+    await add_message(db, conversation_id, "owner", "second", START + timedelta(seconds=1))
+    await db.commit()
+    prompt = await assembler.build_prompt(db, "owner", conversation_id, "Be helpful")
+
+    assert contents(prompt) == ["first", "second", "third"]
@@ -0,0 +1,125 @@
+"""
+Business-data chunking, the local hashing embedder and the embedder's lifecycle
+"""
+import math
+
+from shared.database.models import EMBEDDING_DIMENSIONS
+from shared.llm import embeddings
+from shared.llm.embeddings import HashingEmbedder, OpenAIEmbedder, close_embedder, get_embedder, set_embedder
+from shared.llm.retrieval import chunk_business_data
+
+
+def dot(a, b) -> float:
+    return sum(x * y for x, y in zip(a, b))
+
+
+def test_chunk_one_per_top_level_key_sorted():
+    chunks = chunk_business_data({
+        "products": [{"name": "Ankara dress", "price": 15000}, {"name": "Gele", "price": 5000}],
+        "business_name": "Ada's Fabrics",
+        "hours": {"weekdays": "9-6", "saturday": "10-4"},
+        "tags": ["fabric", "tailoring"],
+        "delivery": True,
+    })
+
+    assert [chunk.key for chunk in chunks] == ["business_name", "delivery", "hours", "products", "tags"]
+    by_key = {chunk.key: chunk.content for chunk in chunks}
+    assert by_key["business_name"] == "business_name: Ada's Fabrics"
+    assert by_key["delivery"] == "delivery: true"
+    assert by_key["hours"] == "hours.saturday: 10-4\nhours.weekdays: 9-6"
+    assert by_key["products"] == (
+        "products[0].name: Ankara dress\nproducts[0].price: 15000\n"
+        "products[1].name: Gele\nproducts[1].price: 5000"
+    )
+    assert by_key["tags"] == "tags: fabric, tailoring"
+
+
+def test_chunk_empty_business_data():
+    assert chunk_business_data(None) == []
+    assert chunk_business_data({}) == []
+
+
+def test_chunk_splits_long_keys_at_line_boundaries():
+    faq = {f"q{index}": "x" * 30 for index in range(5)}  # "faq.qN: " + 30 chars = 38 per line
+    chunks = chunk_business_data({"faq": faq}, max_chars=80)
+
+    assert [chunk.key for chunk in chunks] == ["faq", "faq#1", "faq#2"]
+    assert all(len(chunk.content) <= 80 for chunk in chunks)
+    lines = [line for chunk in chunks for line in chunk.content.split("\n")]
+    assert lines == [f"faq.q{index}: {'x' * 30}" for index in range(5)]
+
+
+def test_chunk_splits_a_line_longer_than_max_chars():
+    chunks = chunk_business_data({"about": "y" * 50}, max_chars=20)
+
+    assert [chunk.key for chunk in chunks] == ["about", "about#1", "about#2"]
+    assert all(len(chunk.content) <= 20 for chunk in chunks)
+    assert "".join(chunk.content for chunk in chunks) == "about: " + "y" * 50
+
+
+def test_chunk_keys_and_hashes_are_stable():
+    data = {"hours": {"weekdays": "9-6"}, "business_name": "Ada's Fabrics"}
+    first = chunk_business_data(data)
+    second = chunk_business_data(dict(reversed(list(data.items()))))
+
+    assert [(c.key, c.content_hash) for c in first] == [(c.key, c.content_hash) for c in second]
+    changed = chunk_business_data({**data, "hours": {"weekdays": "8-6"}})
+    assert changed[0].content_hash == first[0].content_hash
+    assert changed[1].content_hash != first[1].content_hash
+
+
+async def test_hashing_embedder_is_deterministic_and_normalized():
+    embedder = HashingEmbedder()
+    first, second = await embedder.embed(["We deliver across Lagos", "We deliver across Lagos"])
+
+    assert embedder.dimensions == EMBEDDING_DIMENSIONS
+    assert embedder.name == f"hashing-{EMBEDDING_DIMENSIONS}"
+    assert len(first) == EMBEDDING_DIMENSIONS
+    assert first == second
+    assert math.isclose(math.sqrt(dot(first, first)), 1.0)
+
+
+async def test_hashing_embedder_ignores_case():
+    lower, upper = await HashingEmbedder().embed(["opening hours", "OPENING Hours"])
+
+    assert lower == upper
+
+
+async def test_hashing_embedder_places_shared_words_closer():
+    query, related, unrelated = await HashingEmbedder().embed([
+        "what time do you open on saturday",
+        "what time do you open on saturday morning",
+        "do you deliver to abuja",
+    ])
+
+    assert dot(query, related) > 0.9
+    assert dot(query, unrelated) < dot(query, related)
+
+
+async def test_hashing_embedder_gives_text_without_words_a_unit_vector():
+    (vector,) = await HashingEmbedder(dimensions=8).embed(["?!"])
+
+    assert vector == [1.0] + [0.0] * 7
+
+
+async def test_hashing_embedder_embeds_nothing():
+    assert await HashingEmbedder().embed([]) == []
+
+
+async def test_close_embedder_closes_the_pooled_client():
+    embedder = OpenAIEmbedder(api_key="test-key")
+    set_embedder(embedder)
+
+    await close_embedder()
+
+    assert embedder._client.is_closed
+    assert embeddings._embedder is None
+
+
+async def test_close_embedder_without_a_client():
+    set_embedder(HashingEmbedder())
+    await close_embedder()
+    await close_embedder()  # nothing configured any more
+
+    assert isinstance(get_embedder(), HashingEmbedder)
+    set_embedder(None)
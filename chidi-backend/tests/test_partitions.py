@@ -0,0 +1,66 @@
+"""
+Detaching expired message partitions only when every plan in use has a retention
+"""
+from datetime import datetime
+
+from sqlalchemy import insert, text
+
+from shared.database.models import UserContext
+from shared.database.partitions import detach_expired_partitions, list_partitions
+
+CUTOFF = datetime(2021, 1, 1)
+
+
+async def create_old_partition(db) -> None:
+    await db.execute(text(
+        "CREATE TABLE messages_2020_01 PARTITION OF messages FOR VALUES FROM ('2020-01-01') TO ('2020-02-01')"
+    ))
+
+
+async def add_user(db, user_id: str, settings: dict) -> None:
+    await db.execute(insert(UserContext.__table__).values(user_id=user_id, business_data={}, settings=settings))
+
+
+async def attached(db) -> list:
+    return [name for name, _, _ in await list_partitions(await db.connection())]
+
+
+async def test_detach_skips_while_a_user_is_on_an_unlisted_plan(db):
+    await create_old_partition(db)
+    await add_user(db, "free-user", {"plan": "free"})
+    await add_user(db, "enterprise-user", {"plan": "enterprise"})
+    await db.commit()
+
+    detached = await detach_expired_partitions(db.bind, CUTOFF, plans=["free", "pro"])
+
+    assert detached == []
+    assert await attached(db) == ["messages_2020_01"]
+
+
+async def test_detach_skips_when_the_default_plan_is_unlisted(db, monkeypatch):
+    monkeypatch.setattr("shared.database.partitions.MESSAGE_RETENTION_DEFAULT_PLAN", "trial")
+    await create_old_partition(db)
+    await add_user(db, "no-plan-user", {})
+    await db.commit()
+
+    assert await detach_expired_partitions(db.bind, CUTOFF, plans=["free"]) == []
+    assert await attached(db) == ["messages_2020_01"]
+
+
+async def test_detach_archives_when_every_plan_is_listed(db, monkeypatch):
+    schema = await db.scalar(text("SELECT current_schema()"))
+    monkeypatch.setattr("shared.database.partitions.MESSAGE_ARCHIVE_SCHEMA", f"{schema}_archive")
+    await create_old_partition(db)
+    await add_user(db, "free-user", {"plan": "free"})
+    await add_user(db, "no-plan-user", {})
+    await db.commit()
+
+    try:
+        detached = await detach_expired_partitions(db.bind, CUTOFF, plans=["free", "pro"])
+
+        assert detached == ["messages_2020_01"]
+        assert await attached(db) == []
+    finally:
+        await db.rollback()
+        await db.execute(text(f"DROP SCHEMA IF EXISTS {schema}_archive CASCADE"))
+        await db.commit()
@@ -0,0 +1,260 @@
+"""
+Circuit breaker transitions, and failover and hedging across providers
+served in-process by the fake provider app (shared/llm/providers/fake_server.py)
+"""
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from shared.llm.providers.anthropic import AnthropicProvider
+from shared.llm.providers.base import CircuitBreaker, ProviderError
+from shared.llm.providers.fake_server import FakeProviderConfig, create_app
+from shared.llm.providers.openai import OpenAIProvider
+from shared.llm.providers.router import ProviderRouter
+
+MESSAGES = [{"role": "user", "content": "What time do you open on Saturday?"}]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def fake_provider(provider_class, name: str, breaker=None, max_concurrency: int = 32, **config):
+    """A provider whose requests are answered in-process by a fake server app"""
+    app = create_app(FakeProviderConfig(**{"ttft_ms": 5, "token_ms": 1, "tokens": 5, "seed": 1, **config}))
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://fake/v1")
+    provider = provider_class(
+        "test-key",
+        name=name,
+        max_concurrency=max_concurrency,
+        queue_timeout=1.0,
+        breaker=breaker or CircuitBreaker(name, failure_threshold=2),
+        client=client,
+    )
+    provider.app = app
+    return provider
+
+
+def attempts(registry, provider: str, result: str) -> float:
+    return registry.counter("llm_provider_attempts_total", "", ("provider", "result")).value(
+        provider=provider, result=result
+    )
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=30, clock=clock)
+
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()  # resets the count
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    clock.now = 29.9
+    assert not breaker.allow()
+
+
+def test_breaker_half_open_lets_one_probe_through(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30, clock=clock)
+    breaker.record_failure()
+
+    clock.now = 30
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()  # probe in flight
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.failures == 0
+    assert breaker.allow()
+
+
+def test_breaker_failed_probe_reopens(clock):
+    breaker = CircuitBreaker("test", failure_threshold=5, reset_timeout=30, clock=clock)
+    for _ in range(5):
+        breaker.record_failure()
+
+    clock.now = 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    # The reset timeout restarts from the failed probe
+    clock.now = 59
+    assert not breaker.allow()
+    clock.now = 60
+    assert breaker.allow()
+
+
+def test_breaker_release_lets_another_probe_through(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30, clock=clock)
+    breaker.record_failure()
+    clock.now = 30
+    assert breaker.allow()
+
+    breaker.release()  # probe cancelled without a verdict
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+async def test_provider_streams_from_the_fake_server():
+    openai = fake_provider(OpenAIProvider, "openai")
+    anthropic = fake_provider(AnthropicProvider, "anthropic")
+
+    for provider in (openai, anthropic):
+        completion = await provider.complete(MESSAGES, max_tokens=3)
+        assert completion.response == "the quick brown "
+        assert completion.provider == provider.name
+        assert completion.completion_tokens == 3
+        assert completion.prompt_tokens > 0
+        assert provider.in_flight == 0
+        await provider.aclose()
+
+
+async def test_provider_failures_open_its_circuit():
+    provider = fake_provider(OpenAIProvider, "openai", fail_rate=1.0)
+
+    for _ in range(2):
+        with pytest.raises(ProviderError) as error:
+            await provider.complete(MESSAGES)
+        assert error.value.retryable
+        assert error.value.status_code == 503
+    assert provider.breaker.state == CircuitBreaker.OPEN
+
+    with pytest.raises(ProviderError, match="circuit open"):
+        await provider.complete(MESSAGES)
+    assert provider.app.state.requests == 2
+    await provider.aclose()
+
+
+async def test_cancelled_queued_probe_lets_another_probe_through(clock):
+    breaker = CircuitBreaker("openai", failure_threshold=1, reset_timeout=30, clock=clock)
+    provider = fake_provider(OpenAIProvider, "openai", breaker=breaker, max_concurrency=1)
+    breaker.record_failure()
+    clock.now = 30
+
+    await provider._semaphore.acquire()  # the only slot is taken
+    probe = asyncio.create_task(provider.complete(MESSAGES))
+    await asyncio.sleep(0.05)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()  # the queued probe holds the half-open slot
+
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+    provider._semaphore.release()
+
+    assert breaker.allow()
+    breaker.release()
+    assert (await provider.complete(MESSAGES)).response
+    assert breaker.state == CircuitBreaker.CLOSED
+    await provider.aclose()
+
+
+async def test_router_fails_over_to_the_next_provider(registry):
+    primary = fake_provider(OpenAIProvider, "openai", fail_rate=1.0)
+    secondary = fake_provider(AnthropicProvider, "anthropic")
+    router = ProviderRouter([primary, secondary], registry=registry)
+
+    completion = await router.complete(MESSAGES)
+
+    assert completion.provider == "anthropic"
+    assert completion.response.startswith("the quick brown")
+    assert primary.breaker.failures == 1
+    assert attempts(registry, "openai", "failed") == 1
+    assert attempts(registry, "anthropic", "won") == 1
+    await router.aclose()
+
+
+async def test_router_skips_a_provider_whose_circuit_is_open(registry):
+    primary = fake_provider(OpenAIProvider, "openai", fail_rate=1.0)
+    secondary = fake_provider(AnthropicProvider, "anthropic")
+    router = ProviderRouter([primary, secondary], registry=registry)
+
+    for _ in range(3):
+        assert (await router.complete(MESSAGES)).provider == "anthropic"
+
+    # Two failures opened the circuit; the third request never reached the primary
+    assert primary.app.state.requests == 2
+    assert attempts(registry, "openai", "unavailable") == 1
+    await router.aclose()
+
+
+async def test_router_does_not_fail_over_a_bad_request(registry):
+    primary = fake_provider(OpenAIProvider, "openai", fail_rate=1.0, fail_status=400)
+    secondary = fake_provider(AnthropicProvider, "anthropic")
+    router = ProviderRouter([primary, secondary], registry=registry)
+
+    with pytest.raises(ProviderError) as error:
+        await router.complete(MESSAGES)
+
+    assert not error.value.retryable
+    assert error.value.status_code == 400
+    assert secondary.app.state.requests == 0
+    # Our bad request says nothing about the provider's health
+    assert primary.breaker.failures == 0
+    await router.aclose()
+
+
+async def test_router_raises_when_every_provider_fails(registry):
+    router = ProviderRouter(
+        [
+            fake_provider(OpenAIProvider, "openai", fail_rate=1.0),
+            fake_provider(AnthropicProvider, "anthropic", fail_rate=1.0, fail_status=529),
+        ],
+        registry=registry,
+    )
+
+    with pytest.raises(ProviderError, match="openai: HTTP 503.*anthropic: HTTP 529"):
+        await router.complete(MESSAGES)
+    await router.aclose()
+
+
+async def test_router_hedges_a_stalled_provider(registry):
+    primary = fake_provider(OpenAIProvider, "openai", stall_rate=1.0, stall_ms=5000)
+    secondary = fake_provider(AnthropicProvider, "anthropic")
+    router = ProviderRouter([primary, secondary], hedge_after=0.05, registry=registry)
+
+    started = time.perf_counter()
+    completion = await router.complete(MESSAGES)
+
+    assert time.perf_counter() - started < 1.0
+    assert completion.provider == "anthropic"
+    assert registry.counter("llm_hedges_total", "").value() == 1
+    assert primary.app.state.requests == 1
+    assert attempts(registry, "openai", "lost") == 1
+    assert attempts(registry, "anthropic", "won") == 1
+    # The cancelled attempt is neither a failure nor a stuck probe
+    assert primary.in_flight == 0
+    assert primary.breaker.failures == 0
+    assert primary.breaker.allow()
+    await router.aclose()
+
+
+async def test_router_does_not_hedge_a_fast_provider(registry):
+    primary = fake_provider(OpenAIProvider, "openai")
+    secondary = fake_provider(AnthropicProvider, "anthropic")
+    router = ProviderRouter([primary, secondary], hedge_after=0.5, registry=registry)
+
+    completion = await router.complete(MESSAGES)
+
+    assert completion.provider == "openai"
+    assert secondary.app.state.requests == 0
+    assert registry.counter("llm_hedges_total", "").value() == 0
+    await router.aclose()
@@ -0,0 +1,154 @@
+"""
+LLM response cache: exact and semantic tiers, scoped by user and business_data
+"""
+from typing import List, Sequence
+from uuid import UUID
+
+import pytest
+from sqlalchemy import insert, select
+
+from shared.database.models import ResponseCacheEntry, UserContext
+from shared.llm.embeddings import HashingEmbedder
+from shared.llm.providers.base import Completion
+from shared.llm.response_cache import ResponseCache, context_version, normalize_prompt
+
+BUSINESS_DATA = {"business_name": "Ada's Fabrics", "hours": {"saturday": "10-4"}}
+PROMPT = "What time do you open on Saturday?"
+# Same question, worded differently: cosine similarity ~0.93 under HashingEmbedder
+RELATED_PROMPT = "What time do you open on Saturday morning?"
+UNRELATED_PROMPT = "Do you deliver to Abuja?"
+
+
+class CountingEmbedder(HashingEmbedder):
+    """HashingEmbedder that records every text it embeds"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls: List[str] = []
+
+    async def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        self.calls.extend(texts)
+        return await super().embed(texts)
+
+
+@pytest.fixture
+def embedder() -> CountingEmbedder:
+    return CountingEmbedder()
+
+
+@pytest.fixture
+def cache(embedder, registry) -> ResponseCache:
+    # L1-only exact tier; Redis is covered by TieredCache itself
+    return ResponseCache(embedder=embedder, threshold=0.9, redis_factory=lambda: None, registry=registry)
+
+
+async def create_user_context(db, user_id: str = "user-1") -> UUID:
+    user_context_id = await db.scalar(
+        insert(UserContext.__table__)
+        .values(user_id=user_id, business_data=BUSINESS_DATA)
+        .returning(UserContext.__table__.c.id)
+    )
+    await db.commit()
+    return user_context_id
+
+
+def completion(response: str = "We open at 10am on Saturdays.") -> Completion:
+    return Completion(response, prompt_tokens=120, completion_tokens=12)
+
+
+def test_normalize_prompt():
+    assert normalize_prompt("  What TIME do\tyou open?? ") == "what time do you open"
+    assert normalize_prompt("Ｈｅｌｌｏ!") == "hello"
+
+
+def test_context_version_ignores_key_order():
+    assert context_version({"a": 1, "b": 2}) == context_version({"b": 2, "a": 1})
+    assert context_version({"a": 1}) != context_version({"a": 2})
+    assert context_version(None) == context_version({})
+    assert len(context_version(BUSINESS_DATA)) == 16
+
+
+async def test_exact_hit_skips_embedding_and_database(db, cache, embedder):
+    user_context_id = await create_user_context(db)
+    await cache.store(db, user_context_id, BUSINESS_DATA, PROMPT, completion(), generation_ms=1500)
+    embedded = len(embedder.calls)
+
+    # Normalization maps this onto the stored prompt
+    hit = await cache.lookup(None, user_context_id, BUSINESS_DATA, "  what time do you open on SATURDAY ")
+
+    assert hit is not None
+    assert (hit.tier, hit.similarity) == ("exact", 1.0)
+    assert hit.response == "We open at 10am on Saturdays."
+    assert (hit.prompt_tokens, hit.completion_tokens, hit.generation_ms) == (120, 12, 1500)
+    assert len(embedder.calls) == embedded
+    assert (cache.hits, cache.lookups) == (1, 1)
+
+
+async def test_exact_tier_is_scoped_to_the_business_data_version(db, cache):
+    user_context_id = await create_user_context(db)
+    await cache.store(db, user_context_id, BUSINESS_DATA, PROMPT, completion(), generation_ms=1500)
+
+    changed = {**BUSINESS_DATA, "hours": {"saturday": "closed"}}
+    assert await cache.lookup(db, user_context_id, changed, PROMPT) is None
+
+
+async def test_semantic_hit_for_a_similar_prompt(db, cache, embedder):
+    user_context_id = await create_user_context(db)
+    await cache.store(db, user_context_id, BUSINESS_DATA, PROMPT, completion(), generation_ms=1500)
+
+    hit = await cache.lookup(db, user_context_id, BUSINESS_DATA, RELATED_PROMPT)
+
+    assert hit is not None
+    assert hit.tier == "semantic"
+    assert 0.9 <= hit.similarity < 1.0
+    assert hit.response == "We open at 10am on Saturdays."
+    entry = (await db.execute(select(ResponseCacheEntry.__table__))).one()
+    assert entry.hits == 1
+    assert entry.last_hit_at is not None
+
+    # The semantic hit was promoted to the exact tier
+    embedded = len(embedder.calls)
+    again = await cache.lookup(db, user_context_id, BUSINESS_DATA, RELATED_PROMPT)
+    assert again.tier == "exact"
+    assert len(embedder.calls) == embedded
+
+
+async def test_semantic_miss_below_threshold_reuses_the_embedding_on_store(db, cache, embedder):
+    user_context_id = await create_user_context(db)
+    await cache.store(db, user_context_id, BUSINESS_DATA, PROMPT, completion(), generation_ms=1500)
+
+    assert await cache.lookup(db, user_context_id, BUSINESS_DATA, UNRELATED_PROMPT) is None
+    embedded = len(embedder.calls)
+    await cache.store(
+        db, user_context_id, BUSINESS_DATA, UNRELATED_PROMPT, completion("Yes, in 2 days."), generation_ms=900
+    )
+
+    assert len(embedder.calls) == embedded
+    assert cache.hits == 0
+
+
+async def test_semantic_tier_is_scoped_to_the_user(db, cache):
+    owner = await create_user_context(db, "user-1")
+    other = await create_user_context(db, "user-2")
+    await cache.store(db, owner, BUSINESS_DATA, PROMPT, completion(), generation_ms=1500)
+
+    assert await cache.lookup(db, other, BUSINESS_DATA, PROMPT) is None
+    assert await cache.lookup(db, other, BUSINESS_DATA, RELATED_PROMPT) is None
+
+
+async def test_get_or_generate_generates_once(db, cache):
+    user_context_id = await create_user_context(db)
+    generated: List[str] = []
+
+    async def generate() -> Completion:
+        generated.append(PROMPT)
+        return completion()
+
+    first, first_hit = await cache.get_or_generate(db, user_context_id, BUSINESS_DATA, PROMPT, generate)
+    second, second_hit = await cache.get_or_generate(db, user_context_id, BUSINESS_DATA, PROMPT, generate)
+
+    assert first_hit is None
+    assert second_hit is not None and second_hit.tier == "exact"
+    assert first.response == second.response == "We open at 10am on Saturdays."
+    assert (second.prompt_tokens, second.completion_tokens) == (120, 12)
+    assert len(generated) == 1
@@ -0,0 +1,97 @@
+"""
+TieredCache read-through loads racing invalidations
+"""
+import asyncio
+import json
+
+import pytest
+from fakeredis.aioredis import FakeRedis
+
+from shared.cache.tiered import TieredCache
+
+
+def make_cache(registry, redis=None) -> TieredCache:
+    return TieredCache(
+        "test", dumps=json.dumps, loads=json.loads, l2_ttl=300, redis_factory=lambda: redis, registry=registry,
+    )
+
+
+class SlowLoader:
+    """Loader that returns ``value`` once ``release`` is set"""
+
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        self.started.set()
+        await self.release.wait()
+        return self.value
+
+
+@pytest.fixture
+def redis():
+    return FakeRedis()
+
+
+async def test_load_is_cached_in_both_tiers(registry, redis):
+    cache = make_cache(registry, redis)
+    loader = SlowLoader({"plan": "free"})
+    loader.release.set()
+
+    assert await cache.get_or_load("user-1", loader) == {"plan": "free"}
+    assert await cache.get_or_load("user-1", loader) == {"plan": "free"}
+
+    assert loader.calls == 1
+    assert json.loads(await redis.get("test:user-1")) == {"plan": "free"}
+
+
+async def test_load_invalidated_in_this_process_is_not_cached(registry):
+    cache = make_cache(registry)
+    stale = SlowLoader({"plan": "free"})
+
+    load = asyncio.create_task(cache.get_or_load("user-1", stale))
+    await stale.started.wait()
+    await cache.invalidate("user-1")  # a write committed after the loader read the row
+    stale.release.set()
+
+    assert await load == {"plan": "free"}  # the caller still gets what it read
+    assert await cache.get("user-1") is None
+    fresh = SlowLoader({"plan": "pro"})
+    fresh.release.set()
+    assert await cache.get_or_load("user-1", fresh) == {"plan": "pro"}
+
+
+async def test_load_invalidated_by_another_worker_is_not_cached(registry, redis):
+    reader = make_cache(registry, redis)
+    writer = make_cache(registry, redis)
+    stale = SlowLoader({"plan": "free"})
+
+    load = asyncio.create_task(reader.get_or_load("user-1", stale))
+    await stale.started.wait()
+    # The reader's subscriber has not delivered this yet; only the generation tells
+    await writer.invalidate("user-1")
+    stale.release.set()
+    await load
+
+    assert await redis.get("test:user-1") is None
+    assert reader._l1.get("user-1") is None
+    fresh = SlowLoader({"plan": "pro"})
+    fresh.release.set()
+    assert await reader.get_or_load("user-1", fresh) == {"plan": "pro"}
+    assert json.loads(await redis.get("test:user-1")) == {"plan": "pro"}
+
+
+async def test_invalidation_before_the_load_does_not_block_caching(registry, redis):
+    cache = make_cache(registry, redis)
+    await cache.invalidate("user-1")
+    loader = SlowLoader({"plan": "pro"})
+    loader.release.set()
+
+    await cache.get_or_load("user-1", loader)
+
+    assert json.loads(await redis.get("test:user-1")) == {"plan": "pro"}
+    assert cache._l1.get("user-1") == {"plan": "pro"}